@@ -1,14 +1,15 @@
 import sqlite3
 
+from migrations import migrate
+
 con = sqlite3.connect("banco.db")
-cur = con.cursor()
 
-# Tenta adicionar a coluna (se já existir, vai dar erro – então tratamos)
-try:
-    cur.execute("ALTER TABLE pontos ADD COLUMN data_registro TEXT;")
-    con.commit()
+# A coluna data_registro agora é a migração 2 (migrations.py); só é
+# adicionada se faltar, então rodar de novo não dá erro.
+aplicadas = migrate(con)
+if 2 in aplicadas:
     print("Coluna data_registro adicionada.")
-except Exception as e:
-    print("Provavelmente a coluna já existe:", e)
+else:
+    print("A coluna já existe.")
 
-con.close()
+con.close()
\ No newline at end of file
@@ -1,24 +1,44 @@
-import base64
+import json
 import os
 
 import streamlit as st
 import pandas as pd
-import folium
-from folium.features import CustomIcon
 from streamlit_folium import st_folium
 
-from sidebar import sidebar_filters
-from db import fetch_pontos
+from sidebar import sidebar_busca, sidebar_filters, sidebar_hotspots, sidebar_periodo, sidebar_rota, sidebar_view_mode
+from assets import asset_url
+from categorias import CATEGORY_LABELS
+from db import (
+    epoch_day,
+    epoch_days_iso,
+    fetch_grade,
+    fetch_pin_counts,
+    fetch_pontos,
+    fetch_pontos_bbox,
+    fetch_setor_counts,
+    fetch_setores,
+    fetch_trend,
+    grade_level,
+    search_pontos,
+)
+from densidade import colorize, extent, kde_grid
+from exportar import FORMATOS, export_url
+from hotspots import HotspotIndex
+from pontos_cache import PontosCache
+from rotas import MAX_PARADAS, planejar_rota, pontos_na_selecao, rota_geojson
 from message import show_intro_message  # <-- NOVO IMPORT
-
-CATEGORY_LABELS = {
-    1: "Acúmulo de Pneu",
-    2: "Descarte de Eletroeletrônicos",
-    3: "Descartes de Móveis e Colchões",
-    4: "Descarte de Resíduos Hospitalares",
-    5: "Pontos Viciados de Resíduos Comum",
-    6: "Descarte de Entulhos de Obras",
-}
+from mapa import (
+    MAP_RETURNED_OBJECTS,
+    MAP_RETURNED_OBJECTS_DESENHO,
+    PONTOS_SEM_AGRUPAR,
+    area_carregada,
+    build_choropleth_map,
+    build_density_map,
+    build_map,
+    build_route_layer,
+    fit_view,
+    map_view,
+)
 
 
 def set_background(image_path: str):
@@ -27,14 +47,13 @@ def set_background(image_path: str):
         st.warning(f"Imagem de fundo não encontrada: {image_path}")
         return
 
-    with open(image_path, "rb") as f:
-        data = f.read()
-    encoded = base64.b64encode(data).decode()
+    # URL estática com cache HTTP, em vez de reenviar o PNG em base64 a cada rerun
+    url = asset_url(image_path, variant="webp")
 
     css = f"""
     <style>
     .stApp {{
-        background-image: url("data:image/png;base64,{encoded}");
+        background-image: url("{url}");
         background-size: cover;
         background-position: center center;
         background-attachment: fixed;
@@ -49,15 +68,251 @@ def set_background(image_path: str):
     st.markdown(css, unsafe_allow_html=True)
 
 
-@st.cache_data(show_spinner=False)
-def load_pontos_cached(selected_pins_tuple):
+@st.cache_resource(show_spinner=False)
+def get_pontos_cache() -> PontosCache:
+    """Cache de pontos único por processo, compartilhado entre as sessões."""
+    return PontosCache()
+
+
+def load_pontos_cached(selected_pins_tuple, bbox=None):
     """
-    Carrega pontos do banco com cache por combinação de pins selecionados.
+    Pontos dos pins selecionados, filtrados em memória a partir do cache.
 
     selected_pins_tuple: tuple(...) com os pins (1..6)
+    bbox: (min_lat, min_long, max_lat, max_long) da área visível, ou None para tudo
+
+    A tabela é lida uma vez por processo; trocar os filtros não consulta o
+    banco, e os pontos novos do form.py entram em poucos segundos.
+    """
+    return get_pontos_cache().get(selected_pins_tuple, bbox)
+
+
+def load_pontos_periodo(selected_pins_tuple, bbox, desde, ate):
+    """
+    Pontos de um período (desde/ate em epoch-day), filtrados no SQL.
+
+    O cache em memória guarda a tabela inteira; com período, o índice de
+    data_registro traz só as linhas do intervalo, que costumam ser poucas.
+    """
+    pins = list(selected_pins_tuple)
+    if bbox is None:
+        return fetch_pontos(pins, desde=desde, ate=ate)
+    return fetch_pontos_bbox(*bbox, pins=pins, desde=desde, ate=ate)
+
+
+@st.cache_resource(show_spinner=False)
+def get_hotspot_index() -> HotspotIndex:
+    """Índice de hotspots único por processo; recebe só os pontos novos a cada versão."""
+    return HotspotIndex()
+
+
+@st.cache_data(show_spinner=False)
+def get_hotspots(data_version, periodo=(None, None)):
+    """
+    Ranking dos hotspots para a versão atual dos dados (hotspots.HotspotIndex.hotspots).
+
+    Sem período usa o índice incremental do processo; com período os grupos
+    são refeitos só com os pontos do intervalo, num índice descartável.
+    """
+    if periodo == (None, None):
+        index = get_hotspot_index()
+        index.update(load_pontos_cached(()), data_version[1])
+        return index.hotspots()
+    index = HotspotIndex()
+    index.update(load_pontos_periodo((), None, *periodo), data_version[1])
+    return index.hotspots()
+
+
+@st.cache_data(show_spinner=False)
+def get_resumo(data_version):
+    """Totais por pin e tendência mensal (tabela de resumo mantida pelos triggers)."""
+    return fetch_pin_counts(), fetch_trend()
+
+
+def hotspot_table(hotspots, category_labels):
+    """Tabela do ranking, com as categorias por extenso."""
+    def categorias(pins):
+        partes = (par.split(":") for par in pins.split(","))
+        return ", ".join(f"{category_labels.get(int(pin), pin)} ({n})" for pin, n in partes)
+
+    return pd.DataFrame(
+        {
+            "Ranking": hotspots["hotspot"],
+            "Pontos": hotspots["n"],
+            "Categorias": hotspots["pins"].map(categorias),
+            "Primeiro registro": hotspots["primeiro"],
+            "Último registro": hotspots["ultimo"],
+            "Latitude": hotspots["lat"].round(6),
+            "Longitude": hotspots["long"].round(6),
+        }
+    )
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def get_map(
+    selected_pins_tuple,
+    bbox,
+    data_version,
+    nivel=None,
+    perfil="desktop",
+    com_hotspots=False,
+    periodo=(None, None),
+    desenho=False,
+):
+    """
+    folium.Map montado uma vez por (pins, área, versão dos dados, nível, perfil, período).
+
+    Pan, zoom e cliques dentro da mesma área reaproveitam o mapa já montado;
+    a visão do usuário é mantida pelos parâmetros center/zoom do st_folium.
+
+    nivel: nível da pirâmide de agregação (db.grade_level) para zoom baixo,
+    ou None para mostrar os pontos individuais. Retorna None se não houver pontos.
+    com_hotspots: sobrepõe os círculos dos hotspots (get_hotspots).
+    periodo: (desde, ate) em epoch-day para filtrar data_registro, ou (None, None).
+    desenho: inclui a ferramenta de desenho (seleção das paradas do roteiro).
+    """
+    hotspots = get_hotspots(data_version, periodo) if com_hotspots else None
+    desde, ate = periodo
+    com_periodo = desde is not None or ate is not None
+
+    if nivel is not None:
+        grade = fetch_grade(nivel, list(selected_pins_tuple), bbox, desde, ate)
+        if grade["n"].sum() > PONTOS_SEM_AGRUPAR:
+            return build_map(
+                None, CATEGORY_LABELS, zoom_start=13, bbox=bbox, grade=grade, hotspots=hotspots, desenho=desenho
+            )
+
+    if com_periodo:
+        df = load_pontos_periodo(selected_pins_tuple, bbox, desde, ate)
+    else:
+        df = load_pontos_cached(selected_pins_tuple, bbox)
+    if df.empty and bbox is None:
+        return None
+    return build_map(df, CATEGORY_LABELS, zoom_start=13, bbox=bbox, hotspots=hotspots, desenho=desenho)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def get_busca(texto, selected_pins_tuple, periodo, data_version):
+    """Pontos encontrados pela busca textual (db.search_pontos), do mais ao menos relevante."""
+    return search_pontos(texto, list(selected_pins_tuple), *periodo)
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def get_busca_map(texto, selected_pins_tuple, periodo, data_version, com_hotspots=False):
+    """Mapa só com os pontos encontrados pela busca (get_busca)."""
+    hotspots = get_hotspots(data_version, periodo) if com_hotspots else None
+    df = get_busca(texto, selected_pins_tuple, periodo, data_version)
+    return build_map(df, CATEGORY_LABELS, zoom_start=13, hotspots=hotspots)
+
+
+def busca_table(resultados, category_labels):
+    """Tabela dos resultados da busca, na ordem de relevância."""
+    return pd.DataFrame(
+        {
+            "Nome": resultados["nome"],
+            "Categoria": resultados["pin"].map(lambda pin: category_labels.get(int(pin), pin)),
+            "Classificação PNRS": resultados["pnrs"].fillna(""),
+            "Data registro": epoch_days_iso(resultados["data_registro"]),
+            "Latitude": resultados["lat"].round(6),
+            "Longitude": resultados["long"].round(6),
+        }
+    )
+
+
+@st.cache_data(show_spinner=False)
+def density_extent(data_version):
+    """
+    Área coberta pelas superfícies de densidade (todos os pontos), ou None se vazio.
+
+    Não depende do período: a mesma grade serve para qualquer intervalo.
+    """
+    df = load_pontos_cached(())
+    if df.empty:
+        return None
+    return extent(df["lat"].to_numpy(), df["long"].to_numpy())
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def density_surface(pin, periodo, data_version, banda_m, ext):
+    """Superfície KDE de um pin no período (ou de todos os pontos), cacheada por versão dos dados e raio."""
+    if periodo == (None, None):
+        df = load_pontos_cached((pin,))
+    else:
+        df = load_pontos_periodo((pin,), None, *periodo)
+    return kde_grid(df["lat"].to_numpy(), df["long"].to_numpy(), ext, banda_m)
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def get_density_map(selected_pins_tuple, periodo, data_version, banda_m):
+    """Mapa de calor dos pins selecionados no período: soma das superfícies, uma imagem só."""
+    ext = density_extent(data_version)
+    if ext is None:
+        return None
+    pins = selected_pins_tuple or tuple(CATEGORY_LABELS)
+    grade = sum(density_surface(pin, periodo, data_version, banda_m, ext) for pin in pins)
+    return build_density_map(colorize(grade), ext, zoom_start=13)
+
+
+@st.cache_data(show_spinner=False)
+def get_setores(data_version):
+    """Polígonos dos setores (a reatribuição pelo setores.py muda a versão dos dados)."""
+    return fetch_setores()
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def get_setor_counts(selected_pins_tuple, periodo, data_version):
+    """Pontos por setor e pin, com os filtros da sidebar."""
+    return fetch_setor_counts(list(selected_pins_tuple), *periodo)
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def get_choropleth_map(selected_pins_tuple, periodo, data_version):
+    """Mapa coroplético dos setores, ou None se nenhum setor foi carregado."""
+    setores = get_setores(data_version)
+    if setores.empty:
+        return None
+    return build_choropleth_map(setores, get_setor_counts(selected_pins_tuple, periodo, data_version), CATEGORY_LABELS)
+
+
+def setor_table(setores, contagens, category_labels):
+    """Tabela setor x categoria, do setor com mais pontos para o com menos."""
+    por_setor = contagens.pivot_table(index="setor", columns="pin", values="n", aggfunc="sum", fill_value=0)
+    por_setor = por_setor.reindex(index=setores["id"], columns=list(category_labels), fill_value=0)
+    tabela = por_setor.rename(columns=category_labels).rename_axis(index=None, columns=None)
+    tabela.insert(0, "Total", tabela.sum(axis=1))
+    tabela.insert(0, "Setor", setores.set_index("id")["nome"])
+    return tabela.sort_values("Total", ascending=False)
+
+
+def paradas_rota(selected_pins_tuple, bbox, periodo, rota_cfg, desenhos):
+    """
+    Pontos a visitar no roteiro: os filtrados da área visível, ou os de
+    todo o mapa dentro das áreas desenhadas.
     """
-    # converte de volta pra lista porque o fetch_pontos espera lista
-    return fetch_pontos(list(selected_pins_tuple))
+    area = bbox if rota_cfg["selecao"] == "area" else None
+    if periodo != (None, None):
+        df = load_pontos_periodo(selected_pins_tuple, area, *periodo)
+    else:
+        df = load_pontos_cached(selected_pins_tuple, area)
+    if rota_cfg["selecao"] == "desenho":
+        df = pontos_na_selecao(df, desenhos)
+    return df
+
+
+def rota_table(rota, category_labels):
+    """Tabela do roteiro, na ordem de visita."""
+    return pd.DataFrame(
+        {
+            "Viagem": rota["viagem"],
+            "Ordem": rota["ordem"],
+            "Nome": rota["nome"],
+            "Categoria": rota["pin"].map(lambda pin: category_labels.get(int(pin), pin)),
+            "Trecho (m)": rota["trecho_m"].round(0).astype(int),
+            "Acumulado (km)": (rota["acumulado_m"] / 1000).round(2),
+            "Latitude": rota["lat"].round(6),
+            "Longitude": rota["long"].round(6),
+        }
+    )
 
 
 st.set_page_config(page_title="SARA - Mapa", layout="wide")
@@ -68,63 +323,172 @@ show_intro_message()
 
 st.title("SARA - Sistema Analítico de Resíduos e Ambiente (Sol Nascente)")
 
-# --- Sidebar: retorna lista de pins selecionados ---
-selected_pins = sidebar_filters(CATEGORY_LABELS)
+# --- Sidebar: retorna lista de pins selecionados (com totais e tendência do resumo) ---
+data_version = get_pontos_cache().data_version()
+contagens, tendencia = get_resumo(data_version)
+selected_pins = sidebar_filters(CATEGORY_LABELS, contagens, tendencia)
+modo, banda_m = sidebar_view_mode()
+mostrar_hotspots = sidebar_hotspots()
+periodo_desde, periodo_ate = sidebar_periodo()
+periodo_key = (epoch_day(periodo_desde), epoch_day(periodo_ate))
+busca = sidebar_busca()
+rota_cfg = sidebar_rota(CATEGORY_LABELS, selected_pins)
 
-# --- Carrega dados do banco (agora cacheado por filtro) ---
-df = load_pontos_cached(tuple(sorted(selected_pins)))  # sort pra ordem não quebrar o cache
+# --- Área carregada no mapa: a visível com margem, mantida entre reruns enquanto a
+# visão (bounds devolvidos pelo st_folium) couber nela; pan não remonta o mapa ---
+map_state = st.session_state.get("mapa") or {}
+area = area_carregada(st.session_state.get("area_mapa"), map_state.get("bounds"), map_state.get("zoom"))
+st.session_state["area_mapa"] = area
+bbox = area[0] if area is not None else None
 
-if df.empty:
-    st.warning("Nenhum ponto cadastrado ainda ou filtros muito restritivos.")
-    st.stop()
+# --- Mapa da área visível (remontado só quando filtro, área, zoom ou dados mudam) ---
+# Em zoom baixo, bolhas agregadas por célula; em zoom alto, os pontos.
+# No modo densidade, uma única imagem com o mapa de calor.
+pins_key = tuple(sorted(selected_pins))  # sort pra ordem não quebrar o cache
 
-# --- Centro do mapa (média das coordenadas) ---
-center_lat = df["lat"].mean()
-center_long = df["long"].mean()
-
-m = folium.Map(location=[center_lat, center_long], zoom_start=13, tiles="OpenStreetMap")
-
-for _, row in df.iterrows():
-    pin_num = int(row["pin"])
-    icon_path = f"img/pin_{pin_num}.png"
-
-    categoria = CATEGORY_LABELS.get(pin_num, f"Pin {pin_num}")
-    pnrs_val = row["pnrs"] if row["pnrs"] else "-"
-
-    popup_html = f"""
-    <div style="font-size: 13px; font-family: Arial, sans-serif;">
-      <table style="border-collapse: collapse;">
-        <tr>
-          <td style="font-weight:600; padding-right:6px;">Categoria:</td>
-          <td>{categoria}</td>
-        </tr>
-        <tr>
-          <td style="font-weight:600; padding-right:6px;">Nome do ponto:</td>
-          <td>{row['nome']}</td>
-        </tr>
-        <tr>
-          <td style="font-weight:600; padding-right:6px;">Classificação PNRS:</td>
-          <td>{pnrs_val}</td>
-        </tr>
-        <tr>
-          <td style="font-weight:600; padding-right:6px;">Data registro:</td>
-          <td>{row['data_registro']}</td>
-        </tr>
-      </table>
-    </div>
-    """
+# --- Busca: o mapa mostra só os pontos encontrados e enquadra todos eles ---
+resultados = None
+if busca:
+    resultados = get_busca(busca, pins_key, periodo_key, data_version)
+    if resultados.empty:
+        st.info(f'Nenhum ponto encontrado para "{busca}" com os filtros atuais.')
+        resultados = None
+
+# --- Roteiro de coleta: seleção desenhada (só no modo pontos) e cálculo da rota ---
+desenhar = rota_cfg is not None and rota_cfg["selecao"] == "desenho" and resultados is None and modo == "pontos"
+if rota_cfg is not None and rota_cfg["calcular"]:
+    paradas = paradas_rota(pins_key, bbox, periodo_key, rota_cfg, map_state.get("all_drawings"))
+    if paradas.empty:
+        if rota_cfg["selecao"] == "desenho":
+            st.sidebar.warning("Desenhe no mapa (modo Pontos) um retângulo ou polígono com os pontos da rota.")
+        else:
+            st.sidebar.warning("Nenhum ponto na área visível com os filtros atuais.")
+    elif len(paradas) > MAX_PARADAS:
+        st.sidebar.warning(
+            f"{len(paradas):,} pontos selecionados; o roteiro aceita até {MAX_PARADAS:,}. "
+            "Aproxime o mapa, desenhe uma área menor ou filtre categorias/período."
+        )
+    else:
+        with st.spinner(f"Calculando a rota por {len(paradas):,} pontos..."):
+            rota = planejar_rota(paradas, rota_cfg["base"], rota_cfg["capacidade"], rota_cfg["prazo_s"])
+        st.session_state["rota"] = (rota, rota_cfg["base"])
+rota_atual = st.session_state.get("rota") if rota_cfg is not None else None
 
-    icon = CustomIcon(
-        icon_image=icon_path,
-        icon_size=(42, 42),
-        icon_anchor=(16, 32),
+if resultados is not None:
+    m = get_busca_map(busca, pins_key, periodo_key, data_version, com_hotspots=mostrar_hotspots)
+elif modo == "densidade":
+    m = get_density_map(pins_key, periodo_key, data_version, banda_m)
+elif modo == "setores":
+    m = get_choropleth_map(pins_key, periodo_key, data_version)
+    if m is None:
+        st.info("Nenhum setor carregado. Carregue os polígonos com: python setores.py setores.geojson")
+        st.stop()
+else:
+    m = get_map(
+        pins_key,
+        bbox,
+        data_version,
+        grade_level(map_state.get("zoom") or 13),
+        com_hotspots=mostrar_hotspots,
+        periodo=periodo_key,
+        desenho=desenhar,
     )
 
-    folium.Marker(
-        location=[row["lat"], row["long"]],
-        icon=icon,
-        popup=popup_html,
-    ).add_to(m)
+if m is None:
+    st.warning("Nenhum ponto cadastrado ainda ou filtros muito restritivos.")
+    st.stop()
+
+# --- Visão atual do usuário (centro e zoom); numa busca nova, enquadra os resultados ---
+center, zoom = map_view(map_state)
+vista_busca = (busca, pins_key, periodo_key) if resultados is not None else None
+if vista_busca is not None and st.session_state.get("vista_busca") != vista_busca:
+    center, zoom = fit_view(resultados)
+st.session_state["vista_busca"] = vista_busca
 
 # --- Renderiza o mapa no Streamlit ---
-st_folium(m, width="100%", height=750)
+st_folium(
+    m,
+    width="100%",
+    height=750,
+    key="mapa",
+    center=center,
+    zoom=zoom,
+    returned_objects=MAP_RETURNED_OBJECTS_DESENHO if desenhar else MAP_RETURNED_OBJECTS,
+    feature_group_to_add=build_route_layer(*rota_atual) if rota_atual is not None else None,
+)
+
+# --- Resultados da busca, na ordem de relevância ---
+if resultados is not None:
+    st.subheader(f'Busca: "{busca}" ({len(resultados)} ponto(s))')
+    st.dataframe(busca_table(resultados, CATEGORY_LABELS), hide_index=True, use_container_width=True)
+
+# --- Roteiro de coleta calculado ---
+if rota_cfg is not None:
+    st.subheader("Roteiro de coleta")
+    if rota_atual is None:
+        st.info('Escolha as paradas na barra lateral e clique em "Calcular rota".')
+    else:
+        rota, base = rota_atual
+        col_paradas, col_viagens, col_distancia = st.columns(3)
+        col_paradas.metric("Paradas", f"{len(rota):,}")
+        col_viagens.metric("Viagens", int(rota["viagem"].max()))
+        col_distancia.metric("Distância", f"{rota['trecho_m'].sum() / 1000:,.1f} km")
+        st.dataframe(rota_table(rota, CATEGORY_LABELS), hide_index=True, use_container_width=True)
+
+        # a rota tem no máximo MAX_PARADAS linhas: cabe no download_button
+        # (a exportação da tabela inteira usa o static serving; ver exportar.py)
+        col_csv, col_geojson = st.columns(2)
+        col_csv.download_button(
+            "Baixar rota (CSV)",
+            rota.to_csv(index=False).encode("utf-8"),
+            file_name="sara_rota.csv",
+            mime="text/csv",
+        )
+        col_geojson.download_button(
+            "Baixar rota (GeoJSON)",
+            json.dumps(rota_geojson(rota, base), ensure_ascii=False).encode("utf-8"),
+            file_name="sara_rota.geojson",
+            mime="application/geo+json",
+        )
+
+# --- Contagem por setor e categoria (modo setores) ---
+if resultados is None and modo == "setores":
+    st.subheader("Pontos por setor")
+    tabela = setor_table(get_setores(data_version), get_setor_counts(pins_key, periodo_key, data_version), CATEGORY_LABELS)
+    st.dataframe(tabela, hide_index=True, use_container_width=True)
+
+# --- Ranking dos hotspots (pontos viciados que se repetem) ---
+if mostrar_hotspots:
+    st.subheader("Hotspots de descarte recorrente")
+    hotspots = get_hotspots(data_version, periodo_key)
+    if hotspots.empty:
+        st.info("Nenhum hotspot encontrado: ainda não há pontos próximos o bastante.")
+    else:
+        st.dataframe(hotspot_table(hotspots, CATEGORY_LABELS), hide_index=True, use_container_width=True)
+
+# --- Exportação dos pontos filtrados (arquivo gerado em streaming) ---
+with st.expander("Exportar dados"):
+    col_formato, col_periodo = st.columns(2)
+    formato = col_formato.selectbox("Formato", options=list(FORMATOS))
+    periodo = col_periodo.date_input("Período (data de registro)", value=(), format="DD/MM/YYYY")
+    so_area = st.checkbox("Somente a área visível do mapa", value=False, disabled=bbox is None)
+
+    if st.button("Gerar arquivo"):
+        # sem período próprio, exporta o período escolhido na sidebar
+        if len(periodo) == 0:
+            periodo = [d for d in (periodo_desde, periodo_ate) if d is not None]
+        desde = periodo[0].isoformat() if len(periodo) > 0 else None
+        ate = periodo[-1].isoformat() if len(periodo) > 1 else desde
+        with st.spinner("Gerando arquivo..."):
+            url = export_url(
+                formato,
+                data_version,
+                pins=list(pins_key),
+                bbox=bbox if so_area else None,
+                desde=desde,
+                ate=ate,
+            )
+        st.markdown(
+            f'<a href="{url}" download="sara_pontos.{formato}">Baixar sara_pontos.{formato}</a>',
+            unsafe_allow_html=True,
+        )
@@ -0,0 +1,97 @@
+"""
+Imagens estáticas (fundos, slides) servidas pelo static serving do Streamlit.
+
+Cada arquivo é lido, convertido e gravado em static/cache/ uma única vez
+por processo, com o nome derivado do hash do conteúdo. As páginas só
+recebem a URL (app/static/cache/<hash>.<ext>), então o navegador baixa a
+imagem uma vez e reaproveita do cache HTTP, em vez de receber alguns MB de
+base64 a cada rerun.
+
+Requer `enableStaticServing = true` em .streamlit/config.toml.
+"""
+import hashlib
+import io
+import os
+import threading
+from functools import lru_cache
+from typing import Optional
+
+try:
+    from PIL import Image
+except ImportError:  # sem Pillow, as variantes caem no arquivo original
+    Image = None
+
+STATIC_DIR = "static"
+CACHE_DIR = os.path.join(STATIC_DIR, "cache")
+STATIC_URL = "app/static/cache"
+
+# variante -> (maior lado em px ou None, formato)
+VARIANTS = {
+    "webp": (None, "WEBP"),
+    "mobile": (768, "WEBP"),
+}
+WEBP_QUALITY = 80
+
+_write_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _content_hash(path: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()[:16]
+
+
+def _output_name(path: str, digest: str, variant: Optional[str]) -> str:
+    if variant is None or Image is None:
+        return f"{digest}.{os.path.splitext(path)[1].lstrip('.').lower()}"
+    return f"{digest}-{variant}.{VARIANTS[variant][1].lower()}"
+
+
+def _render(path: str, variant: Optional[str]) -> bytes:
+    """Bytes da variante pedida do arquivo."""
+    if variant is None or Image is None:
+        with open(path, "rb") as f:
+            return f.read()
+
+    max_side, fmt = VARIANTS[variant]
+    with Image.open(path) as img:
+        if max_side:
+            img.thumbnail((max_side, max_side))
+        buf = io.BytesIO()
+        img.save(buf, format=fmt, quality=WEBP_QUALITY, method=4)
+    return buf.getvalue()
+
+
+@lru_cache(maxsize=None)
+def _publish(path: str, digest: str, variant: Optional[str]) -> str:
+    """Grava a variante em static/cache/ (se ainda não existir) e devolve o nome."""
+    nome = _output_name(path, digest, variant)
+    destino = os.path.join(CACHE_DIR, nome)
+    if os.path.exists(destino):
+        return nome
+
+    data = _render(path, variant)
+    with _write_lock:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{destino}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, destino)
+    return nome
+
+
+def asset_url(path: str, variant: Optional[str] = None) -> Optional[str]:
+    """
+    URL estática de `path` (ou de uma variante: "webp", "mobile").
+
+    Retorna None se o arquivo não existir.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    digest = _content_hash(path, st.st_mtime_ns, st.st_size)
+    return f"{STATIC_URL}/{_publish(path, digest, variant)}"
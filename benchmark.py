@@ -0,0 +1,561 @@
+"""
+Benchmarks de desempenho do SARA.
+
+Uso:
+    python benchmark.py marcadores [--tamanhos 1000 10000 100000]
+    python benchmark.py conexoes [--pontos 20000] [--sessoes 8] [--consultas 50]
+    python benchmark.py assets [--reruns 20]
+    python benchmark.py rerun [--pontos 10000] [--reruns 30]
+    python benchmark.py duplicados [--pontos 1000000] [--consultas 200]
+    python benchmark.py lote [--cadastros 500]
+    python benchmark.py escrita [--submissores 50] [--cadastros 40]
+"""
+import argparse
+import base64
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import folium
+import numpy as np
+import pandas as pd
+from folium.features import CustomIcon
+
+import db
+from gravador import Gravador
+from assets import asset_url
+from categorias import CATEGORY_LABELS
+from mapa import add_pontos_layer, area_carregada, bounds_to_bbox, build_map
+from pontos_cache import filter_bbox
+
+# centro aproximado do Sol Nascente
+CENTRO = (-15.83, -48.13)
+
+
+def pontos_sinteticos(n: int, seed: int = 42) -> pd.DataFrame:
+    """Gera n pontos aleatórios em volta do Sol Nascente."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "id": np.arange(1, n + 1),
+            "pin": rng.integers(1, 7, n),
+            "nome": [f"Ponto {i}" for i in range(n)],
+            "pnrs": "",
+            "lat": CENTRO[0] + rng.normal(0, 0.01, n),
+            "long": CENTRO[1] + rng.normal(0, 0.01, n),
+            "data_registro": db.epoch_day("2025-12-11"),
+        }
+    )
+
+
+def _mapa_base(df: pd.DataFrame) -> folium.Map:
+    return folium.Map(location=[df["lat"].mean(), df["long"].mean()], zoom_start=13)
+
+
+def _mapa_loop(df: pd.DataFrame) -> folium.Map:
+    """Montagem antiga: um folium.Marker + CustomIcon por linha."""
+    m = _mapa_base(df)
+    for _, row in df.iterrows():
+        pin_num = int(row["pin"])
+        popup_html = f"""
+        <div style="font-size: 13px; font-family: Arial, sans-serif;">
+          <table style="border-collapse: collapse;">
+            <tr><td>Categoria:</td><td>{CATEGORY_LABELS[pin_num]}</td></tr>
+            <tr><td>Nome do ponto:</td><td>{row['nome']}</td></tr>
+            <tr><td>Classificação PNRS:</td><td>{row['pnrs'] or '-'}</td></tr>
+            <tr><td>Data registro:</td><td>{row['data_registro']}</td></tr>
+          </table>
+        </div>
+        """
+        icon = CustomIcon(icon_image=f"img/pin_{pin_num}.png", icon_size=(42, 42), icon_anchor=(16, 32))
+        folium.Marker(location=[row["lat"], row["long"]], icon=icon, popup=popup_html).add_to(m)
+    return m
+
+
+def _mapa_camada(df: pd.DataFrame) -> folium.Map:
+    m = _mapa_base(df)
+    add_pontos_layer(m, df, CATEGORY_LABELS)
+    return m
+
+
+def _medir(montar, df: pd.DataFrame):
+    t0 = time.perf_counter()
+    m = montar(df)
+    html = m.get_root().render()
+    return time.perf_counter() - t0, len(html.encode("utf-8"))
+
+
+def bench_marcadores(tamanhos, loop_max: int) -> None:
+    """
+    Compara o loop de folium.Marker com a camada vetorizada.
+
+    O loop antigo embute o PNG do ícone em cada marcador, então acima de
+    loop_max pontos o resultado dele é extrapolado linearmente a partir
+    da medição em loop_max (marcado com '*').
+    """
+    print(f"{'pontos':>8} | {'loop (s)':>10} | {'loop (MB)':>10} | {'camada (s)':>10} | {'camada (MB)':>11}")
+    base_loop = None
+    for n in tamanhos:
+        df = pontos_sinteticos(n)
+        if n <= loop_max:
+            t_loop, b_loop = _medir(_mapa_loop, df)
+            base_loop = (n, t_loop, b_loop)
+            marca = " "
+        else:
+            if base_loop is None:
+                base_loop = (loop_max, *_medir(_mapa_loop, pontos_sinteticos(loop_max)))
+            fator = n / base_loop[0]
+            t_loop, b_loop = base_loop[1] * fator, base_loop[2] * fator
+            marca = "*"
+        t_cam, b_cam = _medir(_mapa_camada, df)
+        print(
+            f"{n:>8} | {t_loop:>9.2f}{marca} | {b_loop / 1e6:>9.1f}{marca} | "
+            f"{t_cam:>10.2f} | {b_cam / 1e6:>11.2f}"
+        )
+
+
+def banco_sintetico(path: str, n: int) -> None:
+    """Cria um banco com a tabela pontos (como em tabela.py) e n pontos sintéticos."""
+    # esquema antigo, com a data em texto: as migrações (db._ensure_schema) convertem
+    df = pontos_sinteticos(n)
+    df["data_registro"] = db.epoch_days_iso(df["data_registro"])
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """
+        CREATE TABLE pontos (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            pin           INTEGER NOT NULL,
+            nome          TEXT    NOT NULL,
+            pnrs          TEXT,
+            lat           REAL    NOT NULL,
+            long          REAL    NOT NULL,
+            data_registro TEXT    NOT NULL
+        )
+        """
+    )
+    conn.executemany(
+        "INSERT INTO pontos (pin, nome, pnrs, lat, long, data_registro) VALUES (?, ?, ?, ?, ?, ?)",
+        df[["pin", "nome", "pnrs", "lat", "long", "data_registro"]].itertuples(index=False, name=None),
+    )
+    conn.commit()
+    conn.close()
+
+
+def _fetch_antigo(path: str, pins) -> pd.DataFrame:
+    """fetch_pontos original: conexão nova, sem PRAGMAs, fechada a cada chamada."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    placeholders = ",".join("?" * len(pins))
+    df = pd.read_sql_query(
+        f"SELECT pin, nome, pnrs, lat, long, data_registro FROM pontos WHERE pin IN ({placeholders})",
+        conn,
+        params=pins,
+    )
+    conn.close()
+    return df
+
+
+def _insert_antigo(path: str, valores) -> None:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("INSERT INTO pontos (pin, nome, pnrs, lat, long, data_registro) VALUES (?, ?, ?, ?, ?, ?)", valores)
+    conn.commit()
+    conn.close()
+
+
+def _rodar_sessoes(fetch, insert, sessoes: int, consultas: int):
+    """
+    `sessoes` threads fazendo `consultas` leituras cada, enquanto outra
+    thread grava um ponto a cada 10 ms. Devolve as latências de leitura (s).
+    """
+    parar = threading.Event()
+    erros = []
+
+    def escritor():
+        while not parar.is_set():
+            try:
+                insert((5, "Ponto novo", "", CENTRO[0], CENTRO[1], "2025-12-11"))
+            except sqlite3.OperationalError as e:
+                erros.append(e)
+            time.sleep(0.01)
+
+    def sessao(k):
+        pins = [1 + (k % 6), 1 + ((k + 3) % 6)]
+        tempos = []
+        for _ in range(consultas):
+            t0 = time.perf_counter()
+            try:
+                fetch(pins)
+            except sqlite3.OperationalError as e:
+                erros.append(e)
+                continue
+            tempos.append(time.perf_counter() - t0)
+        return tempos
+
+    t_escritor = threading.Thread(target=escritor)
+    t_escritor.start()
+    with ThreadPoolExecutor(max_workers=sessoes) as ex:
+        latencias = [t for tempos in ex.map(sessao, range(sessoes)) for t in tempos]
+    parar.set()
+    t_escritor.join()
+    return latencias, len(erros)
+
+
+def bench_conexoes(pontos: int, sessoes: int, consultas: int) -> None:
+    """Latência de fetch_pontos com várias sessões simultâneas e um escritor ativo."""
+    with tempfile.TemporaryDirectory() as tmp:
+        antigo = os.path.join(tmp, "antigo.db")
+        novo = os.path.join(tmp, "novo.db")
+        banco_sintetico(antigo, pontos)
+        banco_sintetico(novo, pontos)
+
+        lat_antigo, erros_antigo = _rodar_sessoes(
+            lambda pins: _fetch_antigo(antigo, pins),
+            lambda valores: _insert_antigo(antigo, valores),
+            sessoes,
+            consultas,
+        )
+
+        db.DB_PATH = novo
+        lat_novo, erros_novo = _rodar_sessoes(
+            db.fetch_pontos,
+            lambda valores: db.insert_ponto(*valores),
+            sessoes,
+            consultas,
+        )
+        db.get_manager().close()
+
+    print(f"{pontos} pontos, {sessoes} sessões x {consultas} consultas, 1 escritor")
+    print(f"{'caminho':>8} | {'média (ms)':>10} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'erros':>5}")
+    for nome, lat, erros in (("antigo", lat_antigo, erros_antigo), ("pool", lat_novo, erros_novo)):
+        q = statistics.quantiles(lat, n=100)
+        print(
+            f"{nome:>8} | {statistics.mean(lat) * 1e3:>10.1f} | {q[49] * 1e3:>9.1f} | "
+            f"{q[98] * 1e3:>9.1f} | {erros:>5}"
+        )
+
+
+# imagens que cada página envia a cada rerun (fundo + slides do message.py)
+ASSETS_PAGINAS = {
+    "app.py": ("fundos/fundo_mapa.png", [f"mensagem/slide_{i}.png" for i in range(1, 5)], "webp"),
+    "form.py": ("fundos/fundo_form.png", [], "webp"),
+    "phone.py": ("fundos/fundo_mapa.png", [f"mensagem/slide_{i}.png" for i in range(1, 5)], "mobile"),
+}
+
+
+def _rerun_base64(fundo, slides) -> int:
+    """Como era: lê e codifica cada imagem em base64 a cada rerun."""
+    total = 0
+    for path in [fundo, *slides]:
+        with open(path, "rb") as f:
+            total += len(f"data:image/png;base64,{base64.b64encode(f.read()).decode()}")
+    return total
+
+
+def _rerun_urls(fundo, slides, variant) -> int:
+    return sum(len(asset_url(path, variant=variant)) for path in [fundo, *slides])
+
+
+def bench_assets(reruns: int) -> None:
+    """
+    Bytes de imagem embutidos na página e tempo gasto por rerun, antes e depois.
+
+    O "depois" não inclui o download da imagem pelo navegador, que acontece
+    uma vez e depois vem do cache HTTP.
+    """
+    print(f"{'página':>8} | {'base64 (KB)':>11} | {'base64 (ms)':>11} | {'URL (B)':>7} | {'URL (ms)':>8} | {'1ª vez (ms)':>11}")
+    for pagina, (fundo, slides, variant) in ASSETS_PAGINAS.items():
+        t0 = time.perf_counter()
+        for _ in range(reruns):
+            b_antigo = _rerun_base64(fundo, slides)
+        t_antigo = (time.perf_counter() - t0) / reruns
+
+        t0 = time.perf_counter()
+        _rerun_urls(fundo, slides, variant)  # converte e grava em static/cache
+        t_frio = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for _ in range(reruns):
+            b_novo = _rerun_urls(fundo, slides, variant)
+        t_novo = (time.perf_counter() - t0) / reruns
+
+        print(
+            f"{pagina:>8} | {b_antigo / 1024:>11.0f} | {t_antigo * 1e3:>11.2f} | {b_novo:>7} | "
+            f"{t_novo * 1e3:>8.3f} | {t_frio * 1e3:>11.1f}"
+        )
+
+
+def _pan(reruns: int, seed: int = 3):
+    """Visões (bounds, zoom) de quem arrasta o mapa no zoom 15, em passos de até 15% da tela."""
+    rng = np.random.default_rng(seed)
+    alt, larg = 0.012, 0.025  # ~zoom 15 num mapa de 1000 x 750 px
+    lat, lng = CENTRO
+    visoes = []
+    for _ in range(reruns):
+        lat += rng.uniform(-0.15, 0.15) * alt
+        lng += rng.uniform(-0.15, 0.15) * larg
+        bounds = {
+            "_southWest": {"lat": lat - alt / 2, "lng": lng - larg / 2},
+            "_northEast": {"lat": lat + alt / 2, "lng": lng + larg / 2},
+        }
+        visoes.append((bounds, 15))
+    return visoes
+
+
+def _replay_pan(df: pd.DataFrame, visoes, area_de):
+    """
+    Passa as visões por um cache de mapas com a chave do get_map do app.py
+    (a área carregada), montando o mapa a cada falta.
+
+    Devolve (s por rerun, mapas montados, bytes reenviados): o st_folium
+    serializa o mapa a cada rerun, mas o navegador só recebe e remonta o
+    iframe quando o mapa muda.
+    """
+    mapas = {}
+    area = None
+    anterior = None
+    reenviados = 0
+    t0 = time.perf_counter()
+    for bounds, zoom in visoes:
+        area = area_de(area, bounds, zoom)
+        bbox = area[0]
+        m = mapas.get(bbox)
+        if m is None:
+            m = mapas[bbox] = build_map(filter_bbox(df, bbox), CATEGORY_LABELS, zoom_start=15, bbox=bbox)
+        html = m.get_root().render()
+        if m is not anterior:
+            reenviados += len(html)
+        anterior = m
+    return (time.perf_counter() - t0) / len(visoes), len(mapas), reenviados
+
+
+def bench_rerun(pontos: int, reruns: int) -> None:
+    """
+    Latência de uma sequência de pans no app.py.
+
+    Antes: a área vinha dos bounds de cada rerun (bounds_to_bbox); quase todo
+    pan mudava as bordas arredondadas e o get_map remontava o mapa. Depois:
+    a área carregada fica na sessão enquanto a visão couber nela
+    (mapa.area_carregada), e o pan reaproveita o mapa do cache.
+    """
+    df = pontos_sinteticos(pontos)
+    visoes = _pan(reruns)
+
+    antes = _replay_pan(df, visoes, lambda anterior, bounds, zoom: (bounds_to_bbox(bounds), zoom))
+    depois = _replay_pan(df, visoes, area_carregada)
+
+    print(f"{pontos} pontos, {reruns} reruns de pan no zoom 15")
+    for rotulo, (t, montados, reenviados) in (("área a cada rerun:", antes), ("área mantida:", depois)):
+        print(f"  {rotulo:<19} {t * 1e3:7.1f} ms/rerun, {montados:3d} mapas montados, {reenviados / 1e6:6.1f} MB reenviados")
+
+
+def bench_duplicados(pontos: int, consultas: int) -> None:
+    """
+    Latência da checagem de duplicados do form.py (db.find_duplicates).
+
+    Compara com a varredura da tabela inteira (distância calculada em todas
+    as linhas do pin), que era a alternativa sem índice espacial.
+    """
+    rng = np.random.default_rng(7)
+    alvos = [
+        (int(rng.integers(1, 7)), CENTRO[0] + rng.normal(0, 0.01), CENTRO[1] + rng.normal(0, 0.01))
+        for _ in range(consultas)
+    ]
+
+    hoje = date(2025, 12, 20)  # poucos dias depois do data_registro dos pontos sintéticos
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "duplicados.db")
+        banco_sintetico(path, pontos)
+        db.DB_PATH = path
+
+        t0 = time.perf_counter()
+        db.find_duplicates(*alvos[0], hoje=hoje)  # cria o esquema (R*Tree)
+        t_esquema = time.perf_counter() - t0
+
+        tempos, achados = [], 0
+        for pin, lat, lng in alvos:
+            t0 = time.perf_counter()
+            achados += len(db.find_duplicates(pin, lat, lng, hoje=hoje))
+            tempos.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        for pin, lat, lng in alvos[:5]:
+            with db.read_connection() as conn:
+                df = pd.read_sql_query("SELECT id, lat, long FROM pontos WHERE pin = ?", conn, params=[pin])
+            dx = (df["long"] - lng) * db.METROS_POR_GRAU * np.cos(np.radians(lat))
+            dy = (df["lat"] - lat) * db.METROS_POR_GRAU
+            df[(dx * dx + dy * dy) <= db.DUPLICADO_RAIO_M ** 2]
+        t_varredura = (time.perf_counter() - t0) / 5
+        db.get_manager().close()
+
+    q = statistics.quantiles(tempos, n=100)
+    print(f"{pontos} pontos, {consultas} consultas, raio {db.DUPLICADO_RAIO_M:.0f} m ({achados} duplicados achados)")
+    print(f"  criação do R*Tree (1ª vez): {t_esquema:8.1f} s")
+    print(f"  R*Tree  p50 / p99:          {q[49] * 1e3:8.2f} / {q[98] * 1e3:.2f} ms")
+    print(f"  varredura da tabela:        {t_varredura * 1e3:8.1f} ms")
+
+
+def bench_lote(cadastros: int) -> None:
+    """
+    Gravação de `cadastros` pontos: um insert_ponto (uma transação) por
+    cadastro x um lote só em db.insert_pontos, como a fila offline do form.py.
+    O lote é enviado duas vezes para mostrar que o reenvio não duplica.
+    """
+    df = pontos_sinteticos(cadastros)
+    registros = [
+        dict(r, client_id=f"bench-{i}")
+        for i, r in enumerate(df[["pin", "nome", "pnrs", "lat", "long", "data_registro"]].to_dict("records"))
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "lote.db")
+        banco_sintetico(path, 1_000)
+        db.DB_PATH = path
+        db.get_data_version()  # cria o esquema antes de medir
+
+        t0 = time.perf_counter()
+        for r in registros:
+            db.insert_ponto(r["pin"], r["nome"], r["pnrs"], r["lat"], r["long"], r["data_registro"])
+        t_um = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        inseridos = db.insert_pontos(registros)
+        t_lote = time.perf_counter() - t0
+        reenviados = db.insert_pontos(registros)
+        db.get_manager().close()
+
+    print(f"{cadastros} cadastros")
+    print(f"  um por vez:   {t_um * 1e3:8.1f} ms ({t_um / cadastros * 1e3:.2f} ms/cadastro)")
+    print(f"  lote único:   {t_lote * 1e3:8.1f} ms ({inseridos} inseridos)")
+    print(f"  reenvio:      {reenviados:8d} inseridos (client_id repetido é ignorado)")
+
+
+def _carga_escrita(gravar, submissores: int, cadastros: int):
+    """
+    `submissores` threads gravando `cadastros` pontos cada, ao mesmo tempo.
+    Devolve (latências em s, erros, duração total em s).
+    """
+    erros = []
+    inicio = threading.Barrier(submissores)
+
+    def submissor(k):
+        inicio.wait()
+        tempos = []
+        for i in range(cadastros):
+            registro = {
+                "pin": 1 + (k + i) % 6,
+                "nome": f"Carga {k}-{i}",
+                "pnrs": "",
+                "lat": CENTRO[0],
+                "long": CENTRO[1],
+                "data_registro": "2025-12-11",
+            }
+            t0 = time.perf_counter()
+            try:
+                gravar(registro)
+            except Exception as e:
+                erros.append(e)
+                continue
+            tempos.append(time.perf_counter() - t0)
+        return tempos
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=submissores) as ex:
+        latencias = [t for tempos in ex.map(submissor, range(submissores)) for t in tempos]
+    return latencias, len(erros), time.perf_counter() - t0
+
+
+def bench_escrita(submissores: int, cadastros: int) -> None:
+    """
+    Cadastros por segundo e latência com muitos submissores simultâneos:
+    conexão nova por cadastro (original), insert_ponto (conexão de escrita
+    compartilhada, um commit por cadastro) e o gravador (commits em grupo).
+    """
+    campos = ["pin", "nome", "pnrs", "lat", "long", "data_registro"]
+    resultados = []
+    with tempfile.TemporaryDirectory() as tmp:
+        antigo = os.path.join(tmp, "antigo.db")
+        banco_sintetico(antigo, 1_000)
+        with sqlite3.connect(antigo) as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+        resultados.append(
+            ("original",)
+            + _carga_escrita(lambda r: _insert_antigo(antigo, [r[c] for c in campos]), submissores, cadastros)
+        )
+
+        for nome in ("insert_ponto", "gravador"):
+            db.DB_PATH = os.path.join(tmp, f"{nome}.db")
+            banco_sintetico(db.DB_PATH, 1_000)
+            db.get_data_version()  # cria o esquema antes de medir
+            if nome == "insert_ponto":
+                gravar = lambda r: db.insert_ponto(*(r[c] for c in campos))
+            else:
+                gravador = Gravador()
+                gravar = lambda r: gravador.submit([r]).result()
+            resultados.append((nome,) + _carga_escrita(gravar, submissores, cadastros))
+            db.get_manager().close()
+
+    print(f"{submissores} submissores x {cadastros} cadastros")
+    print(f"{'caminho':>12} | {'cad/s':>7} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'erros':>5}")
+    for nome, lat, erros, duracao in resultados:
+        q = statistics.quantiles(lat, n=100)
+        print(
+            f"{nome:>12} | {len(lat) / duracao:>7.0f} | {q[49] * 1e3:>9.1f} | "
+            f"{q[98] * 1e3:>9.1f} | {erros:>5}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cenario", required=True)
+
+    p = sub.add_parser("marcadores", help="montagem do mapa: loop de Marker x camada vetorizada")
+    p.add_argument("--tamanhos", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    p.add_argument("--loop-max", type=int, default=1_000, help="maior n medido de fato no loop antigo")
+
+    p = sub.add_parser("conexoes", help="latência de fetch_pontos com sessões concorrentes")
+    p.add_argument("--pontos", type=int, default=20_000)
+    p.add_argument("--sessoes", type=int, default=8)
+    p.add_argument("--consultas", type=int, default=50)
+
+    p = sub.add_parser("assets", help="bytes e tempo por rerun das imagens de fundo e slides")
+    p.add_argument("--reruns", type=int, default=20)
+
+    p = sub.add_parser("rerun", help="latência de uma sequência de pans, área por rerun x mantida na sessão")
+    p.add_argument("--pontos", type=int, default=10_000)
+    p.add_argument("--reruns", type=int, default=30)
+
+    p = sub.add_parser("duplicados", help="latência da checagem de duplicados do form.py")
+    p.add_argument("--pontos", type=int, default=1_000_000)
+    p.add_argument("--consultas", type=int, default=200)
+
+    p = sub.add_parser("lote", help="cadastros um a um x lote idempotente (fila offline)")
+    p.add_argument("--cadastros", type=int, default=500)
+
+    p = sub.add_parser("escrita", help="cadastros/s e p99 com submissores simultâneos: um commit cada x gravador")
+    p.add_argument("--submissores", type=int, default=50)
+    p.add_argument("--cadastros", type=int, default=40)
+
+    args = parser.parse_args()
+    if args.cenario == "marcadores":
+        bench_marcadores(args.tamanhos, args.loop_max)
+    elif args.cenario == "conexoes":
+        bench_conexoes(args.pontos, args.sessoes, args.consultas)
+    elif args.cenario == "assets":
+        bench_assets(args.reruns)
+    elif args.cenario == "rerun":
+        bench_rerun(args.pontos, args.reruns)
+    elif args.cenario == "duplicados":
+        bench_duplicados(args.pontos, args.consultas)
+    elif args.cenario == "lote":
+        bench_lote(args.cadastros)
+    elif args.cenario == "escrita":
+        bench_escrita(args.submissores, args.cadastros)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Categorias dos pontos (pin -> rótulo), compartilhadas pelas páginas e pela importação.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Optional
+
+CATEGORY_LABELS = {
+    1: "Acúmulo de Pneu",
+    2: "Descarte de Eletroeletrônicos",
+    3: "Descartes de Móveis e Colchões",
+    4: "Descarte de Resíduos Hospitalares",
+    5: "Pontos Viciados de Resíduos Comum",
+    6: "Descarte de Entulhos de Obras",
+}
+
+
+def _normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos e com espaços simples."""
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return " ".join(texto.lower().split())
+
+
+_PIN_POR_ROTULO = {_normalizar(label): pin for pin, label in CATEGORY_LABELS.items()}
+
+
+def pin_da_categoria(valor) -> Optional[int]:
+    """
+    Pin a partir do que vier na planilha: 3, "3", "Pin 3", "Pin 3 - Descartes..."
+    ou o rótulo (sem diferenciar acentos e maiúsculas). None se não reconhecer.
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        pin = int(valor)
+        return pin if pin == valor and pin in CATEGORY_LABELS else None
+
+    return _pin_do_texto(str(valor))
+
+
+@lru_cache(maxsize=1024)
+def _pin_do_texto(valor: str) -> Optional[int]:
+    texto = _normalizar(valor)
+    m = re.fullmatch(r"(?:pin\s*)?(\d+)(?:\s*-.*)?", texto)
+    if m:
+        pin = int(m.group(1))
+        return pin if pin in CATEGORY_LABELS else None
+    return _PIN_POR_ROTULO.get(texto)
@@ -8,6 +8,9 @@ backgroundColor = "#FFFFFF"
 secondaryBackgroundColor = "#F8F9FA"
 textColor = "#333333"
 font = "sans serif"
+
+[server]
+enableStaticServing = true
 """
 
 # 1. Cria a pasta .streamlit se não existir
@@ -1,49 +1,1221 @@
+import math
+import queue
+import re
 import sqlite3
-from typing import List, Optional
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
+from fotos import FOTOS_POR_PONTO, foto_valida
+from migrations import migrate
+from setores import get_index as get_setor_index
+
 DB_PATH = "banco.db"
 
+# Ajustes de desempenho aplicados em toda conexão
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 32 * 1024          # cache de páginas por conexão (~32 MB)
+MMAP_SIZE = 256 * 1024 * 1024      # leitura via mmap (até 256 MB do arquivo)
+READ_POOL_SIZE = 4                 # conexões de leitura abertas ao mesmo tempo
+
+# Pirâmide de agregação: níveis de zoom com contagem por célula da grade.
+# A célula tem 1/GRADE_CELULAS_POR_TILE da largura de um tile do zoom
+# (~64 px na tela); acima de GRADE_ZOOMS o mapa mostra os pontos.
+GRADE_ZOOMS = range(8, 15)
+GRADE_CELULAS_POR_TILE = 4
+
+# Checagem de duplicados no cadastro: mesmo pin, até N metros, nos últimos M dias
+DUPLICADO_RAIO_M = 30.0
+DUPLICADO_DIAS = 30
+METROS_POR_GRAU = 111_320.0
+
+# Resumo por (pin, mês, célula): célula fixa de ~2 km, bem maior que um ponto
+# e pequena o bastante para recortar bairros.
+RESUMO_CELULA_GRAUS = 0.02
+RESUMO_MESES = 12  # meses no gráfico de tendência da sidebar
+
+# data_registro é gravado como inteiro: dias desde EPOCH (epoch-day). Filtros
+# de período comparam inteiros direto no índice, sem converter texto.
+EPOCH = date(1970, 1, 1)
+
+# Índice espacial R*Tree espelhando (lat, long) de cada ponto.
+# Os triggers mantêm o índice em sincronia com a tabela pontos.
+RTREE_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS pontos_rtree USING rtree(
+    id, min_lat, max_lat, min_long, max_long
+);
+
+CREATE TRIGGER IF NOT EXISTS pontos_rtree_ai AFTER INSERT ON pontos BEGIN
+    INSERT INTO pontos_rtree (id, min_lat, max_lat, min_long, max_long)
+    VALUES (NEW.id, NEW.lat, NEW.lat, NEW.long, NEW.long);
+END;
+
+CREATE TRIGGER IF NOT EXISTS pontos_rtree_au AFTER UPDATE OF lat, long ON pontos BEGIN
+    UPDATE pontos_rtree
+    SET min_lat = NEW.lat, max_lat = NEW.lat, min_long = NEW.long, max_long = NEW.long
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS pontos_rtree_ad AFTER DELETE ON pontos BEGIN
+    DELETE FROM pontos_rtree WHERE id = OLD.id;
+END;
+"""
+
+# Contador de versão dos dados, usado pelos caches para saber o que mudou.
+# O UPDATE só conta nas colunas que os caches guardam: reatribuir setores
+# (setores.py) não deve forçar a recarga da tabela inteira.
+VERSAO_SQL = """
+CREATE TABLE IF NOT EXISTS pontos_versao (
+    id       INTEGER PRIMARY KEY CHECK (id = 1),
+    versao   INTEGER NOT NULL,
+    mutacoes INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO pontos_versao (id, versao, mutacoes) VALUES (1, 0, 0);
+
+CREATE TRIGGER IF NOT EXISTS pontos_versao_ai AFTER INSERT ON pontos BEGIN
+    UPDATE pontos_versao SET versao = versao + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS pontos_versao_au
+AFTER UPDATE OF pin, nome, pnrs, lat, long, data_registro, client_id ON pontos BEGIN
+    UPDATE pontos_versao SET versao = versao + 1, mutacoes = mutacoes + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS pontos_versao_ad AFTER DELETE ON pontos BEGIN
+    UPDATE pontos_versao SET versao = versao + 1, mutacoes = mutacoes + 1 WHERE id = 1;
+END;
+"""
+
+
+# Contagem de pontos por (zoom, célula, pin), com a soma das coordenadas
+# para o centróide de cada célula. Mantida pelos triggers a cada escrita.
+GRADE_SQL = """
+CREATE TABLE IF NOT EXISTS grade_niveis (
+    zoom    INTEGER PRIMARY KEY,
+    tamanho REAL    NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pontos_grade (
+    zoom      INTEGER NOT NULL,
+    cx        INTEGER NOT NULL,
+    cy        INTEGER NOT NULL,
+    pin       INTEGER NOT NULL,
+    n         INTEGER NOT NULL,
+    soma_lat  REAL    NOT NULL,
+    soma_long REAL    NOT NULL,
+    PRIMARY KEY (zoom, cx, cy, pin)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS pontos_grade_ai AFTER INSERT ON pontos BEGIN
+    INSERT INTO pontos_grade (zoom, cx, cy, pin, n, soma_lat, soma_long)
+    SELECT zoom,
+           CAST((NEW.long + 180.0) / tamanho AS INTEGER),
+           CAST((NEW.lat + 90.0) / tamanho AS INTEGER),
+           NEW.pin, 1, NEW.lat, NEW.long
+    FROM grade_niveis
+    WHERE true
+    ON CONFLICT (zoom, cx, cy, pin) DO UPDATE SET
+        n = n + 1,
+        soma_lat = soma_lat + excluded.soma_lat,
+        soma_long = soma_long + excluded.soma_long;
+END;
+
+CREATE TRIGGER IF NOT EXISTS pontos_grade_ad AFTER DELETE ON pontos BEGIN
+    UPDATE pontos_grade
+    SET n = n - 1, soma_lat = soma_lat - OLD.lat, soma_long = soma_long - OLD.long
+    WHERE (zoom, cx, cy, pin) IN (
+        SELECT zoom,
+               CAST((OLD.long + 180.0) / tamanho AS INTEGER),
+               CAST((OLD.lat + 90.0) / tamanho AS INTEGER),
+               OLD.pin
+        FROM grade_niveis
+    );
+    DELETE FROM pontos_grade
+    WHERE (zoom, cx, cy, pin) IN (
+        SELECT zoom,
+               CAST((OLD.long + 180.0) / tamanho AS INTEGER),
+               CAST((OLD.lat + 90.0) / tamanho AS INTEGER),
+               OLD.pin
+        FROM grade_niveis
+    ) AND n <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS pontos_grade_au AFTER UPDATE OF pin, lat, long ON pontos BEGIN
+    UPDATE pontos_grade
+    SET n = n - 1, soma_lat = soma_lat - OLD.lat, soma_long = soma_long - OLD.long
+    WHERE (zoom, cx, cy, pin) IN (
+        SELECT zoom,
+               CAST((OLD.long + 180.0) / tamanho AS INTEGER),
+               CAST((OLD.lat + 90.0) / tamanho AS INTEGER),
+               OLD.pin
+        FROM grade_niveis
+    );
+    DELETE FROM pontos_grade
+    WHERE (zoom, cx, cy, pin) IN (
+        SELECT zoom,
+               CAST((OLD.long + 180.0) / tamanho AS INTEGER),
+               CAST((OLD.lat + 90.0) / tamanho AS INTEGER),
+               OLD.pin
+        FROM grade_niveis
+    ) AND n <= 0;
+    INSERT INTO pontos_grade (zoom, cx, cy, pin, n, soma_lat, soma_long)
+    SELECT zoom,
+           CAST((NEW.long + 180.0) / tamanho AS INTEGER),
+           CAST((NEW.lat + 90.0) / tamanho AS INTEGER),
+           NEW.pin, 1, NEW.lat, NEW.long
+    FROM grade_niveis
+    WHERE true
+    ON CONFLICT (zoom, cx, cy, pin) DO UPDATE SET
+        n = n + 1,
+        soma_lat = soma_lat + excluded.soma_lat,
+        soma_long = soma_long + excluded.soma_long;
+END;
+"""
+
+
+# Confirmações ("reforços") de um ponto já cadastrado, em vez de uma linha
+# nova em pontos. Ficam em tabela separada para não disparar os triggers
+# de UPDATE (que invalidariam os caches dos mapas).
+REFORCOS_SQL = """
+CREATE TABLE IF NOT EXISTS pontos_reforcos (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    ponto_id      INTEGER NOT NULL REFERENCES pontos (id),
+    data_registro INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_pontos_reforcos_ponto ON pontos_reforcos (ponto_id, data_registro);
+
+CREATE TRIGGER IF NOT EXISTS pontos_reforcos_ad AFTER DELETE ON pontos BEGIN
+    DELETE FROM pontos_reforcos WHERE ponto_id = OLD.id;
+END;
+"""
+
+# Fotos anexadas a um ponto (no cadastro ou num reforço): só o hash do
+# arquivo guardado por fotos.py. Como os reforços, não mexem em pontos.
+FOTOS_SQL = """
+CREATE TABLE IF NOT EXISTS pontos_fotos (
+    ponto_id      INTEGER NOT NULL REFERENCES pontos (id),
+    foto          TEXT    NOT NULL,
+    data_registro INTEGER NOT NULL,
+    PRIMARY KEY (ponto_id, foto)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS pontos_fotos_ad AFTER DELETE ON pontos BEGIN
+    DELETE FROM pontos_fotos WHERE ponto_id = OLD.id;
+END;
+"""
+
+# a foto de um cadastro enviado pela fila chega com o client_id, não com o id
+INSERT_FOTO_CLIENTE_SQL = """
+INSERT OR IGNORE INTO pontos_fotos (ponto_id, foto, data_registro)
+SELECT id, ?, ? FROM pontos WHERE client_id = ?
+"""
+
+
+def _resumo_chave(linha: str) -> str:
+    """Expressões de (pin, mes, cx, cy) do resumo para NEW, OLD ou um alias de pontos."""
+    return (
+        f"{linha}.pin, "
+        f"COALESCE(CAST(strftime('%Y%m', {linha}.data_registro * 86400, 'unixepoch') AS INTEGER), 0), "
+        f"CAST(({linha}.long + 180.0) / {RESUMO_CELULA_GRAUS} AS INTEGER), "
+        f"CAST(({linha}.lat + 90.0) / {RESUMO_CELULA_GRAUS} AS INTEGER)"
+    )
+
+
+# Contagem de pontos por (pin, mês AAAAMM, célula), para os totais e a
+# tendência da sidebar sem GROUP BY em pontos: o tamanho depende de
+# pins x meses x células, não do número de pontos. Mantida pelos triggers.
+RESUMO_SQL = f"""
+CREATE TABLE IF NOT EXISTS pontos_resumo (
+    pin INTEGER NOT NULL,
+    mes INTEGER NOT NULL,
+    cx  INTEGER NOT NULL,
+    cy  INTEGER NOT NULL,
+    n   INTEGER NOT NULL,
+    PRIMARY KEY (pin, mes, cx, cy)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS pontos_resumo_ai AFTER INSERT ON pontos BEGIN
+    INSERT INTO pontos_resumo (pin, mes, cx, cy, n)
+    VALUES ({_resumo_chave("NEW")}, 1)
+    ON CONFLICT (pin, mes, cx, cy) DO UPDATE SET n = n + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS pontos_resumo_ad AFTER DELETE ON pontos BEGIN
+    UPDATE pontos_resumo SET n = n - 1 WHERE (pin, mes, cx, cy) = ({_resumo_chave("OLD")});
+    DELETE FROM pontos_resumo WHERE (pin, mes, cx, cy) = ({_resumo_chave("OLD")}) AND n <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS pontos_resumo_au AFTER UPDATE OF pin, lat, long, data_registro ON pontos BEGIN
+    UPDATE pontos_resumo SET n = n - 1 WHERE (pin, mes, cx, cy) = ({_resumo_chave("OLD")});
+    DELETE FROM pontos_resumo WHERE (pin, mes, cx, cy) = ({_resumo_chave("OLD")}) AND n <= 0;
+    INSERT INTO pontos_resumo (pin, mes, cx, cy, n)
+    VALUES ({_resumo_chave("NEW")}, 1)
+    ON CONFLICT (pin, mes, cx, cy) DO UPDATE SET n = n + 1;
+END;
+"""
+
+# Soma ao resumo os pontos com id > {{desde_id}} (carga em massa e reconstrução).
+RESUMO_NOVOS_SQL = f"""
+INSERT INTO pontos_resumo (pin, mes, cx, cy, n)
+SELECT {_resumo_chave("p")}, COUNT(*)
+FROM pontos p
+WHERE p.id > {{desde_id}}
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (pin, mes, cx, cy) DO UPDATE SET n = n + excluded.n;
+"""
+
+
+# Busca textual em nome e pnrs (FTS5 com conteúdo externo: o índice guarda
+# só os termos; o texto continua em pontos). Sem acentos e sem maiúsculas.
+FTS_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS pontos_fts USING fts5(
+    nome, pnrs,
+    content = 'pontos', content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS pontos_fts_ai AFTER INSERT ON pontos BEGIN
+    INSERT INTO pontos_fts (rowid, nome, pnrs) VALUES (NEW.id, NEW.nome, NEW.pnrs);
+END;
+
+CREATE TRIGGER IF NOT EXISTS pontos_fts_ad AFTER DELETE ON pontos BEGIN
+    INSERT INTO pontos_fts (pontos_fts, rowid, nome, pnrs) VALUES ('delete', OLD.id, OLD.nome, OLD.pnrs);
+END;
+
+CREATE TRIGGER IF NOT EXISTS pontos_fts_au AFTER UPDATE OF nome, pnrs ON pontos BEGIN
+    INSERT INTO pontos_fts (pontos_fts, rowid, nome, pnrs) VALUES ('delete', OLD.id, OLD.nome, OLD.pnrs);
+    INSERT INTO pontos_fts (rowid, nome, pnrs) VALUES (NEW.id, NEW.nome, NEW.pnrs);
+END;
+"""
+
+FTS_NOVOS_SQL = """
+INSERT INTO pontos_fts (rowid, nome, pnrs) SELECT id, nome, pnrs FROM pontos WHERE id > {desde_id};
+"""
+
+BUSCA_LIMITE = 200         # resultados da busca mostrados no mapa
+BUSCA_CANDIDATOS = 2000    # ranqueia só as N ocorrências mais recentes
+BUSCA_PESOS = (2.0, 1.0)   # peso do nome e do pnrs no bm25
+
+
+# Triggers de INSERT que mantêm as estruturas derivadas. Numa carga em massa
+# (bulk_load) eles saem durante a carga e tudo é atualizado de uma vez no fim.
+TRIGGERS_INSERCAO = ("pontos_rtree_ai", "pontos_grade_ai", "pontos_resumo_ai", "pontos_fts_ai", "pontos_versao_ai")
+
+# Carga em massa em andamento: a linha existe do início de bulk_load até o
+# fim do bloco. Se ficar (processo morto no meio da carga), a próxima carga
+# refaz a pirâmide, o resumo, a busca e a versão antes de começar.
+CARGA_SQL = """
+CREATE TABLE IF NOT EXISTS carga_em_massa (
+    id INTEGER PRIMARY KEY CHECK (id = 1)
+);
+"""
+
+# Soma à pirâmide os pontos com id > {desde_id}. É agregada uma vez no
+# nível mais fino e os outros níveis saem dessas células: o lado da célula
+# dobra a cada nível de zoom, então a célula do nível z é a do nível mais
+# fino deslocada (>>) de (max - z) bits.
+GRADE_NOVOS_SQL = """
+CREATE TEMP TABLE grade_novos AS
+SELECT CAST((p.long + 180.0) / g.tamanho AS INTEGER) AS cx,
+       CAST((p.lat + 90.0) / g.tamanho AS INTEGER) AS cy,
+       p.pin, COUNT(*) AS n, SUM(p.lat) AS soma_lat, SUM(p.long) AS soma_long
+FROM pontos p
+JOIN grade_niveis g ON g.zoom = (SELECT MAX(zoom) FROM grade_niveis)
+WHERE p.id > {desde_id}
+GROUP BY 1, 2, 3;
+
+INSERT INTO pontos_grade (zoom, cx, cy, pin, n, soma_lat, soma_long)
+SELECT g.zoom, cx >> (m.zoom - g.zoom), cy >> (m.zoom - g.zoom), pin,
+       SUM(n), SUM(soma_lat), SUM(soma_long)
+FROM grade_novos
+CROSS JOIN grade_niveis g
+CROSS JOIN (SELECT MAX(zoom) AS zoom FROM grade_niveis) m
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (zoom, cx, cy, pin) DO UPDATE SET
+    n = n + excluded.n,
+    soma_lat = soma_lat + excluded.soma_lat,
+    soma_long = soma_long + excluded.soma_long;
+
+DROP TABLE grade_novos;
+"""
+
+# Atualiza R*Tree, pirâmide e versão para os pontos com id > {desde_id}.
+INDEXAR_NOVOS_SQL = (
+    """
+INSERT INTO pontos_rtree (id, min_lat, max_lat, min_long, max_long)
+SELECT id, lat, lat, long, long FROM pontos WHERE id > {desde_id};
+"""
+    + GRADE_NOVOS_SQL
+    + """
+UPDATE pontos_versao SET versao = versao + 1 WHERE id = 1;
+"""
+)
+
+INSERT_PONTO_SQL = """
+INSERT INTO pontos (client_id, pin, nome, pnrs, lat, long, data_registro, setor)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (client_id) DO NOTHING
+"""
+
+
+def epoch_day(valor) -> Optional[int]:
+    """Data (date, datetime, "AAAA-MM-DD" ou o próprio inteiro) em epoch-day; None se vazia."""
+    if valor is None or valor == "":
+        return None
+    if isinstance(valor, datetime):
+        valor = valor.date()
+    if isinstance(valor, date):
+        return (valor - EPOCH).days
+    if isinstance(valor, (int, np.integer)):
+        return int(valor)
+    return (date.fromisoformat(str(valor).strip()[:10]) - EPOCH).days
 
-def get_connection():
-    # check_same_thread=False para uso com Streamlit
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
 
+def epoch_day_iso(dia) -> str:
+    """Epoch-day em "AAAA-MM-DD" ("" se vazio)."""
+    if dia is None or dia != dia:  # None ou NaN
+        return ""
+    return (EPOCH + timedelta(days=int(dia))).isoformat()
 
-def insert_ponto(pin: int, nome: str, pnrs: str, lat: float, long: float, data_registro: str) -> None:
-    conn = get_connection()
-    cursor = conn.cursor()
 
-    cursor.execute(
+def epoch_days_iso(dias) -> List[str]:
+    """epoch_day_iso de uma coluna inteira, vetorizado (popups e tabelas)."""
+    valores = np.asarray(dias, dtype="float64")
+    texto = np.full(valores.shape, "", dtype=object)
+    ok = ~np.isnan(valores)
+    texto[ok] = valores[ok].astype("int64").astype("datetime64[D]").astype(str)
+    return texto.tolist()
+
+
+def grade_tamanho(zoom: int) -> float:
+    """Lado da célula da grade, em graus, para o nível de zoom."""
+    return 360.0 / (2 ** zoom) / GRADE_CELULAS_POR_TILE
+
+
+def rebuild_grade(conn: sqlite3.Connection) -> None:
+    """Recalcula a pirâmide inteira a partir da tabela pontos (um GROUP BY)."""
+    conn.execute("DELETE FROM pontos_grade")
+    conn.execute(
         """
-        INSERT INTO pontos (pin, nome, pnrs, lat, long, data_registro)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """,
-        (pin, nome, pnrs, lat, long, data_registro),
+        INSERT INTO pontos_grade (zoom, cx, cy, pin, n, soma_lat, soma_long)
+        SELECT g.zoom,
+               CAST((p.long + 180.0) / g.tamanho AS INTEGER),
+               CAST((p.lat + 90.0) / g.tamanho AS INTEGER),
+               p.pin, COUNT(*), SUM(p.lat), SUM(p.long)
+        FROM pontos p CROSS JOIN grade_niveis g
+        GROUP BY 1, 2, 3, 4
+        """
+    )
+
+
+def rebuild_resumo(conn: sqlite3.Connection) -> None:
+    """Recalcula o resumo por (pin, mês, célula) a partir da tabela pontos."""
+    conn.execute("DELETE FROM pontos_resumo")
+    conn.execute(RESUMO_NOVOS_SQL.format(desde_id=0))
+
+
+def _completar_rtree(conn: sqlite3.Connection) -> None:
+    """Põe no R*Tree os pontos que faltarem."""
+    # o NOT IN percorre a tabela inteira; as contagens são bem mais baratas
+    faltando = conn.execute("SELECT (SELECT COUNT(*) FROM pontos) != (SELECT COUNT(*) FROM pontos_rtree)").fetchone()[0]
+    if faltando:
+        conn.execute(
+            """
+            INSERT INTO pontos_rtree (id, min_lat, max_lat, min_long, max_long)
+            SELECT id, lat, lat, long, long
+            FROM pontos
+            WHERE id NOT IN (SELECT id FROM pontos_rtree)
+            """
+        )
+
+
+def _retomar_carga(conn: sqlite3.Connection) -> None:
+    """
+    Refaz o que uma carga em massa interrompida deixou de atualizar.
+
+    Não dá para partir do id em que ela começou: depois da queda, os
+    triggers voltam (_ensure_schema) e o app pode ter gravado pontos já
+    indexados. Tudo é recalculado a partir de pontos, e a versão muda como
+    num UPDATE, para os caches recarregarem a tabela inteira.
+    """
+    _completar_rtree(conn)
+    conn.executescript(
+        "BEGIN;\n"
+        + "DELETE FROM pontos_grade;\n"
+        + GRADE_NOVOS_SQL.format(desde_id=0)
+        + "DELETE FROM pontos_resumo;\n"
+        + RESUMO_NOVOS_SQL.format(desde_id=0)
+        + "INSERT INTO pontos_fts (pontos_fts) VALUES ('rebuild');\n"
+        + "UPDATE pontos_versao SET versao = versao + 1, mutacoes = mutacoes + 1 WHERE id = 1;\n"
+        + "DELETE FROM carga_em_massa;\n"
+        + "COMMIT;"
     )
 
+
+_TRIGGER_RE = re.compile(r"CREATE TRIGGER IF NOT EXISTS (\w+)(.*?\bEND);", re.S)
+
+
+def _criar(conn: sqlite3.Connection, script: str) -> None:
+    """
+    Roda um script de CREATE ... IF NOT EXISTS, recriando os triggers cuja
+    definição no banco não é mais a do script (o IF NOT EXISTS os manteria).
+    """
+    atuais = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"))
+    for nome, corpo in _TRIGGER_RE.findall(script):
+        # o SQLite guarda o texto do CREATE sem o IF NOT EXISTS e sem o ";"
+        if atuais.get(nome, f"CREATE TRIGGER {nome}{corpo}") != f"CREATE TRIGGER {nome}{corpo}":
+            conn.execute(f"DROP TRIGGER {nome}")
+    conn.executescript(script)
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    """
+    Aplica as migrações pendentes (migrations.py) e cria o R*Tree, o contador
+    de versão, a pirâmide, o resumo, a busca textual, os reforços e as
+    fotos, preenchendo o que faltar.
+    """
+    migrate(conn)
+    _criar(conn, RTREE_SQL)
+    _criar(conn, VERSAO_SQL)
+    _criar(conn, GRADE_SQL)
+    _criar(conn, RESUMO_SQL)
+    _criar(conn, REFORCOS_SQL)
+    _criar(conn, FOTOS_SQL)
+    _criar(conn, CARGA_SQL)
+
+    fts_existia = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'pontos_fts'").fetchone()
+    _criar(conn, FTS_SQL)
+    if not fts_existia:
+        conn.execute("INSERT INTO pontos_fts (pontos_fts) VALUES ('rebuild')")
+
+    niveis = [(z, grade_tamanho(z)) for z in GRADE_ZOOMS]
+    atuais = conn.execute("SELECT zoom, tamanho FROM grade_niveis ORDER BY zoom").fetchall()
+    if atuais != niveis:
+        conn.execute("DELETE FROM grade_niveis")
+        conn.executemany("INSERT INTO grade_niveis (zoom, tamanho) VALUES (?, ?)", niveis)
+        rebuild_grade(conn)
+
+    _completar_rtree(conn)
+
+    desatualizado = conn.execute(
+        "SELECT (SELECT COUNT(*) FROM pontos) != (SELECT COALESCE(SUM(n), 0) FROM pontos_resumo)"
+    ).fetchone()[0]
+    if desatualizado:
+        rebuild_resumo(conn)
+    conn.commit()
+
+
+def _connect(path: str, read_only: bool = False) -> sqlite3.Connection:
+    # check_same_thread=False para uso com Streamlit
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def get_connection(read_only: bool = False) -> sqlite3.Connection:
+    """Abre uma conexão avulsa (fora do pool) já com os PRAGMAs de desempenho."""
+    return _connect(DB_PATH, read_only=read_only)
+
+
+class ConnectionManager:
+    """
+    Conexões persistentes para um arquivo SQLite, compartilhadas entre threads.
+
+    - Uma única conexão de escrita, protegida por lock (o SQLite só aceita um
+      escritor por vez de qualquer forma).
+    - Um pool de conexões de leitura. Com WAL, leitores não esperam o
+      escritor, então o mapa não trava enquanto um formulário é salvo.
+
+    As conexões ficam abertas enquanto o processo do Streamlit estiver vivo,
+    então são reaproveitadas entre reruns e sessões.
+    """
+
+    def __init__(self, path: str, read_pool_size: int = READ_POOL_SIZE):
+        self.path = path
+        self._init_lock = threading.Lock()
+        self._ready = False
+        self._write_lock = threading.Lock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._read_slots = threading.BoundedSemaphore(read_pool_size)
+
+    def _init(self) -> None:
+        """Na primeira utilização: liga o WAL e garante o esquema auxiliar."""
+        if self._ready:
+            return
+        with self._init_lock:
+            if self._ready:
+                return
+            with self._write_lock:
+                self._writer = _connect(self.path)
+                # journal_mode fica gravado no arquivo; basta ligar uma vez
+                self._writer.execute("PRAGMA journal_mode = WAL")
+                _ensure_schema(self._writer)
+            self._ready = True
+
+    @contextmanager
+    def reader(self):
+        """Empresta uma conexão de leitura do pool."""
+        self._init()
+        with self._read_slots:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                conn = _connect(self.path, read_only=True)
+            try:
+                yield conn
+            finally:
+                self._readers.put(conn)
+
+    @contextmanager
+    def writer(self):
+        """Conexão de escrita exclusiva; faz commit no fim ou rollback em caso de erro."""
+        self._init()
+        with self._write_lock:
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def close(self) -> None:
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._ready = False
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager() -> ConnectionManager:
+    """Gerenciador de conexões do DB_PATH atual (um por arquivo, por processo)."""
+    with _managers_lock:
+        manager = _managers.get(DB_PATH)
+        if manager is None:
+            manager = _managers[DB_PATH] = ConnectionManager(DB_PATH)
+        return manager
+
+
+@contextmanager
+def bulk_load(conn: sqlite3.Connection):
+    """
+    Carga em massa em `conn` (a conexão de escrita, ver write_connection).
+
+    Durante o bloco, os triggers de TRIGGERS_INSERCAO ficam desligados e
+    quem carrega faz os próprios commits (um por lote). No fim, mesmo com
+    erro, os triggers voltam e o R*Tree, a pirâmide e a versão são
+    atualizados (com o resumo e a busca) para todos os ids novos numa única
+    transação.
+
+    Se o processo morrer no meio, a marca em carga_em_massa fica, e a
+    próxima carga começa refazendo tudo (_retomar_carga).
+    """
+    if conn.execute("SELECT 1 FROM carga_em_massa").fetchone():
+        _retomar_carga(conn)
+
+    desde_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM pontos").fetchone()[0]
+    for nome in TRIGGERS_INSERCAO:
+        conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+    conn.execute("INSERT INTO carga_em_massa (id) VALUES (1)")
     conn.commit()
-    conn.close()
+
+    try:
+        yield
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.executescript(
+            "BEGIN;\n"
+            + RTREE_SQL
+            + VERSAO_SQL
+            + GRADE_SQL
+            + RESUMO_SQL
+            + FTS_SQL
+            + INDEXAR_NOVOS_SQL.format(desde_id=int(desde_id))
+            + RESUMO_NOVOS_SQL.format(desde_id=int(desde_id))
+            + FTS_NOVOS_SQL.format(desde_id=int(desde_id))
+            + "DELETE FROM carga_em_massa;\n"
+            + "COMMIT;"
+        )
+
+
+def read_connection():
+    return get_manager().reader()
+
+
+def write_connection():
+    return get_manager().writer()
+
+
+def with_setor(conn: sqlite3.Connection, linhas: List[tuple]) -> List[tuple]:
+    """
+    Linhas na ordem de INSERT_PONTO_SQL, sem o setor, com o setor no fim:
+    o lote inteiro é localizado de uma vez no índice de setores (setores.py).
+    """
+    index = get_setor_index(conn)
+    if index is None or not linhas:
+        return [linha + (None,) for linha in linhas]
+    setores = index.localizar([linha[4] for linha in linhas], [linha[5] for linha in linhas])
+    return [linha + (int(s) if s >= 0 else None,) for linha, s in zip(linhas, setores.tolist())]
 
 
-def fetch_pontos(pins: Optional[List[int]] = None) -> pd.DataFrame:
-    conn = get_connection()
+def insert_ponto(pin: int, nome: str, pnrs: str, lat: float, long: float, data_registro) -> None:
+    linha = (None, pin, nome, pnrs, lat, long, epoch_day(data_registro))
+    with write_connection() as conn:
+        conn.execute(INSERT_PONTO_SQL, with_setor(conn, [linha])[0])
+
+
+def _fotos_validas(fotos) -> List[str]:
+    """
+    Só os hashes de fotos já guardadas (fotos.foto_valida), até FOTOS_POR_PONTO.
+
+    Os outros são descartados sem erro: o lote do gravador junta cadastros
+    de várias sessões, e um valor forjado não pode derrubar os demais.
+    """
+    return [foto for foto in fotos or () if foto_valida(foto)][:FOTOS_POR_PONTO]
+
+
+def insert_registros(conn: sqlite3.Connection, registros: List[dict]) -> int:
+    """
+    Insere os registros na transação aberta em `conn` (sem commit).
+
+    Cada registro traz pin, nome, pnrs, lat, long, data_registro (data ou
+    "AAAA-MM-DD", ver epoch_day) e, opcionalmente, client_id. Um client_id já gravado é ignorado, então
+    reenviar o mesmo lote não cria linhas repetidas.
+    Com client_id, o registro pode trazer também "fotos": hashes de
+    fotos.salvar_foto, ligados ao ponto em pontos_fotos (ver _fotos_validas).
+    Retorna quantos pontos novos foram inseridos.
+    """
+    linhas = [
+        (
+            None if r.get("client_id") is None else str(r["client_id"]),
+            int(r["pin"]),
+            str(r["nome"]),
+            str(r.get("pnrs") or ""),
+            float(r["lat"]),
+            float(r["long"]),
+            epoch_day(r["data_registro"]),
+        )
+        for r in registros
+    ]
+    if not linhas:
+        return 0
+
+    cur = conn.executemany(INSERT_PONTO_SQL, with_setor(conn, linhas))
+    # rowcount do executemany não conta as linhas escritas pelos triggers
+    inseridos = cur.rowcount
+
+    fotos = [
+        (foto, linha[6], linha[0])
+        for r, linha in zip(registros, linhas)
+        if linha[0] is not None
+        for foto in _fotos_validas(r.get("fotos"))
+    ]
+    if fotos:
+        conn.executemany(INSERT_FOTO_CLIENTE_SQL, fotos)
+    return inseridos
+
+
+def insert_pontos(registros: List[dict]) -> int:
+    """Grava um lote de cadastros (ver insert_registros) numa única transação."""
+    with write_connection() as conn:
+        return insert_registros(conn, registros)
+
+
+def add_reforco(ponto_id: int, data_registro, fotos: Optional[List[str]] = None) -> int:
+    """
+    Registra mais uma confirmação do ponto e devolve o total de reforços dele.
+
+    fotos: hashes (fotos.salvar_foto) tiradas na confirmação, anexadas ao ponto.
+    """
+    with write_connection() as conn:
+        conn.execute(
+            "INSERT INTO pontos_reforcos (ponto_id, data_registro) VALUES (?, ?)",
+            (ponto_id, epoch_day(data_registro)),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO pontos_fotos (ponto_id, foto, data_registro) VALUES (?, ?, ?)",
+            [(ponto_id, foto, epoch_day(data_registro)) for foto in _fotos_validas(fotos)],
+        )
+        row = conn.execute("SELECT COUNT(*) FROM pontos_reforcos WHERE ponto_id = ?", (ponto_id,)).fetchone()
+    return row[0]
+
+
+def find_duplicates(
+    pin: int,
+    lat: float,
+    long: float,
+    raio_m: float = DUPLICADO_RAIO_M,
+    dias: int = DUPLICADO_DIAS,
+    hoje: Optional[date] = None,
+) -> pd.DataFrame:
+    """
+    Pontos do mesmo `pin` a até `raio_m` metros, ativos nos últimos `dias`.
+
+    "Ativo" = cadastrado ou reforçado dentro do período. O R*Tree recorta o
+    quadrado em volta do raio (só algumas linhas, qualquer que seja o tamanho
+    da tabela) e a distância exata é calculada só nelas.
+
+    Colunas: id, nome, pnrs, lat, long, data_registro (AAAA-MM-DD), reforcos,
+    distancia_m; ordenado do mais próximo para o mais distante.
+    """
+    d_lat = raio_m / METROS_POR_GRAU
+    d_long = raio_m / (METROS_POR_GRAU * max(math.cos(math.radians(lat)), 1e-6))
+    desde = epoch_day(hoje or date.today()) - dias
+
+    query = """
+        SELECT p.id, p.nome, p.pnrs, p.lat, p.long, p.data_registro,
+               COUNT(f.id) AS reforcos,
+               MAX(COALESCE(p.data_registro, 0), COALESCE(MAX(f.data_registro), 0)) AS ultima_data
+        FROM pontos_rtree r
+        JOIN pontos p ON p.id = r.id
+        LEFT JOIN pontos_reforcos f ON f.ponto_id = p.id
+        WHERE r.max_lat >= ? AND r.min_lat <= ?
+          AND r.max_long >= ? AND r.min_long <= ?
+          AND p.pin = ?
+        GROUP BY p.id
+        HAVING ultima_data >= ?
+    """
+    params = [lat - d_lat, lat + d_lat, long - d_long, long + d_long, pin, desde]
+
+    with read_connection() as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+
+    # distância equiretangular: erro desprezível na escala de dezenas de metros
+    cos_lat = math.cos(math.radians(lat))
+    dx = (df["long"] - long) * METROS_POR_GRAU * cos_lat
+    dy = (df["lat"] - lat) * METROS_POR_GRAU
+    df["distancia_m"] = (dx * dx + dy * dy) ** 0.5
+    df = df[df["distancia_m"] <= raio_m].sort_values("distancia_m")
+    df["data_registro"] = epoch_days_iso(df["data_registro"])
+    return df.drop(columns="ultima_data").reset_index(drop=True)
+
+
+def _filtro_periodo(coluna: str, desde, ate) -> Tuple[str, list]:
+    """Trecho " AND ..." do período (inclusivo) em epoch-day; vazio sem período."""
+    sql, params = "", []
+    if desde is not None:
+        sql += f" AND {coluna} >= ?"
+        params.append(epoch_day(desde))
+    if ate is not None:
+        sql += f" AND {coluna} <= ?"
+        params.append(epoch_day(ate))
+    return sql, params
+
+
+def pontos_query(pins: Optional[List[int]] = None, since_id: int = 0, desde=None, ate=None) -> Tuple[str, list]:
+    """
+    (sql, params) da consulta de pontos do mapa (ver fetch_pontos).
+
+    Com pins, é respondida pelo índice de cobertura idx_pontos_mapa; com
+    período, pelos índices de data_registro. migrations.check_query_plans
+    confere que continua assim.
+    """
+    query = """
+        SELECT id, pin, nome, pnrs, lat, long, data_registro
+        FROM pontos
+        WHERE id > ?
+    """
+    params = [since_id]
 
     if pins:
         placeholders = ",".join("?" * len(pins))
-        query = f"""
-            SELECT pin, nome, pnrs, lat, long, data_registro
-            FROM pontos
-            WHERE pin IN ({placeholders})
-        """
-        df = pd.read_sql_query(query, conn, params=pins)
-    else:
-        query = """
-            SELECT pin, nome, pnrs, lat, long, data_registro
+        query += f" AND pin IN ({placeholders})"
+        params += list(pins)
+
+    periodo, periodo_params = _filtro_periodo("data_registro", desde, ate)
+    return query + periodo, params + periodo_params
+
+
+def fetch_pontos(pins: Optional[List[int]] = None, since_id: int = 0, desde=None, ate=None) -> pd.DataFrame:
+    """
+    Pontos das categorias em `pins` (todas, se vazio).
+
+    since_id: traz só pontos com id maior que este (carga incremental;
+    o id é AUTOINCREMENT, então pontos novos sempre têm id maior).
+    desde/ate: período de data_registro (inclusivo; date, "AAAA-MM-DD" ou
+    epoch-day), filtrado no SQL. data_registro vem em epoch-day.
+    """
+    query, params = pontos_query(pins, since_id, desde, ate)
+
+    with read_connection() as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+
+    return df
+
+
+def fetch_pontos_bbox(
+    min_lat: float,
+    min_long: float,
+    max_lat: float,
+    max_long: float,
+    pins: Optional[List[int]] = None,
+    since_id: int = 0,
+    desde=None,
+    ate=None,
+) -> pd.DataFrame:
+    """
+    Pontos dentro do retângulo (min_lat, min_long) - (max_lat, max_long),
+    com os mesmos filtros de fetch_pontos.
+
+    A busca passa pelo R*Tree; como ele guarda as coordenadas em float32,
+    o filtro é repetido nas colunas originais para não trazer pontos da borda.
+    """
+    query = """
+        SELECT p.id, p.pin, p.nome, p.pnrs, p.lat, p.long, p.data_registro
+        FROM pontos_rtree r
+        JOIN pontos p ON p.id = r.id
+        WHERE r.max_lat >= ? AND r.min_lat <= ?
+          AND r.max_long >= ? AND r.min_long <= ?
+          AND p.lat BETWEEN ? AND ?
+          AND p.long BETWEEN ? AND ?
+          AND r.id > ?
+    """
+    params = [min_lat, max_lat, min_long, max_long, min_lat, max_lat, min_long, max_long, since_id]
+
+    if pins:
+        placeholders = ",".join("?" * len(pins))
+        query += f" AND p.pin IN ({placeholders})"
+        params += list(pins)
+
+    periodo, periodo_params = _filtro_periodo("p.data_registro", desde, ate)
+    query += periodo
+    params += periodo_params
+
+    with read_connection() as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+
+    return df
+
+
+def fts_query(texto: str) -> str:
+    """
+    Texto digitado -> consulta FTS5: todas as palavras, a última como prefixo
+    ("pneu colch" acha "Colchões"), que é a que ainda está sendo digitada.
+    As outras ficam exatas: prefixo de um termo muito comum obriga o FTS5 a
+    ler a lista inteira dele. As aspas neutralizam a sintaxe do FTS5
+    (AND, OR, NEAR, *, -...) que viesse no texto.
+    """
+    palavras = [f'"{p.replace(chr(34), chr(34) * 2)}"' for p in texto.split() if p.strip('"')]
+    if palavras:
+        palavras[-1] += "*"
+    return " ".join(palavras)
+
+
+def search_pontos(
+    texto: str,
+    pins: Optional[List[int]] = None,
+    desde=None,
+    ate=None,
+    limite: int = BUSCA_LIMITE,
+) -> pd.DataFrame:
+    """
+    Pontos cujo nome ou classificação PNRS contém as palavras de `texto`,
+    do mais ao menos relevante (bm25, com o nome pesando mais).
+
+    Só as BUSCA_CANDIDATOS ocorrências mais recentes são ranqueadas: o FTS5
+    as entrega em ordem de rowid sem ler tudo, e uma palavra presente em
+    quase todos os pontos não obriga a ordenar a tabela inteira.
+
+    Combina com os filtros de fetch_pontos (pins e período). Colunas as de
+    fetch_pontos mais rank (menor = mais relevante); vazio se não houver
+    palavras.
+    """
+    consulta = fts_query(texto)
+    if not consulta:
+        return pd.DataFrame(columns=["id", "pin", "nome", "pnrs", "lat", "long", "data_registro", "rank"])
+
+    query = f"""
+        SELECT p.id, p.pin, p.nome, p.pnrs, p.lat, p.long, p.data_registro,
+               bm25(pontos_fts, {BUSCA_PESOS[0]}, {BUSCA_PESOS[1]}) AS rank
+        FROM pontos_fts
+        JOIN pontos p ON p.id = pontos_fts.rowid
+        WHERE pontos_fts MATCH ?
+    """
+    params: list = [consulta]
+
+    if pins:
+        placeholders = ",".join("?" * len(pins))
+        query += f" AND p.pin IN ({placeholders})"
+        params += list(pins)
+
+    periodo, periodo_params = _filtro_periodo("p.data_registro", desde, ate)
+    query = f"""
+        SELECT * FROM ({query}{periodo} ORDER BY pontos_fts.rowid DESC LIMIT ?)
+        ORDER BY rank LIMIT ?
+    """
+    params += periodo_params + [BUSCA_CANDIDATOS, limite]
+
+    with read_connection() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+EXPORT_COLUMNS = ["id", "pin", "nome", "pnrs", "lat", "long", "data_registro"]
+EXPORT_LOTE = 5000
+
+
+def iter_pontos(
+    pins: Optional[List[int]] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    desde=None,
+    ate=None,
+    lote: int = EXPORT_LOTE,
+) -> Iterator[List[tuple]]:
+    """
+    Pontos filtrados em lotes de até `lote` linhas (colunas de EXPORT_COLUMNS).
+
+    Os filtros são os de fetch_pontos (pins) e fetch_pontos_bbox (bbox),
+    mais o período de data_registro (desde/ate, inclusivos, ver fetch_pontos).
+    A data sai como texto AAAA-MM-DD.
+    As linhas vêm do cursor com fetchmany, então só um lote fica em memória
+    de cada vez, qualquer que seja o tamanho da tabela.
+    """
+    query = """
+        SELECT p.id, p.pin, p.nome, p.pnrs, p.lat, p.long, date(p.data_registro * 86400, 'unixepoch')
+        FROM pontos p
+    """
+    where, params = ["p.id > 0"], []
+
+    if bbox is not None:
+        min_lat, min_long, max_lat, max_long = bbox
+        query += " JOIN pontos_rtree r ON r.id = p.id"
+        where.append(
+            "r.max_lat >= ? AND r.min_lat <= ? AND r.max_long >= ? AND r.min_long <= ?"
+            " AND p.lat BETWEEN ? AND ? AND p.long BETWEEN ? AND ?"
+        )
+        params += [min_lat, max_lat, min_long, max_long, min_lat, max_lat, min_long, max_long]
+    if pins:
+        where.append(f"p.pin IN ({','.join('?' * len(pins))})")
+        params += list(pins)
+    periodo, periodo_params = _filtro_periodo("p.data_registro", desde or None, ate or None)
+
+    query += " WHERE " + " AND ".join(where) + periodo + " ORDER BY p.id"
+    params += periodo_params
+
+    with read_connection() as conn:
+        cur = conn.execute(query, params)
+        try:
+            while True:
+                linhas = cur.fetchmany(lote)
+                if not linhas:
+                    break
+                yield linhas
+        finally:
+            cur.close()
+
+
+def get_data_version() -> Tuple[int, int]:
+    """
+    (versao, mutacoes) da tabela pontos, mantidos pelos triggers.
+
+    versao muda a cada INSERT, UPDATE ou DELETE; mutacoes só em UPDATE e
+    DELETE. Se só a versao mudou, basta buscar os ids novos.
+    """
+    with read_connection() as conn:
+        row = conn.execute("SELECT versao, mutacoes FROM pontos_versao WHERE id = 1").fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def fetch_pin_counts() -> Dict[int, int]:
+    """Total de pontos por pin, lido do resumo (pontos_resumo), sem varrer pontos."""
+    with read_connection() as conn:
+        rows = conn.execute("SELECT pin, SUM(n) FROM pontos_resumo GROUP BY pin").fetchall()
+    return {int(pin): int(n) for pin, n in rows}
+
+
+def fetch_trend(pins: Optional[List[int]] = None, meses: int = RESUMO_MESES) -> pd.DataFrame:
+    """
+    Pontos registrados por mês e pin, nos últimos `meses` meses com registro.
+
+    Colunas: mes ("AAAA-MM"), pin, n. Lido do resumo: o custo depende do
+    número de meses e células, não do tamanho da tabela.
+    """
+    query = """
+        SELECT printf('%04d-%02d', mes / 100, mes % 100) AS mes, pin, SUM(n) AS n
+        FROM pontos_resumo
+        WHERE mes >= (SELECT COALESCE(MIN(mes), 0) FROM (
+            SELECT DISTINCT mes FROM pontos_resumo WHERE mes > 0 ORDER BY mes DESC LIMIT ?
+        ))
+          AND mes > 0
+    """
+    params: list = [meses]
+
+    if pins:
+        placeholders = ",".join("?" * len(pins))
+        query += f" AND pin IN ({placeholders})"
+        params += list(pins)
+
+    query += " GROUP BY 1, 2 ORDER BY 1, 2"
+
+    with read_connection() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+def fetch_fotos(ponto_ids) -> Dict[int, List[str]]:
+    """Hashes das fotos de cada ponto pedido (lista vazia se não tiver), da mais antiga à mais nova."""
+    ids = sorted({int(i) for i in ponto_ids})
+    fotos: Dict[int, List[str]] = {i: [] for i in ids}
+    with read_connection() as conn:
+        # em blocos: o SQLite limita o número de parâmetros por consulta
+        for k in range(0, len(ids), 500):
+            bloco = ids[k:k + 500]
+            rows = conn.execute(
+                f"""
+                SELECT ponto_id, foto FROM pontos_fotos
+                WHERE ponto_id IN ({",".join("?" * len(bloco))})
+                ORDER BY ponto_id, data_registro, foto
+                """,
+                bloco,
+            ).fetchall()
+            for ponto_id, foto in rows:
+                fotos[ponto_id].append(foto)
+    return fotos
+
+
+def fetch_ponto_ids(client_ids) -> List[int]:
+    """Ids dos pontos com esses client_ids (os que já estiverem gravados)."""
+    client_ids = sorted({str(c) for c in client_ids})
+    ids: List[int] = []
+    with read_connection() as conn:
+        for k in range(0, len(client_ids), 500):
+            bloco = client_ids[k:k + 500]
+            rows = conn.execute(
+                f"SELECT id FROM pontos WHERE client_id IN ({','.join('?' * len(bloco))})", bloco
+            ).fetchall()
+            ids += [row[0] for row in rows]
+    return ids
+
+
+def fetch_pontos_com_foto() -> List[int]:
+    """Ids dos pontos com alguma foto."""
+    with read_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT DISTINCT ponto_id FROM pontos_fotos ORDER BY ponto_id")]
+
+
+def fetch_setores() -> pd.DataFrame:
+    """Setores carregados (setores.py): id, nome e geometria (GeoJSON em texto)."""
+    with read_connection() as conn:
+        return pd.read_sql_query("SELECT id, nome, geometria FROM setores ORDER BY id", conn)
+
+
+def fetch_setor_counts(pins: Optional[List[int]] = None, desde=None, ate=None) -> pd.DataFrame:
+    """
+    Pontos por setor e pin (colunas setor, pin, n), com os filtros de
+    fetch_pontos. Lido só do índice idx_pontos_setor.
+    """
+    query = "SELECT setor, pin, COUNT(*) AS n FROM pontos WHERE setor IS NOT NULL"
+    params: list = []
+
+    if pins:
+        placeholders = ",".join("?" * len(pins))
+        query += f" AND pin IN ({placeholders})"
+        params += list(pins)
+
+    periodo, periodo_params = _filtro_periodo("data_registro", desde, ate)
+    query += periodo + " GROUP BY setor, pin"
+    params += periodo_params
+
+    with read_connection() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+def grade_level(zoom: Optional[float]) -> Optional[int]:
+    """Nível da pirâmide para o zoom do mapa, ou None se o zoom já mostra pontos."""
+    if zoom is None:
+        return None
+    zoom = int(zoom)
+    if zoom > GRADE_ZOOMS[-1]:
+        return None
+    return max(zoom, GRADE_ZOOMS[0])
+
+
+def fetch_grade(
+    zoom: int,
+    pins: Optional[List[int]] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    desde=None,
+    ate=None,
+) -> pd.DataFrame:
+    """
+    Células da pirâmide no nível `zoom` (ver grade_level), somando os pins.
+
+    Colunas: lat, long (centróide dos pontos da célula), n (total) e
+    pins ("pin:n,pin:n", contagem por categoria). O custo depende do
+    número de células, não do número de pontos.
+
+    Com período (desde/ate, ver fetch_pontos), a pirâmide não serve (ela
+    conta todas as datas): as células são agregadas na hora a partir dos
+    pontos do período, que o índice de data_registro já separa.
+    """
+    fonte = "pontos_grade"
+    params: list = []
+    if desde is not None or ate is not None:
+        tamanho = grade_tamanho(zoom)
+        periodo, params = _filtro_periodo("data_registro", desde, ate)
+        fonte = f"""(
+            SELECT ? AS zoom,
+                   CAST((long + 180.0) / ? AS INTEGER) AS cx,
+                   CAST((lat + 90.0) / ? AS INTEGER) AS cy,
+                   pin, COUNT(*) AS n, SUM(lat) AS soma_lat, SUM(long) AS soma_long
             FROM pontos
-        """
-        df = pd.read_sql_query(query, conn)
+            WHERE true{periodo}
+            GROUP BY 2, 3, 4
+        )"""
+        params = [zoom, tamanho, tamanho] + params
+
+    query = f"""
+        SELECT SUM(soma_lat) / SUM(n) AS lat,
+               SUM(soma_long) / SUM(n) AS long,
+               SUM(n) AS n,
+               group_concat(pin || ':' || n) AS pins
+        FROM {fonte}
+        WHERE zoom = ?
+    """
+    params.append(zoom)
+
+    if bbox is not None:
+        tamanho = grade_tamanho(zoom)
+        min_lat, min_long, max_lat, max_long = bbox
+        query += " AND cx BETWEEN ? AND ? AND cy BETWEEN ? AND ?"
+        params += [
+            int((min_long + 180.0) / tamanho),
+            int((max_long + 180.0) / tamanho),
+            int((min_lat + 90.0) / tamanho),
+            int((max_lat + 90.0) / tamanho),
+        ]
+
+    if pins:
+        placeholders = ",".join("?" * len(pins))
+        query += f" AND pin IN ({placeholders})"
+        params += list(pins)
+
+    query += " GROUP BY cx, cy"
+
+    with read_connection() as conn:
+        df = pd.read_sql_query(query, conn, params=params)
 
-    conn.close()
     return df
@@ -0,0 +1,183 @@
+"""
+Exportação da tabela pontos em CSV, GeoJSON ou Parquet, em streaming.
+
+Uso:
+    python exportar.py pontos.csv [--pins 1 5] [--bbox MIN_LAT MIN_LONG MAX_LAT MAX_LONG]
+        [--desde 2024-01-01] [--ate 2024-12-31] [--formato csv|geojson|parquet]
+    python exportar.py - --formato geojson > pontos.geojson
+
+As linhas saem do SQLite em lotes (db.iter_pontos) e cada lote é escrito
+antes de ler o próximo: a memória fica constante e, na saída padrão ("-"),
+os primeiros bytes saem antes de a consulta terminar.
+
+No app.py o arquivo é gerado em static/exports/ e baixado pelo static
+serving do Streamlit, que lê do disco em partes; o download_button
+carregaria o arquivo inteiro na memória do servidor.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+from typing import BinaryIO, Iterable, List, Optional
+
+import db
+from assets import STATIC_DIR
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # sem pyarrow, só CSV e GeoJSON
+    pa = pq = None
+
+EXPORT_DIR = os.path.join(STATIC_DIR, "exports")
+EXPORT_URL = "app/static/exports"
+EXPORTS_MANTIDOS = 20  # arquivos mais recentes mantidos em static/exports/
+
+FORMATOS = {
+    "csv": "text/csv",
+    "geojson": "application/geo+json",
+}
+if pq is not None:
+    FORMATOS["parquet"] = "application/vnd.apache.parquet"
+
+Lotes = Iterable[List[tuple]]
+
+
+def _escrever_csv(lotes: Lotes, destino: BinaryIO) -> None:
+    texto = io.TextIOWrapper(destino, encoding="utf-8", newline="", write_through=True)
+    escritor = csv.writer(texto)
+    escritor.writerow(db.EXPORT_COLUMNS)
+    for linhas in lotes:
+        escritor.writerows(linhas)
+    texto.detach()
+
+
+def _feature(linha: tuple) -> dict:
+    id_, pin, nome, pnrs, lat, lng, data = linha
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lng, lat]},
+        "properties": {"id": id_, "pin": pin, "nome": nome, "pnrs": pnrs, "data_registro": data},
+    }
+
+
+def _escrever_geojson(lotes: Lotes, destino: BinaryIO) -> None:
+    destino.write(b'{"type": "FeatureCollection", "features": [\n')
+    primeiro = True
+    for linhas in lotes:
+        bloco = ",\n".join(json.dumps(_feature(linha), ensure_ascii=False) for linha in linhas)
+        destino.write(((",\n" if not primeiro else "") + bloco).encode("utf-8"))
+        primeiro = False
+    destino.write(b"\n]}\n")
+
+
+def _escrever_parquet(lotes: Lotes, destino: BinaryIO) -> None:
+    if pq is None:
+        raise RuntimeError("Exportar em Parquet requer o pyarrow: pip install pyarrow")
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("pin", pa.int32()),
+            ("nome", pa.string()),
+            ("pnrs", pa.string()),
+            ("lat", pa.float64()),
+            ("long", pa.float64()),
+            ("data_registro", pa.string()),
+        ]
+    )
+    # um row group por lote; o rodapé do Parquet só é escrito no fim
+    with pq.ParquetWriter(destino, schema) as escritor:
+        for linhas in lotes:
+            colunas = list(zip(*linhas))
+            escritor.write_table(pa.Table.from_arrays([pa.array(c) for c in colunas], schema=schema))
+
+
+ESCRITORES = {
+    "csv": _escrever_csv,
+    "geojson": _escrever_geojson,
+    "parquet": _escrever_parquet,
+}
+
+
+def exportar(destino: BinaryIO, formato: str, pins=None, bbox=None, desde=None, ate=None, lote=db.EXPORT_LOTE) -> None:
+    """Escreve em `destino` (arquivo binário) os pontos filtrados, lote a lote."""
+    ESCRITORES[formato](db.iter_pontos(pins, bbox, desde, ate, lote), destino)
+
+
+def _limpar_exports() -> None:
+    """Mantém os EXPORTS_MANTIDOS arquivos prontos mais recentes; os .tmp são exportações ainda em andamento."""
+    arquivos = sorted(
+        (os.path.join(EXPORT_DIR, nome) for nome in os.listdir(EXPORT_DIR) if not nome.endswith(".tmp")),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for path in arquivos[EXPORTS_MANTIDOS:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def export_url(formato: str, versao, pins=None, bbox=None, desde=None, ate=None) -> str:
+    """
+    Gera (se ainda não existir) o arquivo exportado em static/exports/ e devolve a URL.
+
+    O nome vem do hash dos filtros e da versão dos dados, então o mesmo
+    pedido sem dados novos reaproveita o arquivo já gerado.
+    """
+    chave = json.dumps([formato, list(versao), sorted(pins or []), bbox, desde, ate])
+    nome = f"sara-pontos-{hashlib.sha256(chave.encode()).hexdigest()[:16]}.{formato}"
+    destino = os.path.join(EXPORT_DIR, nome)
+
+    if not os.path.exists(destino):
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        tmp = f"{destino}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                exportar(f, formato, pins, bbox, desde, ate)
+            os.replace(tmp, destino)
+        except BaseException:
+            # _limpar_exports não mexe em .tmp: o arquivo incompleto ficaria para sempre
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        _limpar_exports()
+
+    return f"{EXPORT_URL}/{nome}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("saida", help='arquivo de saída, ou "-" para a saída padrão')
+    parser.add_argument("--formato", choices=list(FORMATOS), help="padrão: extensão do arquivo de saída")
+    parser.add_argument("--banco", default=db.DB_PATH, help="arquivo SQLite de origem")
+    parser.add_argument("--pins", type=int, nargs="+", help="categorias (padrão: todas)")
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("MIN_LAT", "MIN_LONG", "MAX_LAT", "MAX_LONG"))
+    parser.add_argument("--desde", help="data_registro inicial (AAAA-MM-DD)")
+    parser.add_argument("--ate", help="data_registro final (AAAA-MM-DD)")
+    parser.add_argument("--lote", type=int, default=db.EXPORT_LOTE, help="linhas por lote")
+    args = parser.parse_args()
+
+    formato: Optional[str] = args.formato or os.path.splitext(args.saida)[1].lstrip(".").lower()
+    if formato not in FORMATOS:
+        parser.error(f"informe --formato ({', '.join(FORMATOS)})")
+
+    db.DB_PATH = args.banco
+    filtros = dict(pins=args.pins, bbox=tuple(args.bbox) if args.bbox else None, desde=args.desde, ate=args.ate)
+
+    if args.saida == "-":
+        exportar(sys.stdout.buffer, formato, lote=args.lote, **filtros)
+        sys.stdout.buffer.flush()
+    else:
+        with open(args.saida, "wb") as f:
+            exportar(f, formato, lote=args.lote, **filtros)
+
+
+if __name__ == "__main__":
+    main()
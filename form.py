@@ -1,21 +1,16 @@
 import json
-import time
+import queue
 from datetime import datetime
-import base64
 import os
+import uuid
 
 import streamlit as st
-from streamlit_js_eval import get_geolocation
-from db import insert_ponto
-
-CATEGORY_LABELS = {
-    1: "Acúmulo de Pneu",
-    2: "Descarte de Eletroeletrônicos",
-    3: "Descartes de Móveis e Colchões",
-    4: "Descarte de Resíduos Hospitalares",
-    5: "Pontos Viciados de Resíduos Comum",
-    6: "Descarte de Entulhos de Obras",
-}
+from streamlit_js_eval import streamlit_js_eval
+from db import add_reforco, find_duplicates
+from gravador import get_gravador, validar_registros
+from assets import asset_url
+from categorias import CATEGORY_LABELS
+import fotos
 
 # ===== Helpers de fundo =====
 
@@ -25,14 +20,13 @@ def set_background(image_path: str):
         st.warning(f"Imagem de fundo não encontrada: {image_path}")
         return
 
-    with open(image_path, "rb") as f:
-        data = f.read()
-    encoded = base64.b64encode(data).decode()
+    # URL estática com cache HTTP, em vez de reenviar o PNG em base64 a cada rerun
+    url = asset_url(image_path, variant="webp")
 
     css = f"""
     <style>
     .stApp {{
-        background-image: url("data:image/png;base64,{encoded}");
+        background-image: url("{url}");
         background-size: cover;
         background-position: center center;
         background-attachment: fixed;
@@ -51,8 +45,56 @@ def set_background(image_path: str):
 
 AWAIT_TIMEOUT = 8  # segundos máximos esperando resposta do navegador
 
-def _now() -> float:
-    return time.time()
+# Pedido de localização feito uma única vez no navegador. A Promise só
+# resolve quando há resposta (coordenadas, erro ou o tempo limite), e aí o
+# componente devolve o valor e dispara um único rerun; enquanto isso o
+# servidor não executa nada.
+GEOLOCATION_JS = """
+new Promise(function (resolve) {
+    if (!navigator.geolocation) {
+        resolve({error: "geolocation unsupported"});
+        return;
+    }
+    var limite = setTimeout(function () { resolve({error: "timeout"}); }, %(ms)d);
+    navigator.geolocation.getCurrentPosition(
+        function (pos) {
+            clearTimeout(limite);
+            resolve({latitude: pos.coords.latitude, longitude: pos.coords.longitude});
+        },
+        function (err) {
+            clearTimeout(limite);
+            resolve({error: err.code === 1 ? "permission denied" : (err.message || "timeout")});
+        },
+        {enableHighAccuracy: true, timeout: %(ms)d, maximumAge: 0}
+    );
+})
+""" % {"ms": AWAIT_TIMEOUT * 1000}
+
+# Fila de cadastros guardada no aparelho (localStorage), para não perder
+# nada com sinal fraco. Cada chamada remove os já confirmados pelo servidor,
+# acrescenta os novos (o client_id vem do servidor, em _salvar; um novo já
+# presente na fila não entra de novo) e devolve o que ainda falta enviar; o
+# servidor grava tudo de uma vez (gravador.py).
+FILA_STORAGE_KEY = "sara_fila_cadastros"
+ENVIO_TIMEOUT = 15  # segundos esperando a confirmação da gravação
+ENVIO_MAX = 100     # cadastros por envio; o resto da fila vai no envio seguinte
+FILA_JS = """
+(function (novos, confirmados) {
+    var fila = JSON.parse(localStorage.getItem("%(chave)s") || "[]");
+    fila = fila.filter(function (r) {
+        return r && typeof r.client_id === "string" && confirmados.indexOf(r.client_id) < 0;
+    });
+    var ids = fila.map(function (r) { return r.client_id; });
+    novos.forEach(function (r) {
+        if (ids.indexOf(r.client_id) < 0) {
+            ids.push(r.client_id);
+            fila.push(r);
+        }
+    });
+    localStorage.setItem("%(chave)s", JSON.stringify(fila));
+    return fila;
+})(%(novos)s, %(confirmados)s)
+"""
 
 def _parse_nav_response(data):
     """
@@ -96,8 +138,18 @@ if "coords" not in st.session_state:
 if "loc_phase" not in st.session_state:
     st.session_state["loc_phase"] = None
 
-if "loc_await_t0" not in st.session_state:
-    st.session_state["loc_await_t0"] = None
+# Cada clique no botão usa uma key nova, para o navegador perguntar de novo
+if "loc_pedido" not in st.session_state:
+    st.session_state["loc_pedido"] = 0
+
+# Cadastro aguardando decisão: ponto parecido já existe por perto
+if "duplicado" not in st.session_state:
+    st.session_state["duplicado"] = None
+
+# Fila offline: cadastros a gravar no aparelho, ids já confirmados pelo
+# servidor e se ainda falta olhar a fila (cadastros de visitas anteriores)
+if "fila" not in st.session_state:
+    st.session_state["fila"] = {"seq": 0, "novos": [], "confirmados": [], "verificar": True, "pendentes": 0}
 
 # ===== Formulário de dados =====
 
@@ -115,49 +167,49 @@ pin_num = int(categoria_escolhida.split()[1])
 nome = st.text_input("Nome do ponto (descrição curta)")
 pnrs = st.text_input("Classificação PNRS (opcional)")
 
+# As fotos sobem com o formulário e ficam no servidor (fotos.py); a fila do
+# aparelho leva só os hashes. As miniaturas são geradas em segundo plano.
+fotos_enviadas = []
+if fotos.disponivel:
+    fotos_enviadas = st.file_uploader(
+        f"Fotos do ponto (opcional, até {fotos.FOTOS_POR_PONTO})",
+        type=["jpg", "jpeg", "png", "webp"],
+        accept_multiple_files=True,
+    ) or []
+else:
+    st.caption("Anexar fotos está desativado neste servidor (requer o Pillow: pip install pillow).")
+
 st.markdown("### Localização")
 
 # ===== Botão que DISPARA o pedido de localização =====
 
 if st.button("Solicitar localização do navegador"):
     st.session_state["loc_phase"] = "await"
-    st.session_state["loc_await_t0"] = _now()
+    st.session_state["loc_pedido"] += 1
     st.session_state["coords"] = None
-    st.rerun()
 
-# ===== Fase de espera: aqui é onde de fato chamamos get_geolocation() =====
+# ===== Fase de espera: o navegador devolve a resposta uma vez só =====
 
 if st.session_state["loc_phase"] == "await":
-    t0 = st.session_state["loc_await_t0"] or _now()
-    elapsed = _now() - float(t0)
-
-    st.info("Aguardando resposta do navegador... verifique o pedido de permissão de localização.")
-
-    try:
-        data = get_geolocation()
-    except Exception as e:
-        data = {"error": str(e)}
-
-    parsed = _parse_nav_response(data)
+    data = streamlit_js_eval(
+        js_expressions=GEOLOCATION_JS,
+        key=f"geolocalizacao_{st.session_state['loc_pedido']}",
+    )
 
-    if isinstance(parsed, tuple):
-        lat, lon = parsed
-        st.session_state["coords"] = {"lat": lat, "long": lon}
-        st.session_state["loc_phase"] = None
-        st.session_state["loc_await_t0"] = None
-        st.success(f"Localização obtida: lat={lat:.6f}, long={lon:.6f}")
-    elif parsed == "denied":
-        st.session_state["coords"] = None
-        st.session_state["loc_phase"] = None
-        st.session_state["loc_await_t0"] = None
-        st.error("Permissão de localização negada no navegador. Habilite o acesso para continuar.")
+    if data is None:
+        # ainda sem resposta: o componente dispara o rerun quando ela chegar
+        st.info("Aguardando resposta do navegador... verifique o pedido de permissão de localização.")
     else:
-        if elapsed < AWAIT_TIMEOUT:
-            st.rerun()
+        parsed = _parse_nav_response(data)
+        st.session_state["loc_phase"] = None
+
+        if isinstance(parsed, tuple):
+            lat, lon = parsed
+            st.session_state["coords"] = {"lat": lat, "long": lon}
+            st.success(f"Localização obtida: lat={lat:.6f}, long={lon:.6f}")
+        elif parsed == "denied":
+            st.error("Permissão de localização negada no navegador. Habilite o acesso para continuar.")
         else:
-            st.session_state["coords"] = None
-            st.session_state["loc_phase"] = None
-            st.session_state["loc_await_t0"] = None
             st.error("Não foi possível obter a localização dentro do tempo limite. Tente novamente.")
 
 coords = st.session_state["coords"]
@@ -178,23 +230,161 @@ st.markdown("---")
 
 finalizar = st.button("Finalizar cadastro", disabled=(coords is None))
 
+
+def _salvar(novo: dict) -> None:
+    """
+    Põe o cadastro na fila do aparelho; o envio ao servidor é feito por _sincronizar_fila.
+
+    O client_id é gerado aqui, uma vez por cadastro: se o navegador rodar o
+    FILA_JS de novo com o mesmo lote, o cadastro não é duplicado na fila.
+    """
+    novo["client_id"] = uuid.uuid4().hex
+    st.session_state["fila"]["novos"].append(novo)
+    st.success("Ponto salvo no aparelho! Enviando ao servidor...")
+
+
+def _guardar_fotos(arquivos) -> list:
+    """Guarda as fotos enviadas (fotos.salvar_foto) e devolve os hashes; None se alguma for recusada."""
+    if len(arquivos) > fotos.FOTOS_POR_PONTO:
+        st.error(f"Envie no máximo {fotos.FOTOS_POR_PONTO} fotos por ponto.")
+        return None
+    hashes = []
+    for arquivo in arquivos:
+        try:
+            hashes.append(fotos.salvar_foto(arquivo.getvalue()))
+        except fotos.FotoInvalida as e:
+            st.error(f"Foto {arquivo.name} recusada: {e}.")
+            return None
+    return hashes
+
+
+def _sincronizar_fila() -> None:
+    """
+    Um passo da sincronização com o localStorage (FILA_JS).
+
+    Só chama o navegador quando há algo a fazer. Quando ele devolve a fila,
+    o lote inteiro vai para o gravador (gravador.py) e os client_ids gravados são
+    removidos do aparelho no passo seguinte. Se o envio falhar, os cadastros
+    continuam no aparelho e o mesmo lote é reenviado depois, sem duplicar.
+    """
+    fila = st.session_state["fila"]
+    if not (fila["verificar"] or fila["novos"] or fila["confirmados"]):
+        return
+
+    restante = streamlit_js_eval(
+        js_expressions=FILA_JS % {
+            "chave": FILA_STORAGE_KEY,
+            "novos": json.dumps(fila["novos"]),
+            "confirmados": json.dumps(fila["confirmados"]),
+        },
+        key=f"fila_{fila['seq']}",
+    )
+    if restante is None:
+        return  # aguardando o navegador
+
+    fila["seq"] += 1
+    fila["novos"], fila["confirmados"], fila["verificar"] = [], [], False
+    restante = restante if isinstance(restante, list) else []
+    fila["pendentes"] = len(restante)
+    if not restante:
+        return
+
+    # a fila vem do aparelho: cada cadastro é conferido aqui, e os recusados saem de lá
+    validos, recusados = validar_registros(restante[:ENVIO_MAX])
+    for _, motivo in recusados:
+        st.warning(f"Um cadastro salvo no aparelho foi descartado: {motivo}.")
+
+    # a gravação é feita pela thread gravadora, junto com os lotes de outras sessões
+    if validos:
+        try:
+            inseridos = get_gravador().submit(validos).result(timeout=ENVIO_TIMEOUT)
+        except queue.Full:
+            st.warning("Servidor ocupado no momento. Os cadastros continuam salvos no aparelho; tente novamente.")
+            return
+        except Exception as e:
+            st.error(f"Erro ao enviar ao servidor: {e}. Os cadastros continuam salvos no aparelho.")
+            return
+        st.success(f"{len(validos)} cadastro(s) enviado(s) ao servidor ({inseridos} ponto(s) novo(s)).")
+
+    fila["confirmados"] = [r["client_id"] for r in validos] + [client_id for client_id, _ in recusados]
+    _sincronizar_fila()  # tira do aparelho o que já foi gravado ou recusado
+
+
 if finalizar:
+    hashes_fotos = _guardar_fotos(fotos_enviadas) if nome and coords else None
     if not nome:
         st.error("Informe o nome do ponto.")
     elif not coords:
         st.error("Capture a localização antes de finalizar.")
+    elif hashes_fotos is None:
+        pass  # foto recusada: o motivo já foi mostrado por _guardar_fotos
     else:
+        novo = {
+            "pin": pin_num,
+            "nome": nome,
+            "pnrs": pnrs,
+            "lat": float(coords["lat"]),
+            "long": float(coords["long"]),
+            "data_registro": datetime.now().strftime("%Y-%m-%d"),
+            "fotos": hashes_fotos,
+        }
+        # Antes de inserir: o mesmo monte já foi cadastrado por outro morador?
+        try:
+            duplicados = find_duplicates(novo["pin"], novo["lat"], novo["long"])
+        except Exception as e:
+            st.error(f"Erro ao consultar o banco: {e}")
+        else:
+            if duplicados.empty:
+                _salvar(novo)
+            else:
+                existente = duplicados.iloc[0]
+                st.session_state["duplicado"] = {
+                    "novo": novo,
+                    "id": int(existente["id"]),
+                    "nome": existente["nome"],
+                    "data_registro": existente["data_registro"],
+                    "reforcos": int(existente["reforcos"]),
+                    "distancia_m": float(existente["distancia_m"]),
+                }
+
+# ===== Ponto parecido por perto: confirmar o existente ou cadastrar mesmo assim =====
+
+duplicado = st.session_state["duplicado"]
+if duplicado:
+    aviso = st.empty()
+    with aviso.container():
+        st.warning(
+            f"Já existe um ponto desta categoria a {duplicado['distancia_m']:.0f} m: "
+            f"**{duplicado['nome']}**, cadastrado em {duplicado['data_registro']} "
+            f"e confirmado {duplicado['reforcos']} vez(es) por outros moradores. "
+            "É o mesmo local?"
+        )
+        col_sim, col_nao = st.columns(2)
+        confirmar = col_sim.button("Sim, confirmar o ponto existente")
+        cadastrar = col_nao.button("Não, cadastrar como novo ponto")
+
+    if confirmar or cadastrar:
+        aviso.empty()
+        st.session_state["duplicado"] = None
+
+    if confirmar:
         try:
-            data_registro = datetime.now().strftime("%Y-%m-%d")
-
-            insert_ponto(
-                pin=pin_num,
-                nome=nome,
-                pnrs=pnrs,
-                lat=float(coords["lat"]),
-                long=float(coords["long"]),
-                data_registro=data_registro,
-            )
-            st.success("Ponto cadastrado com sucesso!")
+            total = add_reforco(duplicado["id"], duplicado["novo"]["data_registro"], duplicado["novo"].get("fotos"))
+            if duplicado["novo"].get("fotos"):
+                fotos.publicar_manifestos([duplicado["id"]])
+            st.success(f"Obrigado! Ponto existente confirmado ({total} reforço(s)).")
         except Exception as e:
             st.error(f"Erro ao salvar no banco: {e}")
+    elif cadastrar:
+        _salvar(duplicado["novo"])
+
+# ===== Fila do aparelho: envia os cadastros pendentes em lote =====
+
+_sincronizar_fila()
+
+pendentes = st.session_state["fila"]["pendentes"]
+if pendentes and not st.session_state["fila"]["confirmados"]:
+    st.info(f"{pendentes} cadastro(s) salvo(s) no aparelho aguardando envio.")
+    if st.button("Tentar enviar novamente"):
+        st.session_state["fila"]["verificar"] = True
+        st.rerun()
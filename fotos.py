@@ -0,0 +1,206 @@
+"""
+Fotos dos pontos: armazenamento por conteúdo e miniaturas em segundo plano.
+
+Uso:
+    python fotos.py [--banco banco.db]
+
+refaz as variantes que faltarem e os manifestos de todos os pontos com
+foto (depois de uma queda do servidor, por exemplo).
+
+Cada foto enviada é gravada uma vez em fotos/<hh>/<hash>.<ext>, com o nome
+dado pelo SHA-256 do conteúdo; a mesma foto enviada de novo não ocupa
+espaço. O original não é servido: as variantes reduzidas (miniatura do
+popup e versão média), sem EXIF, vão para static/fotos/<hh>/ e são geradas
+num pool de processos, fora da requisição de quem cadastrou.
+
+O mapa não leva nada das fotos. Cada ponto com foto tem um manifesto
+static/fotos/pontos/<id>.json com os hashes, e o popup só o busca (e as
+miniaturas) quando é aberto; o HTML do mapa não cresce com as fotos.
+
+Requer Pillow e `enableStaticServing = true` em .streamlit/config.toml.
+"""
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, List, Optional
+
+from assets import STATIC_DIR
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # sem Pillow, o cadastro segue sem fotos
+    Image = ImageOps = None
+
+ORIGINAIS_DIR = "fotos"
+VARIANTES_DIR = os.path.join(STATIC_DIR, "fotos")
+MANIFESTOS_DIR = os.path.join(VARIANTES_DIR, "pontos")
+FOTOS_URL = "app/static/fotos"
+
+# variante -> maior lado em px (gravada em WEBP)
+VARIANTES = {
+    "thumb": 320,
+    "media": 1280,
+}
+WEBP_QUALIDADE = 80
+FOTO_MAX_BYTES = 15 * 1024 * 1024
+FOTOS_POR_PONTO = 5
+POOL_PROCESSOS = 2
+
+# formato do Pillow -> extensão do original
+FORMATOS = {"JPEG": "jpg", "MPO": "jpg", "PNG": "png", "WEBP": "webp"}
+
+disponivel = Image is not None
+
+_HASH_RE = re.compile(r"[0-9a-f]{64}")
+
+
+class FotoInvalida(ValueError):
+    """Arquivo recusado; a mensagem é mostrada a quem enviou."""
+
+
+def _gravar(destino: str, dados: bytes) -> None:
+    """Grava de forma atômica (arquivo temporário + rename)."""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    tmp = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(dados)
+    os.replace(tmp, destino)
+
+
+def _original(foto: str) -> Optional[str]:
+    pasta = os.path.join(ORIGINAIS_DIR, foto[:2])
+    for ext in set(FORMATOS.values()):
+        caminho = os.path.join(pasta, f"{foto}.{ext}")
+        if os.path.exists(caminho):
+            return caminho
+    return None
+
+
+def foto_valida(foto) -> bool:
+    """
+    Se `foto` é o hash de um original guardado por salvar_foto.
+
+    Os hashes chegam do aparelho (fila do cadastro): um valor qualquer
+    viraria URL no popup, e o hash de uma foto de outra pessoa só vale se
+    o arquivo já estiver aqui.
+    """
+    return isinstance(foto, str) and _HASH_RE.fullmatch(foto) is not None and _original(foto) is not None
+
+
+def _variante(foto: str, variante: str) -> str:
+    return os.path.join(VARIANTES_DIR, foto[:2], f"{foto}-{variante}.webp")
+
+
+def gerar_variantes(foto: str) -> List[str]:
+    """
+    Gera (se ainda não existirem) as variantes da foto; devolve as geradas.
+
+    Roda nos processos do pool: decodificar e reduzir uma foto de celular
+    leva centenas de ms de CPU, que não devem travar o servidor.
+    """
+    faltando = [v for v in VARIANTES if not os.path.exists(_variante(foto, v))]
+    origem = _original(foto)
+    if not faltando or origem is None:
+        return []
+
+    with Image.open(origem) as img:
+        img = ImageOps.exif_transpose(img)  # fotos de celular vêm "deitadas" com a rotação no EXIF
+        img = img.convert("RGB")
+        for variante in sorted(faltando, key=VARIANTES.get, reverse=True):
+            img.thumbnail((VARIANTES[variante], VARIANTES[variante]))
+            buf = io.BytesIO()
+            img.save(buf, format="WEBP", quality=WEBP_QUALIDADE, method=4)
+            _gravar(_variante(foto, variante), buf.getvalue())
+    return faltando
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: o servidor do Streamlit tem várias threads, e fork com threads é arriscado
+            _pool = ProcessPoolExecutor(max_workers=POOL_PROCESSOS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def agendar_variantes(foto: str) -> "Future[List[str]]":
+    """Põe a geração das variantes no pool de processos e volta na hora."""
+    global _pool
+    try:
+        return _get_pool().submit(gerar_variantes, foto)
+    except BrokenProcessPool:
+        # um processo morreu (falta de memória numa foto enorme, por exemplo): recria o pool
+        with _pool_lock:
+            _pool = None
+        return _get_pool().submit(gerar_variantes, foto)
+
+
+def salvar_foto(dados: bytes) -> str:
+    """
+    Guarda a foto (se ainda não existir), agenda as variantes e devolve o hash.
+
+    Levanta FotoInvalida se não for uma imagem JPEG, PNG ou WEBP, ou se
+    passar de FOTO_MAX_BYTES.
+    """
+    if not disponivel:
+        raise RuntimeError("Anexar fotos requer o Pillow: pip install pillow")
+    if len(dados) > FOTO_MAX_BYTES:
+        raise FotoInvalida(f"foto maior que {FOTO_MAX_BYTES // (1024 * 1024)} MB")
+    try:
+        with Image.open(io.BytesIO(dados)) as img:
+            formato = img.format
+            img.verify()  # só confere a estrutura, sem decodificar os pixels
+    except Exception:
+        raise FotoInvalida("arquivo não é uma imagem válida")
+    if formato not in FORMATOS:
+        raise FotoInvalida("use fotos JPEG, PNG ou WEBP")
+
+    foto = hashlib.sha256(dados).hexdigest()
+    if _original(foto) is None:
+        _gravar(os.path.join(ORIGINAIS_DIR, foto[:2], f"{foto}.{FORMATOS[formato]}"), dados)
+    agendar_variantes(foto)
+    return foto
+
+
+def publicar_manifestos(ponto_ids: Iterable[int]) -> None:
+    """Regrava static/fotos/pontos/<id>.json com as fotos de cada ponto (db.fetch_fotos); sem fotos, apaga."""
+    from db import fetch_fotos
+
+    for ponto_id, fotos in fetch_fotos(ponto_ids).items():
+        destino = os.path.join(MANIFESTOS_DIR, f"{ponto_id}.json")
+        if fotos:
+            _gravar(destino, json.dumps({"fotos": fotos}).encode("utf-8"))
+        elif os.path.exists(destino):
+            os.remove(destino)
+
+
+def main() -> None:
+    import db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--banco", default=db.DB_PATH, help="arquivo SQLite")
+    args = parser.parse_args()
+    if not disponivel:
+        raise SystemExit("Requer o Pillow: pip install pillow")
+
+    db.DB_PATH = args.banco
+    ponto_ids = db.fetch_pontos_com_foto()
+    fotos = sorted({foto for lista in db.fetch_fotos(ponto_ids).values() for foto in lista})
+    geradas = sum(len(f.result()) for f in [agendar_variantes(foto) for foto in fotos])
+    publicar_manifestos(ponto_ids)
+    print(f"{len(fotos):,} fotos de {len(ponto_ids):,} pontos; {geradas:,} variantes geradas.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Caminho de escrita único: uma thread gravadora por processo, com commits em grupo.
+
+Quem cadastra (form.py) só põe o lote de registros numa fila limitada e
+recebe um Future. A thread gravadora junta tudo o que estiver na fila
+(até LOTE_MAX registros) e grava numa única transação, então N cadastros
+simultâneos custam um commit e uma disputa pelo lock do SQLite, em vez de N.
+
+Com a fila cheia, submit espera até `timeout` e então levanta queue.Full
+(backpressure): melhor recusar rápido do que acumular sem limite.
+
+Os cadastros chegam da fila do aparelho (localStorage), ou seja, do
+cliente: validar_registros confere cada um antes de ir para a fila.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from typing import List, Tuple
+
+import db
+import fotos
+from importar import Rejeitada, data_maxima, validar
+
+FILA_MAX = 1000        # lotes aguardando gravação
+LOTE_MAX = 500         # registros por transação
+JANELA_S = 0.0         # espera extra para juntar mais lotes (0: só o que já está na fila)
+SUBMIT_TIMEOUT = 5.0   # espera máxima por uma vaga na fila
+CLIENT_ID_MAX = 64     # caracteres (form.py gera uuid4().hex, 32)
+
+# campos do registro (db.insert_registros) na ordem das colunas de importar.validar
+_CAMPOS = ("pin", "nome", "pnrs", "lat", "long", "data_registro")
+
+Pedido = Tuple[List[dict], Future]
+
+
+def validar_registros(registros) -> Tuple[List[dict], List[Tuple[str, str]]]:
+    """
+    Confere os registros vindos do aparelho, um a um, com as regras da
+    importação (importar.validar): categoria conhecida, coordenada válida,
+    nome não vazio e sem exagero de tamanho, data que não está no futuro.
+
+    Devolve (válidos, recusados): os válidos já no formato de
+    db.insert_registros; os recusados como (client_id, motivo), para sair
+    do aparelho sem travar o resto da fila. Registro sem client_id (texto)
+    fica de fora dos dois: não há como identificá-lo (o FILA_JS o descarta).
+    """
+    validos, recusados = [], []
+    data_max = data_maxima()
+    for r in registros if isinstance(registros, list) else ():
+        client_id = r.get("client_id") if isinstance(r, dict) else None
+        if not isinstance(client_id, str) or not 0 < len(client_id) <= CLIENT_ID_MAX:
+            continue
+        try:
+            _, pin, nome, pnrs, lat, lng, data = validar(r, _CAMPOS, None, data_max)
+        except Rejeitada as e:
+            recusados.append((client_id, str(e)))
+            continue
+        validos.append(
+            {
+                "client_id": client_id,
+                "pin": pin,
+                "nome": nome,
+                "pnrs": pnrs,
+                "lat": lat,
+                "long": lng,
+                "data_registro": data,
+                "fotos": r.get("fotos") if isinstance(r.get("fotos"), list) else [],
+            }
+        )
+    return validos, recusados
+
+
+class Gravador:
+    def __init__(self, fila_max: int = FILA_MAX, lote_max: int = LOTE_MAX, janela_s: float = JANELA_S):
+        self.lote_max = lote_max
+        self.janela_s = janela_s
+        self._fila: "queue.Queue[Pedido]" = queue.Queue(maxsize=fila_max)
+        self._thread_lock = threading.Lock()
+        self._thread = None
+
+    def _iniciar(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="sara-gravador", daemon=True)
+                self._thread.start()
+
+    def submit(self, registros: List[dict], timeout: float = SUBMIT_TIMEOUT) -> "Future[int]":
+        """
+        Enfileira registros (formato de db.insert_registros) para gravação.
+
+        O Future resolve com quantos pontos novos foram inseridos, depois do
+        commit. Levanta queue.Full se a fila continuar cheia por `timeout` s.
+        """
+        self._iniciar()
+        futuro: "Future[int]" = Future()
+        self._fila.put((list(registros), futuro), timeout=timeout)
+        return futuro
+
+    def _coletar(self) -> List[Pedido]:
+        """Bloqueia até o primeiro pedido e junta os que chegarem logo depois."""
+        pedidos = [self._fila.get()]
+        total = len(pedidos[0][0])
+        while total < self.lote_max:
+            try:
+                pedido = self._fila.get(timeout=self.janela_s)
+            except queue.Empty:
+                break
+            pedidos.append(pedido)
+            total += len(pedido[0])
+        return pedidos
+
+    def _gravar(self, pedidos: List[Pedido]) -> None:
+        try:
+            with db.write_connection() as conn:
+                inseridos = [db.insert_registros(conn, registros) for registros, _ in pedidos]
+        except Exception:
+            if len(pedidos) == 1:
+                raise
+            # um lote ruim não derruba os outros: grava cada um separado
+            for pedido in pedidos:
+                self._gravar_um(pedido)
+            return
+
+        self._publicar_fotos([r for registros, _ in pedidos for r in registros])
+        for (_, futuro), n in zip(pedidos, inseridos):
+            futuro.set_result(n)
+
+    def _gravar_um(self, pedido: Pedido) -> None:
+        registros, futuro = pedido
+        try:
+            n = db.insert_pontos(registros)
+        except Exception as e:
+            futuro.set_exception(e)
+            return
+        self._publicar_fotos(registros)
+        futuro.set_result(n)
+
+    def _publicar_fotos(self, registros: List[dict]) -> None:
+        """Manifestos dos pontos gravados com foto (fotos.publicar_manifestos), depois do commit."""
+        client_ids = [r["client_id"] for r in registros if r.get("fotos") and r.get("client_id") is not None]
+        if not client_ids:
+            return
+        try:
+            fotos.publicar_manifestos(db.fetch_ponto_ids(client_ids))
+        except OSError:
+            pass  # os pontos já estão gravados; `python fotos.py` refaz os manifestos
+
+    def _loop(self) -> None:
+        while True:
+            pedidos = self._coletar()
+            try:
+                self._gravar(pedidos)
+            except Exception as e:
+                for _, futuro in pedidos:
+                    futuro.set_exception(e)
+
+
+_gravadores = {}
+_gravadores_lock = threading.Lock()
+
+
+def get_gravador() -> Gravador:
+    """Gravador do db.DB_PATH atual (um por arquivo, por processo)."""
+    with _gravadores_lock:
+        gravador = _gravadores.get(db.DB_PATH)
+        if gravador is None:
+            gravador = _gravadores[db.DB_PATH] = Gravador()
+        return gravador
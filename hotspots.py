@@ -0,0 +1,194 @@
+"""
+Detecção de hotspots: grupos de pontos próximos (DBSCAN) onde o descarte se repete.
+
+Um ponto é "núcleo" quando tem pelo menos `min_pts` pontos (ele incluído)
+a até `eps_m` metros. Núcleos vizinhos ficam no mesmo grupo, e os pontos
+não-núcleo perto de um núcleo entram como borda; o resto é ruído.
+
+As buscas de vizinhos passam por uma grade com células de `eps_m` metros
+(só as 9 células ao redor são consultadas), então o custo é ~O(n·k) em vez
+dos O(n²) pares de distâncias. Os grupos são mantidos com union-find e,
+como inserções só criam ou juntam grupos, os pontos novos entram
+incrementalmente; UPDATE/DELETE no banco pedem uma reconstrução.
+"""
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from db import epoch_days_iso
+
+# raio de vizinhança (metros) e mínimo de pontos para formar um hotspot
+EPS_M = 60.0
+MIN_PTS = 3
+METROS_POR_GRAU = 111_320.0
+
+HOTSPOT_COLUMNS = ["hotspot", "lat", "long", "n", "pins", "primeiro", "ultimo"]
+
+
+class HotspotIndex:
+    def __init__(self, eps_m: float = EPS_M, min_pts: int = MIN_PTS):
+        self.eps_m = eps_m
+        self.min_pts = min_pts
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._cos_lat0: Optional[float] = None
+        self._x: List[float] = []
+        self._y: List[float] = []
+        self._rows: List[Tuple[float, float, int, float]] = []  # lat, long, pin, data (epoch-day)
+        self._grade: Dict[Tuple[int, int], List[int]] = {}
+        self._n_viz: List[int] = []
+        self._core: List[bool] = []
+        self._pai: List[int] = []
+        self._last_id = 0
+        self._mutacoes: Optional[int] = None
+        self._resumo: Optional[pd.DataFrame] = None
+
+    # --- union-find ---
+
+    def _find(self, i: int) -> int:
+        pai = self._pai
+        while pai[i] != i:
+            pai[i] = pai[pai[i]]
+            i = pai[i]
+        return i
+
+    def _union(self, a: int, b: int) -> None:
+        ra, rb = self._find(a), self._find(b)
+        if ra != rb:
+            self._pai[max(ra, rb)] = min(ra, rb)
+
+    # --- grade espacial ---
+
+    def _celula(self, x: float, y: float) -> Tuple[int, int]:
+        return int(math.floor(x / self.eps_m)), int(math.floor(y / self.eps_m))
+
+    def _vizinhos(self, i: int) -> List[int]:
+        """Pontos a até eps_m do ponto i (ele incluído)."""
+        x, y = self._x[i], self._y[i]
+        cx, cy = self._celula(x, y)
+        eps2 = self.eps_m * self.eps_m
+        res = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in self._grade.get((cx + dx, cy + dy), ()):
+                    ddx, ddy = self._x[j] - x, self._y[j] - y
+                    if ddx * ddx + ddy * ddy <= eps2:
+                        res.append(j)
+        return res
+
+    def _add(self, lat: float, lng: float, pin: int, data: float) -> None:
+        if self._cos_lat0 is None:
+            # projeção equiretangular local, fixa para manter a grade estável
+            self._cos_lat0 = math.cos(math.radians(lat))
+        i = len(self._x)
+        self._x.append(lng * METROS_POR_GRAU * self._cos_lat0)
+        self._y.append(lat * METROS_POR_GRAU)
+        self._rows.append((lat, lng, pin, data))
+        self._grade.setdefault(self._celula(self._x[i], self._y[i]), []).append(i)
+        self._pai.append(i)
+        self._core.append(False)
+
+        vizinhos = self._vizinhos(i)
+        self._n_viz.append(len(vizinhos))
+
+        # a inserção só aumenta contagens: novos núcleos são i e vizinhos que chegaram a min_pts
+        novos = [i] if len(vizinhos) >= self.min_pts else []
+        for j in vizinhos:
+            if j != i:
+                self._n_viz[j] += 1
+                if self._n_viz[j] == self.min_pts:
+                    novos.append(j)
+
+        for c in novos:
+            self._core[c] = True
+        for c in novos:
+            for j in self._vizinhos(c):
+                if self._core[j]:
+                    self._union(c, j)
+
+    def update(self, df: pd.DataFrame, mutacoes: int) -> None:
+        """
+        Sincroniza com a tabela de pontos (colunas de db.fetch_pontos).
+
+        Só os pontos com id maior que o último visto são inseridos; se o
+        contador de UPDATE/DELETE mudou, o índice é reconstruído do zero.
+        """
+        with self._lock:
+            if self._mutacoes is not None and mutacoes != self._mutacoes:
+                self._reset()
+            self._mutacoes = mutacoes
+
+            novos = df[df["id"] > self._last_id].sort_values("id")
+            if novos.empty:
+                return
+
+            for lat, lng, pin, data in zip(
+                novos["lat"].tolist(),
+                novos["long"].tolist(),
+                novos["pin"].astype(int).tolist(),
+                novos["data_registro"].tolist(),
+            ):
+                self._add(lat, lng, pin, data)
+            self._last_id = int(novos["id"].max())
+            self._resumo = None
+
+    def _rotulos(self) -> List[int]:
+        """Grupo (raiz do union-find) de cada ponto, ou -1 para ruído."""
+        rotulos = []
+        for i in range(len(self._x)):
+            if self._core[i]:
+                rotulos.append(self._find(i))
+                continue
+            # borda: entra no grupo do primeiro núcleo vizinho
+            rotulo = -1
+            for j in self._vizinhos(i):
+                if self._core[j]:
+                    rotulo = self._find(j)
+                    break
+            rotulos.append(rotulo)
+        return rotulos
+
+    def hotspots(self) -> pd.DataFrame:
+        """
+        Hotspots ordenados do maior para o menor (empate: o mais recente primeiro).
+
+        Colunas: hotspot (posição no ranking, 1..), lat/long do centroide,
+        n, pins ("pin:n,..." por categoria), primeiro e ultimo data_registro
+        (AAAA-MM-DD).
+        """
+        with self._lock:
+            if self._resumo is None:
+                self._resumo = self._summarize()
+            return self._resumo.copy()
+
+    def _summarize(self) -> pd.DataFrame:
+        if not self._rows:
+            return pd.DataFrame(columns=HOTSPOT_COLUMNS)
+
+        df = pd.DataFrame(self._rows, columns=["lat", "long", "pin", "data"])
+        df["grupo"] = self._rotulos()
+        df = df[df["grupo"] >= 0]
+        if df.empty:
+            return pd.DataFrame(columns=HOTSPOT_COLUMNS)
+
+        g = df.groupby("grupo")
+        res = g.agg(
+            lat=("lat", "mean"),
+            long=("long", "mean"),
+            n=("pin", "size"),
+            primeiro=("data", "min"),
+            ultimo=("data", "max"),
+        )
+        contagem = df.groupby(["grupo", "pin"]).size()
+        res["pins"] = [
+            ",".join(f"{pin}:{n}" for pin, n in contagem.loc[grupo].items()) for grupo in res.index
+        ]
+        res = res.sort_values(["n", "ultimo"], ascending=[False, False]).reset_index(drop=True)
+        res["primeiro"] = epoch_days_iso(res["primeiro"])
+        res["ultimo"] = epoch_days_iso(res["ultimo"])
+        res.insert(0, "hotspot", range(1, len(res) + 1))
+        return res[HOTSPOT_COLUMNS]
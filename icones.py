@@ -0,0 +1,88 @@
+"""
+Registro dos ícones das categorias (img/pin_*.png).
+
+Cada ícone é lido, reduzido e codificado uma única vez por processo e
+definido uma única vez por mapa, como um L.icon em JS. As camadas
+referenciam o ícone pelo número do pin, então o HTML do mapa cresce com a
+quantidade de pontos e não com pontos x tamanho do PNG.
+"""
+import base64
+import io
+from functools import lru_cache
+
+import folium
+from branca.element import MacroElement
+from jinja2 import Template
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow vem com o streamlit, mas não é obrigatório aqui
+    Image = None
+
+PIN_IMAGE = "img/pin_{pin}.png"
+ICON_SIZE = (42, 42)
+ICON_ANCHOR = (16, 32)
+# os PNGs originais têm 500x500; 2x o tamanho exibido basta para telas retina
+ICON_PIXELS = 2 * ICON_SIZE[0]
+
+
+@lru_cache(maxsize=None)
+def icon_data_uri(pin: int) -> str:
+    """Data URI do ícone do pin, reduzido para ICON_PIXELS quando possível."""
+    path = PIN_IMAGE.format(pin=pin)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if Image is not None:
+        with Image.open(io.BytesIO(data)) as img:
+            img.thumbnail((ICON_PIXELS, ICON_PIXELS))
+            buf = io.BytesIO()
+            img.save(buf, format="PNG", optimize=True)
+            data = buf.getvalue()
+
+    return "data:image/png;base64," + base64.b64encode(data).decode("utf-8")
+
+
+class IconRegistry(MacroElement):
+    """Define no mapa um objeto JS {pin: L.icon} com um ícone por categoria."""
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = {};
+        {% for pin, url in this.urls.items() %}
+        {{ this.get_name() }}[{{ pin|tojson }}] = L.icon({
+            iconUrl: {{ url|tojson }},
+            iconSize: {{ this.icon_size|tojson }},
+            iconAnchor: {{ this.icon_anchor|tojson }}
+        });
+        {% endfor %}
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, pins):
+        super().__init__()
+        self._name = "IconRegistry"
+        self.urls = {str(pin): icon_data_uri(pin) for pin in sorted(pins)}
+        self.icon_size = list(ICON_SIZE)
+        self.icon_anchor = list(ICON_ANCHOR)
+
+
+def get_icon_registry(m: folium.Map, pins) -> IconRegistry:
+    """
+    Retorna o registro de ícones do mapa, criando-o na primeira chamada.
+
+    Deve ser chamado antes de adicionar as camadas que usam os ícones,
+    para que a definição apareça antes delas no script gerado.
+    """
+    for child in m._children.values():
+        if isinstance(child, IconRegistry):
+            faltando = {str(pin) for pin in pins} - set(child.urls)
+            for pin in sorted(int(p) for p in faltando):
+                child.urls[str(pin)] = icon_data_uri(pin)
+            return child
+
+    registry = IconRegistry(pins)
+    registry.add_to(m)
+    return registry
@@ -0,0 +1,317 @@
+"""
+Importação em massa de levantamentos antigos para a tabela pontos.
+
+Uso:
+    python importar.py levantamento.csv [outro.geojson planilha.xlsx ...]
+        [--banco banco.db] [--lote 50000] [--data-padrao 2023-01-01]
+        [--rejeitados rejeitados.csv]
+
+Os arquivos são lidos em streaming e gravados em lotes (executemany, um
+commit por lote), então a memória fica constante qualquer que seja o
+tamanho do arquivo. Durante a carga os triggers do R*Tree, da pirâmide e
+da versão ficam desligados; tudo é atualizado de uma vez no fim
+(db.bulk_load).
+
+Colunas reconhecidas (sem diferenciar maiúsculas): categoria/pin/tipo,
+nome/descricao, pnrs/classificacao, lat/latitude, long/lng/lon/longitude,
+data_registro/data. No GeoJSON, as coordenadas vêm da geometria Point e o
+resto das properties. A categoria pode ser o número do pin ou o rótulo de
+CATEGORY_LABELS.
+
+Cada linha recebe o client_id "importacao:<hash>", com o hash da linha já
+normalizada (categoria, nome e classificação sem diferenciar maiúsculas,
+coordenada com 6 casas, data): importar de novo o mesmo levantamento, mesmo
+com outro nome de arquivo, linhas reordenadas ou editadas, só grava as
+linhas novas ou alteradas. Linhas idênticas contam como um ponto só.
+
+Se a importação for interrompida no meio (processo morto), rode-a de novo:
+as linhas já gravadas são ignoradas e a carga começa refazendo a pirâmide,
+o resumo e a busca (db.bulk_load).
+
+XLSX requer openpyxl; GeoJSON usa ijson se estiver instalado (sem ele, o
+arquivo é lido inteiro para a memória).
+"""
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Iterator, Optional, Tuple
+
+import db
+from categorias import pin_da_categoria
+
+LOTE = 50_000
+TEXTO_MAX = 200  # caracteres de nome e de classificação
+
+# nome do campo -> nomes aceitos no arquivo
+COLUNAS = {
+    "pin": ("pin", "categoria", "tipo", "category"),
+    "nome": ("nome", "descricao", "descrição", "name"),
+    "pnrs": ("pnrs", "classificacao", "classificação", "classificacao pnrs", "classificação pnrs"),
+    "lat": ("lat", "latitude"),
+    "long": ("long", "lng", "lon", "longitude"),
+    "data_registro": ("data_registro", "data", "date", "data registro"),
+}
+
+FORMATOS_DATA = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d", "%d/%m/%y")
+
+Linha = Tuple[str, int, str, str, float, float, int]  # na ordem de db.INSERT_PONTO_SQL, sem o setor
+
+
+class Rejeitada(ValueError):
+    """Linha inválida; a mensagem é o motivo mostrado no resumo."""
+
+
+# ===== Leitura (streaming) =====
+
+def _ler_csv(path: str) -> Iterator[dict]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        amostra = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=",;\t")
+        except csv.Error:
+            dialeto = csv.excel
+        yield from csv.DictReader(f, dialect=dialeto)
+
+
+def _ler_xlsx(path: str) -> Iterator[dict]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise SystemExit("Para importar XLSX instale o openpyxl: pip install openpyxl")
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        linhas = wb.active.iter_rows(values_only=True)
+        cabecalho = [str(c or "") for c in next(linhas, [])]
+        for valores in linhas:
+            yield dict(zip(cabecalho, valores))
+    finally:
+        wb.close()
+
+
+def _ler_geojson(path: str) -> Iterator[dict]:
+    with open(path, "rb") as f:
+        try:
+            import ijson
+
+            features = ijson.items(f, "features.item", use_float=True)
+        except ImportError:
+            features = iter(json.load(f).get("features", []))
+
+        for feature in features:
+            linha = dict(feature.get("properties") or {})
+            geometria = feature.get("geometry") or {}
+            if geometria.get("type") == "Point":
+                coords = geometria.get("coordinates") or []
+                if len(coords) >= 2:
+                    linha["long"], linha["lat"] = coords[0], coords[1]
+            yield linha
+
+
+LEITORES = {
+    ".csv": _ler_csv,
+    ".txt": _ler_csv,
+    ".xlsx": _ler_xlsx,
+    ".geojson": _ler_geojson,
+    ".json": _ler_geojson,
+}
+
+
+# ===== Validação =====
+
+def _mapear_colunas(linha: dict) -> tuple:
+    """
+    Chaves da linha para (pin, nome, pnrs, lat, long, data_registro), a partir
+    da primeira linha do arquivo; None para as colunas ausentes.
+    """
+    chaves = {str(k).strip().lower(): k for k in linha}
+    return tuple(
+        next((chaves[nome] for nome in nomes if nome in chaves), None) for nomes in COLUNAS.values()
+    )
+
+
+def _numero(valor, campo: str) -> float:
+    if isinstance(valor, str):
+        valor = valor.strip()
+        if "," in valor and "." not in valor:
+            valor = valor.replace(",", ".")  # decimal com vírgula
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        raise Rejeitada(f"{campo} inválida")
+    if math.isnan(numero):
+        raise Rejeitada(f"{campo} inválida")
+    return numero
+
+
+@lru_cache(maxsize=65536)
+def _data_texto(texto: str) -> Optional[int]:
+    """Data do texto em epoch-day (db.epoch_day), ou None. Cacheada: levantamentos repetem muito as datas."""
+    if "T" in texto or " " in texto:
+        texto = texto.replace("T", " ").split(" ")[0]
+    for formato in FORMATOS_DATA:
+        try:
+            return db.epoch_day(datetime.strptime(texto, formato))
+        except ValueError:
+            continue
+    return None
+
+
+def _data(valor, padrao: Optional[int]) -> int:
+    if isinstance(valor, (datetime, date)):
+        return db.epoch_day(valor)
+
+    texto = str(valor or "").strip()
+    if not texto:
+        if padrao is None:
+            raise Rejeitada("sem data")
+        return padrao
+    data = _data_texto(texto)
+    if data is None:
+        raise Rejeitada("data inválida")
+    return data
+
+
+def client_id(pin: int, nome: str, pnrs: str, lat: float, lng: float, data: int) -> str:
+    """Identidade da linha importada: hash dos campos normalizados."""
+    chave = f"{pin}|{' '.join(nome.casefold().split())}|{' '.join(pnrs.casefold().split())}|{lat:.6f}|{lng:.6f}|{data}"
+    return "importacao:" + hashlib.blake2b(chave.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def data_maxima() -> int:
+    """Maior data_registro aceita (epoch-day): amanhã, pela diferença de fuso do aparelho."""
+    return db.epoch_day(date.today()) + 1
+
+
+def validar(linha: dict, colunas: tuple, data_padrao: Optional[int], data_max: int) -> Linha:
+    """
+    Converte a linha do arquivo na tupla gravada em pontos, ou levanta Rejeitada.
+
+    As mesmas regras valem para os cadastros da fila do aparelho
+    (gravador.validar_registros). data_max: ver data_maxima.
+    """
+    v_pin, v_nome, v_pnrs, v_lat, v_long, v_data = (linha.get(c) if c is not None else None for c in colunas)
+
+    pin = pin_da_categoria(v_pin)
+    if pin is None:
+        raise Rejeitada("categoria desconhecida")
+
+    lat = _numero(v_lat, "latitude")
+    lng = _numero(v_long, "longitude")
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or (lat == 0 and lng == 0):
+        raise Rejeitada("coordenada fora do intervalo")
+
+    nome = str(v_nome or "").strip()
+    if not nome:
+        raise Rejeitada("sem nome")
+    if len(nome) > TEXTO_MAX:
+        raise Rejeitada("nome longo demais")
+
+    pnrs = str(v_pnrs or "").strip()
+    if len(pnrs) > TEXTO_MAX:
+        raise Rejeitada("classificação longa demais")
+
+    data = _data(v_data, data_padrao)
+    if data > data_max:
+        raise Rejeitada("data no futuro")
+    return (client_id(pin, nome, pnrs, lat, lng, data), pin, nome, pnrs, lat, lng, data)
+
+
+# ===== Carga =====
+
+class Progresso:
+    def __init__(self):
+        self.lidas = 0
+        self.importadas = 0
+        self.motivos: Counter = Counter()
+        self.t0 = time.perf_counter()
+
+    def mostrar(self, arquivo: str, fim: str = "") -> None:
+        taxa = self.lidas / max(time.perf_counter() - self.t0, 1e-9)
+        print(
+            f"\r{arquivo}: {self.lidas:,} lidas, {self.importadas:,} importadas, "
+            f"{sum(self.motivos.values()):,} rejeitadas ({taxa:,.0f} linhas/s)",
+            end=fim,
+            file=sys.stderr,
+            flush=True,
+        )
+
+
+def importar_arquivo(conn, path: str, lote: int, data_padrao: Optional[int], progresso: Progresso, rejeitados=None) -> None:
+    leitor = LEITORES.get(os.path.splitext(path)[1].lower())
+    if leitor is None:
+        raise SystemExit(f"Formato não suportado: {path} (use CSV, XLSX ou GeoJSON)")
+
+    nome_arquivo = os.path.basename(path)
+    colunas = None
+    buffer = []
+    data_max = data_maxima()
+
+    def gravar():
+        progresso.importadas += conn.executemany(db.INSERT_PONTO_SQL, db.with_setor(conn, buffer)).rowcount
+        conn.commit()
+        buffer.clear()
+        progresso.mostrar(nome_arquivo)
+
+    for n, linha in enumerate(leitor(path), start=1):
+        if colunas is None:
+            colunas = _mapear_colunas(linha)
+        progresso.lidas += 1
+        try:
+            buffer.append(validar(linha, colunas, data_padrao, data_max))
+        except Rejeitada as e:
+            progresso.motivos[str(e)] += 1
+            if rejeitados is not None:
+                rejeitados.writerow([nome_arquivo, n, str(e), json.dumps(linha, default=str, ensure_ascii=False)])
+        if len(buffer) >= lote:
+            gravar()
+
+    if buffer:
+        gravar()
+    progresso.mostrar(nome_arquivo, fim="\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("arquivos", nargs="+", help="arquivos CSV, XLSX ou GeoJSON")
+    parser.add_argument("--banco", default=db.DB_PATH, help="arquivo SQLite de destino")
+    parser.add_argument("--lote", type=int, default=LOTE, help="linhas por transação")
+    parser.add_argument("--data-padrao", help="data (AAAA-MM-DD) para linhas sem data; sem ela, são rejeitadas")
+    parser.add_argument("--rejeitados", help="grava as linhas rejeitadas, com o motivo, neste CSV")
+    args = parser.parse_args()
+
+    data_padrao = _data(args.data_padrao, None) if args.data_padrao else None
+    db.DB_PATH = args.banco
+    progresso = Progresso()
+
+    saida_rejeitados = open(args.rejeitados, "w", newline="", encoding="utf-8") if args.rejeitados else None
+    try:
+        rejeitados = csv.writer(saida_rejeitados) if saida_rejeitados else None
+        if rejeitados is not None:
+            rejeitados.writerow(["arquivo", "linha", "motivo", "dados"])
+
+        with db.write_connection() as conn, db.bulk_load(conn):
+            for path in args.arquivos:
+                importar_arquivo(conn, path, args.lote, data_padrao, progresso, rejeitados)
+            print("Atualizando índice espacial e pirâmide de agregação...", file=sys.stderr)
+    finally:
+        if saida_rejeitados:
+            saida_rejeitados.close()
+
+    duracao = time.perf_counter() - progresso.t0
+    print(f"{progresso.importadas:,} pontos importados em {duracao:.1f} s.")
+    for motivo, n in progresso.motivos.most_common():
+        print(f"  rejeitadas ({motivo}): {n:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,536 @@
+"""
+Camadas do mapa compartilhadas entre app.py e phone.py.
+
+Os pontos vão para o navegador como colunas (lat, long, pin, ...) em um
+único JSON; os marcadores, ícones e popups são montados no cliente pelo
+Leaflet. Assim o Python não cria um objeto folium por linha e o HTML
+gerado cresce só com o tamanho dos dados.
+"""
+import json
+import math
+from typing import Optional
+
+import folium
+import numpy as np
+import pandas as pd
+from branca.colormap import LinearColormap
+from folium.map import Layer
+from folium.plugins import Draw
+from jinja2 import Template
+from jinja2.utils import htmlsafe_json_dumps
+
+from db import epoch_days_iso
+from fotos import FOTOS_URL
+from icones import IconRegistry, get_icon_registry
+
+# únicos campos do st_folium que disparam rerun: a visão do mapa.
+# Cliques em marcadores e popups ficam só no navegador.
+MAP_RETURNED_OBJECTS = ["bounds", "center", "zoom"]
+# com a ferramenta de desenho (seleção do roteiro), também as áreas desenhadas
+MAP_RETURNED_OBJECTS_DESENHO = MAP_RETURNED_OBJECTS + ["all_drawings"]
+
+# com até este total de pontos na área, mostra os pontos mesmo em zoom baixo
+PONTOS_SEM_AGRUPAR = 500
+
+ROTA_CORES = ["#1f78b4", "#e31a1c", "#33a02c", "#ff7f00", "#6a3d9a", "#b15928"]
+
+
+def pontos_to_columns(df: pd.DataFrame) -> dict:
+    """Converte o DataFrame de pontos em listas por coluna (sem iterrows)."""
+    return {
+        "id": df["id"].astype(int).tolist(),
+        "lat": df["lat"].round(7).tolist(),
+        "long": df["long"].round(7).tolist(),
+        "pin": df["pin"].astype(int).tolist(),
+        "nome": df["nome"].fillna("").astype(str).tolist(),
+        "pnrs": df["pnrs"].fillna("").astype(str).tolist(),
+        "data": epoch_days_iso(df["data_registro"]),
+    }
+
+
+class PontosLayer(Layer):
+    """
+    Camada com todos os pontos do DataFrame.
+
+    Os ícones vêm do IconRegistry do mapa (um por categoria) e os popups
+    só são montados quando o usuário clica no marcador. As fotos também:
+    ao abrir o popup, o navegador busca o manifesto do ponto
+    (fotos.publicar_manifestos) e as miniaturas, então o mapa não leva
+    nada das fotos.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.featureGroup();
+        (function(camada) {
+            var d = {{ this.dados_json }};
+            var rotulos = {{ this.rotulos|tojson }};
+            var icones = {{ this.registry.get_name() }};
+            // o mapa roda num iframe do componente: a URL estática é relativa à página do app
+            var fotosUrl = new URL({{ this.fotos_url|tojson }} + "/", (function () {
+                try { return window.parent.location.href; } catch (e) { return document.baseURI; }
+            })()).href;
+            var manifestos = {};  // id -> promessa do manifesto
+            var galerias = {};    // id -> hashes já carregados
+
+            function esc(s) {
+                return String(s).replace(/[&<>"']/g, function(c) {
+                    return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}[c];
+                });
+            }
+
+            function linha(rotulo, valor) {
+                return '<tr><td style="font-weight:600; padding-right:6px;">' + rotulo
+                    + '</td><td>' + esc(valor) + '</td></tr>';
+            }
+
+            function galeria(hashes) {
+                var div = document.createElement("div");
+                hashes.forEach(function (h) {
+                    var base = fotosUrl + h.slice(0, 2) + "/" + h;
+                    var a = document.createElement("a");
+                    a.href = base + "-media.webp";
+                    a.target = "_blank";
+                    a.rel = "noopener";
+                    var img = document.createElement("img");
+                    img.src = base + "-thumb.webp";
+                    img.alt = "Foto do ponto";
+                    img.style.cssText = "width:72px; height:72px; object-fit:cover; margin:6px 4px 0 0; border-radius:4px;";
+                    // miniatura ainda não gerada pelo pool (foto recém-enviada): some do popup
+                    img.onerror = function () { a.remove(); };
+                    a.appendChild(img);
+                    div.appendChild(a);
+                });
+                return div;
+            }
+
+            // chamada de novo pelo popup.update(): as fotos já carregadas entram aqui
+            function popup(marcador) {
+                var i = marcador.options.idx;
+                var pin = d.pin[i];
+                var div = document.createElement("div");
+                div.style.cssText = "font-size: 13px; font-family: Arial, sans-serif;";
+                div.innerHTML = '<table style="border-collapse: collapse;">'
+                    + linha("Categoria:", rotulos[pin] || ("Pin " + pin))
+                    + linha("Nome do ponto:", d.nome[i])
+                    + linha("Classificação PNRS:", d.pnrs[i] || "-")
+                    + linha("Data registro:", d.data[i])
+                    + '</table>';
+                var hashes = galerias[d.id[i]];
+                if (hashes && hashes.length) {
+                    div.appendChild(galeria(hashes));
+                }
+                return div;
+            }
+
+            function fotos(e) {
+                var marcador = e.propagatedFrom || e.sourceTarget;
+                var popup = e.popup;
+                if (!marcador || marcador.options.idx === undefined) {
+                    return;
+                }
+                var id = d.id[marcador.options.idx];
+                if (!manifestos[id]) {
+                    manifestos[id] = fetch(fotosUrl + "pontos/" + id + ".json", {cache: "no-cache"})
+                        .then(function (r) { return r.ok ? r.json() : {fotos: []}; })
+                        .catch(function () { return {fotos: []}; })
+                        .then(function (m) {
+                            // só hashes SHA-256: o manifesto vira URL de imagem
+                            galerias[id] = (Array.isArray(m.fotos) ? m.fotos : []).filter(function (h) {
+                                return typeof h === "string" && /^[0-9a-f]{64}$/.test(h);
+                            });
+                        });
+                }
+                manifestos[id].then(function () {
+                    if (popup.isOpen() && galerias[id].length && !popup.getElement().querySelector("img")) {
+                        popup.update();
+                    }
+                });
+            }
+
+            for (var i = 0; i < d.lat.length; i++) {
+                var marcador = L.marker([d.lat[i], d.long[i]], {icon: icones[d.pin[i]], idx: i});
+                marcador.bindPopup(popup);
+                camada.addLayer(marcador);
+            }
+            camada.on("popupopen", fotos);
+        })({{ this.get_name() }});
+        {% if this.show %}
+        {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+        {% endif %}
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        category_labels: dict,
+        registry: IconRegistry,
+        name: str = "Pontos",
+        show: bool = True,
+    ):
+        super().__init__(name=name, overlay=True, control=True, show=show)
+        self._name = "PontosLayer"
+        # serializado uma vez aqui: o st_folium renderiza o template a cada rerun
+        self.dados_json = htmlsafe_json_dumps(pontos_to_columns(df))
+        self.rotulos = {str(pin): label for pin, label in category_labels.items()}
+        self.registry = registry
+        self.fotos_url = FOTOS_URL
+
+
+def add_pontos_layer(m: folium.Map, df: pd.DataFrame, category_labels: dict) -> PontosLayer:
+    """Adiciona ao mapa a camada de pontos montada a partir do DataFrame."""
+    registry = get_icon_registry(m, category_labels)
+    layer = PontosLayer(df, category_labels, registry)
+    layer.add_to(m)
+    return layer
+
+
+class AgregadosLayer(Layer):
+    """
+    Bolhas com a contagem de pontos por célula da pirâmide (db.fetch_grade).
+
+    O tamanho da bolha cresce com log(n); o popup mostra a contagem por
+    categoria e um clique duplo aproxima o mapa na célula.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.featureGroup();
+        (function(camada) {
+            var d = {{ this.dados_json }};
+            var rotulos = {{ this.rotulos|tojson }};
+
+            function popup(marcador) {
+                var i = marcador.options.idx;
+                var linhas = d.pins[i].split(",").map(function(par) {
+                    var p = par.split(":");
+                    return "<tr><td>" + (rotulos[p[0]] || ("Pin " + p[0]))
+                        + '</td><td style="text-align:right; padding-left:8px;">' + p[1] + "</td></tr>";
+                });
+                return '<div style="font-size: 13px; font-family: Arial, sans-serif;">'
+                    + "<b>" + d.n[i] + " pontos</b>"
+                    + '<table style="border-collapse: collapse;">' + linhas.join("") + "</table></div>";
+            }
+
+            for (var i = 0; i < d.n.length; i++) {
+                var tam = Math.round(24 + 8 * Math.log10(d.n[i]));
+                var icone = L.divIcon({
+                    className: "",
+                    iconSize: [tam, tam],
+                    html: '<div style="width:' + tam + 'px; height:' + tam + 'px; line-height:' + tam + 'px;'
+                        + ' border-radius:50%; background:rgba(255,107,74,0.85); color:#fff;'
+                        + ' text-align:center; font:600 12px Arial, sans-serif;'
+                        + ' box-shadow:0 0 0 4px rgba(255,107,74,0.3);">' + d.n[i] + "</div>"
+                });
+                var marcador = L.marker([d.lat[i], d.long[i]], {icon: icone, idx: i});
+                marcador.bindPopup(popup);
+                marcador.on("dblclick", function(e) {
+                    camada._map.setView(e.latlng, camada._map.getZoom() + 2);
+                });
+                camada.addLayer(marcador);
+            }
+        })({{ this.get_name() }});
+        {% if this.show %}
+        {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+        {% endif %}
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, grade: pd.DataFrame, category_labels: dict, name: str = "Agrupamentos", show: bool = True):
+        super().__init__(name=name, overlay=True, control=True, show=show)
+        self._name = "AgregadosLayer"
+        self.dados_json = htmlsafe_json_dumps(
+            {
+                "lat": grade["lat"].round(6).tolist(),
+                "long": grade["long"].round(6).tolist(),
+                "n": grade["n"].astype(int).tolist(),
+                "pins": grade["pins"].astype(str).tolist(),
+            }
+        )
+        self.rotulos = {str(pin): label for pin, label in category_labels.items()}
+
+
+class HotspotsLayer(Layer):
+    """
+    Hotspots (hotspots.HotspotIndex) como círculos vermelhos sobre o mapa.
+
+    O raio cresce com log(n); o popup mostra a posição no ranking, a
+    contagem por categoria e o período entre o primeiro e o último registro.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.featureGroup();
+        (function(camada) {
+            var d = {{ this.dados_json }};
+            var rotulos = {{ this.rotulos|tojson }};
+
+            function popup(circulo) {
+                var i = circulo.options.idx;
+                var linhas = d.pins[i].split(",").map(function(par) {
+                    var p = par.split(":");
+                    return "<tr><td>" + (rotulos[p[0]] || ("Pin " + p[0]))
+                        + '</td><td style="text-align:right; padding-left:8px;">' + p[1] + "</td></tr>";
+                });
+                return '<div style="font-size: 13px; font-family: Arial, sans-serif;">'
+                    + "<b>Hotspot #" + d.rank[i] + " – " + d.n[i] + " pontos</b><br>"
+                    + d.primeiro[i] + " a " + d.ultimo[i]
+                    + '<table style="border-collapse: collapse;">' + linhas.join("") + "</table></div>";
+            }
+
+            for (var i = 0; i < d.n.length; i++) {
+                var circulo = L.circleMarker([d.lat[i], d.long[i]], {
+                    radius: Math.round(10 + 6 * Math.log10(d.n[i])),
+                    color: "#b10026", weight: 2, fillColor: "#e31a1c", fillOpacity: 0.35, idx: i
+                });
+                circulo.bindTooltip("#" + d.rank[i]);
+                circulo.bindPopup(popup);
+                camada.addLayer(circulo);
+            }
+        })({{ this.get_name() }});
+        {% if this.show %}
+        {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+        {% endif %}
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, hotspots: pd.DataFrame, category_labels: dict, name: str = "Hotspots", show: bool = True):
+        super().__init__(name=name, overlay=True, control=True, show=show)
+        self._name = "HotspotsLayer"
+        self.dados_json = htmlsafe_json_dumps(
+            {
+                "rank": hotspots["hotspot"].astype(int).tolist(),
+                "lat": hotspots["lat"].round(6).tolist(),
+                "long": hotspots["long"].round(6).tolist(),
+                "n": hotspots["n"].astype(int).tolist(),
+                "pins": hotspots["pins"].astype(str).tolist(),
+                "primeiro": hotspots["primeiro"].astype(str).tolist(),
+                "ultimo": hotspots["ultimo"].astype(str).tolist(),
+            }
+        )
+        self.rotulos = {str(pin): label for pin, label in category_labels.items()}
+
+
+def _ler_bounds(bounds):
+    """(min_lat, min_long, max_lat, max_long) exatos dos bounds do st_folium, ou None."""
+    try:
+        sw, ne = bounds["_southWest"], bounds["_northEast"]
+        return float(sw["lat"]), float(sw["lng"]), float(ne["lat"]), float(ne["lng"])
+    except (TypeError, KeyError, ValueError):
+        return None
+
+
+def bounds_to_bbox(bounds, margem: float = 0.5, passo: float = 0.005):
+    """
+    Converte os bounds devolvidos pelo st_folium em (min_lat, min_long, max_lat, max_long).
+
+    O retângulo é ampliado em `margem` (fração do tamanho visível) para
+    cada lado e arredondado para uma grade de `passo` graus.
+    Retorna None se ainda não houver bounds (primeira execução).
+    """
+    visivel = _ler_bounds(bounds)
+    if visivel is None:
+        return None
+    min_lat, min_long, max_lat, max_long = visivel
+
+    d_lat = (max_lat - min_lat) * margem
+    d_long = (max_long - min_long) * margem
+    return (
+        round(math.floor((min_lat - d_lat) / passo) * passo, 6),
+        round(math.floor((min_long - d_long) / passo) * passo, 6),
+        round(math.ceil((max_lat + d_lat) / passo) * passo, 6),
+        round(math.ceil((max_long + d_long) / passo) * passo, 6),
+    )
+
+
+def area_carregada(anterior, bounds, zoom):
+    """
+    (bbox, zoom) da área carregada no mapa, a guardar em st.session_state.
+
+    Enquanto a visão couber em `anterior` (a área do rerun anterior) e o zoom
+    for o mesmo, devolve `anterior`: o get_map acerta o cache e o mapa não é
+    remontado nem reenviado no pan. Ao sair dela, ou ao mudar o zoom, uma
+    área nova com a margem de bounds_to_bbox. None se ainda não houver bounds.
+    """
+    visivel = _ler_bounds(bounds)
+    if visivel is None:
+        return None
+    if anterior is not None:
+        bbox, zoom_anterior = anterior
+        dentro = bbox[0] <= visivel[0] and bbox[1] <= visivel[1] and visivel[2] <= bbox[2] and visivel[3] <= bbox[3]
+        if dentro and zoom == zoom_anterior:
+            return anterior
+    return bounds_to_bbox(bounds), zoom
+
+
+def map_view(map_state: dict):
+    """
+    (center, zoom) atuais do usuário, devolvidos pelo st_folium, ou (None, None).
+
+    Passados de volta ao st_folium, mantêm a visão sem remontar o mapa.
+    """
+    map_state = map_state or {}
+    center = map_state.get("center")
+    if not center:
+        return None, None
+    return [center["lat"], center["lng"]], map_state.get("zoom")
+
+
+def fit_view(df: pd.DataFrame, largura_px: int = 1000, altura_px: int = 750, zoom_max: int = 17):
+    """
+    (center, zoom) que enquadram todos os pontos de `df`, para o st_folium.
+
+    O zoom é o maior em que a extensão (com 20% de folga) cabe no mapa,
+    sabendo que cada tile tem 256 px e 360 / 2**zoom graus de largura.
+    """
+    min_lat, max_lat = float(df["lat"].min()), float(df["lat"].max())
+    min_long, max_long = float(df["long"].min()), float(df["long"].max())
+    center = [(min_lat + max_lat) / 2, (min_long + max_long) / 2]
+
+    # na projeção do mapa, um grau de latitude "estica" 1/cos(lat)
+    span_long = max(max_long - min_long, 1e-6) * 1.2
+    span_lat = max(max_lat - min_lat, 1e-6) * 1.2 / max(math.cos(math.radians(center[0])), 1e-6)
+    zoom = math.floor(math.log2(min(largura_px / 256 * 360 / span_long, altura_px / 256 * 360 / span_lat)))
+    return center, max(2, min(zoom_max, zoom))
+
+
+def build_map(
+    df: pd.DataFrame,
+    category_labels: dict,
+    zoom_start: int,
+    bbox=None,
+    grade: Optional[pd.DataFrame] = None,
+    hotspots: Optional[pd.DataFrame] = None,
+    desenho: bool = False,
+) -> folium.Map:
+    """
+    Mapa completo pronto para o st_folium.
+
+    Com `grade` (células de db.fetch_grade), desenha as bolhas agregadas;
+    sem ela, os pontos de `df` com seus ícones. Com `hotspots`
+    (hotspots.HotspotIndex.hotspots), sobrepõe os círculos dos hotspots.
+    Com `desenho`, inclui a ferramenta de desenhar retângulos e polígonos
+    (seleção das paradas do roteiro; ver MAP_RETURNED_OBJECTS_DESENHO).
+    """
+    base = grade if grade is not None else df
+    if bbox is not None:
+        location = [(bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2]
+    else:
+        location = [base["lat"].mean(), base["long"].mean()]
+
+    m = folium.Map(location=location, zoom_start=zoom_start, tiles="OpenStreetMap")
+    if grade is not None:
+        AgregadosLayer(grade, category_labels).add_to(m)
+    else:
+        add_pontos_layer(m, df, category_labels)
+    if hotspots is not None and not hotspots.empty:
+        HotspotsLayer(hotspots, category_labels).add_to(m)
+    if desenho:
+        Draw(
+            draw_options={"polyline": False, "circle": False, "marker": False, "circlemarker": False},
+            edit_options={"edit": False},
+        ).add_to(m)
+    return m
+
+
+def build_route_layer(rota: pd.DataFrame, base=None) -> folium.FeatureGroup:
+    """
+    Rota de coleta (rotas.planejar_rota) como camada à parte, para o
+    feature_group_to_add do st_folium: o mapa cacheado não é alterado.
+    Uma linha por viagem, com o início marcado; a base, se houver.
+    """
+    camada = folium.FeatureGroup(name="Rota de coleta")
+    for k, (viagem, trecho) in enumerate(rota.groupby("viagem", sort=True)):
+        cor = ROTA_CORES[k % len(ROTA_CORES)]
+        coords = trecho[["lat", "long"]].to_numpy().tolist()
+        if base is not None:
+            coords.insert(0, list(base))
+        resumo = f"Viagem {viagem}: {len(trecho)} paradas, {trecho['trecho_m'].sum() / 1000:.1f} km"
+        folium.PolyLine(coords, color=cor, weight=4, opacity=0.85, tooltip=resumo).add_to(camada)
+        folium.CircleMarker(
+            coords[1] if base is not None else coords[0],
+            radius=7,
+            color=cor,
+            fill=True,
+            fill_opacity=1.0,
+            tooltip=f"Início da viagem {viagem}",
+        ).add_to(camada)
+    if base is not None:
+        folium.Marker(list(base), tooltip="Base", icon=folium.Icon(color="black", icon="home")).add_to(camada)
+    return camada
+
+
+def build_density_map(imagem, ext, zoom_start: int) -> folium.Map:
+    """Mapa com a superfície de densidade (densidade.colorize) como uma única imagem."""
+    min_lat, min_long, max_lat, max_long = ext
+    m = folium.Map(
+        location=[(min_lat + max_lat) / 2, (min_long + max_long) / 2],
+        zoom_start=zoom_start,
+        tiles="OpenStreetMap",
+    )
+    folium.raster_layers.ImageOverlay(
+        image=imagem,
+        bounds=[[min_lat, min_long], [max_lat, max_long]],
+        opacity=0.75,
+        name="Densidade",
+    ).add_to(m)
+    return m
+
+
+def build_choropleth_map(setores: pd.DataFrame, contagens: pd.DataFrame, category_labels: dict) -> folium.Map:
+    """
+    Mapa coroplético dos setores (db.fetch_setores), pintados pelo total de
+    pontos (db.fetch_setor_counts); o tooltip traz a contagem por categoria.
+    """
+    por_setor = contagens.pivot_table(index="setor", columns="pin", values="n", aggfunc="sum", fill_value=0)
+    por_setor = por_setor.reindex(columns=list(category_labels), fill_value=0)
+    total = por_setor.sum(axis=1)
+    escala = LinearColormap(
+        ["#ffffb2", "#fd8d3c", "#bd0026"],
+        vmin=0,
+        vmax=max(int(total.max()) if len(total) else 0, 1),
+        caption="Pontos por setor",
+    )
+
+    features, coords = [], []
+    for setor_id, nome, geometria in setores[["id", "nome", "geometria"]].itertuples(index=False):
+        geometria = json.loads(geometria)
+        contagem = por_setor.loc[setor_id] if setor_id in por_setor.index else None
+        props = {"nome": nome, "total": int(total.get(setor_id, 0))}
+        for pin in category_labels:
+            props[f"pin_{pin}"] = int(contagem[pin]) if contagem is not None else 0
+        props["cor"] = escala(props["total"])
+        features.append({"type": "Feature", "geometry": geometria, "properties": props})
+        aneis = geometria["coordinates"] if geometria["type"] == "Polygon" else sum(geometria["coordinates"], [])
+        coords.append(np.asarray(aneis[0], dtype="float64")[:, :2])
+
+    todos = np.concatenate(coords)
+    (min_long, min_lat), (max_long, max_lat) = todos.min(axis=0), todos.max(axis=0)
+    m = folium.Map(location=[(min_lat + max_lat) / 2, (min_long + max_long) / 2], zoom_start=13, tiles="OpenStreetMap")
+    m.fit_bounds([[min_lat, min_long], [max_lat, max_long]])
+
+    campos = ["nome", "total"] + [f"pin_{pin}" for pin in category_labels]
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        name="Setores",
+        style_function=lambda f: {
+            "fillColor": f["properties"]["cor"],
+            "fillOpacity": 0.7 if f["properties"]["total"] else 0.15,
+            "color": "#555555",
+            "weight": 1,
+        },
+        highlight_function=lambda f: {"weight": 3, "color": "#000000"},
+        tooltip=folium.GeoJsonTooltip(
+            fields=campos,
+            aliases=["Setor:", "Pontos:"] + [f"{label}:" for label in category_labels.values()],
+        ),
+    ).add_to(m)
+    escala.add_to(m)
+    return m
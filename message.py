@@ -1,30 +1,70 @@
 # message.py
 from pathlib import Path
-import base64
 
 import streamlit as st
 import streamlit.components.v1 as components
+from streamlit_js_eval import streamlit_js_eval
+
+from assets import asset_url
 
 SLIDES_DIR = Path("mensagem")
 SLIDES = [SLIDES_DIR / f"slide_{i}.png" for i in range(1, 5)]  # slide_1.png ... slide_4.png
 
+# marca, no sessionStorage do navegador e no session_state, que a
+# apresentação já foi fechada nesta aba/sessão
+INTRO_STORAGE_KEY = "sara_intro_fechada"
+INTRO_STATE_KEY = "intro_fechada"
+
 
-def _load_slides_base64():
-    imgs = []
+def _load_slide_urls(mobile: bool = False):
+    # URLs estáticas (convertidas uma vez por processo), não base64 a cada rerun
+    variant = "mobile" if mobile else "webp"
+    urls = []
     for p in SLIDES:
-        if p.exists():
-            with open(p, "rb") as f:
-                b64 = base64.b64encode(f.read()).decode("utf-8")
-            imgs.append(f"data:image/png;base64,{b64}")
-    return imgs
+        url = asset_url(str(p), variant=variant)
+        if url:
+            urls.append(url)
+    return urls
+
+
+def _intro_fechada() -> bool:
+    """
+    True se a apresentação já foi fechada nesta sessão.
+
+    O componente JS fica esperando (no navegador, sem rerun) a marca que o
+    botão de fechar grava no sessionStorage; quando ela aparece, devolve o
+    valor uma única vez e o servidor guarda no session_state.
+    """
+    if st.session_state.get(INTRO_STATE_KEY):
+        return True
+
+    valor = streamlit_js_eval(
+        js_expressions=f"""
+        new Promise(function(resolve) {{
+            (function esperar() {{
+                if (window.sessionStorage.getItem("{INTRO_STORAGE_KEY}")) resolve("1");
+                else setTimeout(esperar, 500);
+            }})();
+        }})
+        """,
+        key="sara_intro_flag",
+    )
+    if valor == "1":
+        st.session_state[INTRO_STATE_KEY] = True
+        return True
+    return False
+
 
+def show_intro_message(mobile: bool = False):
+    # depois de fechada, não reenvia o componente nos próximos reruns
+    if _intro_fechada():
+        return
 
-def show_intro_message():
-    slides_b64 = _load_slides_base64()
-    if not slides_b64:
+    slide_urls = _load_slide_urls(mobile)
+    if not slide_urls:
         return
 
-    slides_js_array = "[" + ",".join(f'"{src}"' for src in slides_b64) + "]"
+    slides_js_array = "[" + ",".join(f'"{src}"' for src in slide_urls) + "]"
 
     html = f"""
     <style>
@@ -162,12 +202,23 @@ def show_intro_message():
             }}
         }}
 
+        const preloaded = {{}};
+
+        function preload(i) {{
+            // baixa só o próximo slide, enquanto o atual é exibido
+            if (!preloaded[i]) {{
+                preloaded[i] = new Image();
+                preloaded[i].src = slides[i];
+            }}
+        }}
+
         function renderSlide() {{
             imgEl.src = slides[idx];
+            preload((idx + 1) % slides.length);
             renderDots();
         }}
 
-        function closeOverlayAndScroll() {{
+        function hideFrame() {{
             overlay.style.display = "none";
 
             // zera a altura do iframe que contém este componente
@@ -178,6 +229,14 @@ def show_intro_message():
                     iframe.style.border = "none";
                 }}
             }} catch (e) {{}}
+        }}
+
+        function closeOverlayAndScroll() {{
+            hideFrame();
+
+            try {{
+                window.sessionStorage.setItem("{INTRO_STORAGE_KEY}", "1");
+            }} catch (e) {{}}
 
             // rola a página para aproximar o centro do mapa
             try {{
@@ -198,10 +257,20 @@ def show_intro_message():
             renderSlide();
         }};
 
-        renderSlide();
+        // já fechada nesta aba: some sem baixar nenhum slide
+        var fechada = false;
+        try {{
+            fechada = !!window.sessionStorage.getItem("{INTRO_STORAGE_KEY}");
+        }} catch (e) {{}}
+
+        if (fechada) {{
+            hideFrame();
+        }} else {{
+            renderSlide();
+        }}
     }})();
     </script>
     """
 
     # altura inicial suficiente para mostrar o popup; depois o JS zera isso
-    components.html(html, height=750, width="100%")
+    components.html(html, height=560 if mobile else 750, width="100%")
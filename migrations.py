@@ -0,0 +1,269 @@
+"""
+Migrações versionadas do esquema do banco.
+
+Cada migração tem um número, uma descrição e uma função que recebe a
+conexão. Na inicialização (db._ensure_schema) as migrações com número
+maior que o registrado em schema_versao são aplicadas em ordem, cada uma
+na sua transação, e registradas. Migração aplicada não muda: alterações
+novas entram como uma migração nova no fim de MIGRACOES.
+
+Uso:
+    python migrations.py [--banco banco.db]
+
+aplica as pendentes e confere o plano das consultas do mapa
+(EXPLAIN QUERY PLAN); sai com erro se alguma deixar de usar o índice.
+"""
+import argparse
+import sqlite3
+import sys
+from typing import Callable, List, Tuple
+
+SCHEMA_VERSAO_SQL = """
+CREATE TABLE IF NOT EXISTS schema_versao (
+    versao      INTEGER PRIMARY KEY,
+    descricao   TEXT    NOT NULL,
+    aplicada_em TEXT    NOT NULL
+)
+"""
+
+
+def _colunas(conn: sqlite3.Connection, tabela: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")}
+
+
+def _criar_pontos(conn: sqlite3.Connection) -> None:
+    # antes em tabela.py
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pontos (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            pin           INTEGER NOT NULL,
+            nome          TEXT    NOT NULL,
+            pnrs          TEXT,
+            lat           REAL    NOT NULL,
+            long          REAL    NOT NULL,
+            data_registro TEXT    NOT NULL
+        )
+        """
+    )
+
+
+def _coluna_data_registro(conn: sqlite3.Connection) -> None:
+    # antes em alter_table.py (bancos criados antes da coluna existir)
+    if "data_registro" not in _colunas(conn, "pontos"):
+        conn.execute("ALTER TABLE pontos ADD COLUMN data_registro TEXT")
+
+
+def _coluna_client_id(conn: sqlite3.Connection) -> None:
+    # id gerado no aparelho pela fila offline do form.py; único para o envio ser idempotente
+    if "client_id" not in _colunas(conn, "pontos"):
+        conn.execute("ALTER TABLE pontos ADD COLUMN client_id TEXT")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_pontos_client_id ON pontos (client_id)")
+
+
+def _indices_mapa(conn: sqlite3.Connection) -> None:
+    # filtros por categoria e período (exportação, séries por data)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pontos_pin_data ON pontos (pin, data_registro)")
+    # cobre a consulta do mapa (db.pontos_query): pin IN (...) [AND id > ?]
+    # é respondida só pelo índice, sem ler a tabela
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_pontos_mapa
+        ON pontos (pin, id, lat, long, nome, pnrs, data_registro)
+        """
+    )
+    conn.execute("ANALYZE pontos")
+
+
+# texto AAAA-MM-DD (com ou sem hora) -> dias desde 1970-01-01; NULL se inválido
+_TEXTO_PARA_EPOCH_DAY = "CAST(julianday(date({coluna})) - 2440587.5 AS INTEGER)"
+
+
+def _tabelas(conn: sqlite3.Connection) -> set:
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _data_epoch_day(conn: sqlite3.Connection) -> None:
+    """
+    data_registro de TEXT para INTEGER (epoch-day), em pontos e pontos_reforcos.
+
+    O SQLite não muda o tipo de uma coluna: a tabela é recriada, copiada e
+    renomeada. Os triggers sobre pontos somem com o DROP e são recriados
+    por db._ensure_schema logo depois das migrações; os índices daqui.
+    """
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'pontos'").fetchone()
+    conn.execute(
+        """
+        CREATE TABLE pontos_nova (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            pin           INTEGER NOT NULL,
+            nome          TEXT    NOT NULL,
+            pnrs          TEXT,
+            lat           REAL    NOT NULL,
+            long          REAL    NOT NULL,
+            data_registro INTEGER,
+            client_id     TEXT
+        )
+        """
+    )
+    conn.execute(
+        f"""
+        INSERT INTO pontos_nova (id, pin, nome, pnrs, lat, long, data_registro, client_id)
+        SELECT id, pin, nome, pnrs, lat, long, {_TEXTO_PARA_EPOCH_DAY.format(coluna="data_registro")}, client_id
+        FROM pontos
+        """
+    )
+    conn.execute("DROP TABLE pontos")
+    conn.execute("ALTER TABLE pontos_nova RENAME TO pontos")
+    if seq is not None:
+        # mantém o AUTOINCREMENT de onde parou (ids de pontos apagados não voltam)
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'pontos'", (seq[0],))
+
+    conn.execute("CREATE UNIQUE INDEX idx_pontos_client_id ON pontos (client_id)")
+    conn.execute("CREATE INDEX idx_pontos_pin_data ON pontos (pin, data_registro)")
+    conn.execute("CREATE INDEX idx_pontos_mapa ON pontos (pin, id, lat, long, nome, pnrs, data_registro)")
+    # período sem filtro de categoria
+    conn.execute("CREATE INDEX idx_pontos_data ON pontos (data_registro)")
+
+    tabelas = _tabelas(conn)
+    if "pontos_reforcos" in tabelas:
+        conn.execute(
+            """
+            CREATE TABLE pontos_reforcos_nova (
+                id            INTEGER PRIMARY KEY AUTOINCREMENT,
+                ponto_id      INTEGER NOT NULL REFERENCES pontos (id),
+                data_registro INTEGER NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            f"""
+            INSERT INTO pontos_reforcos_nova (id, ponto_id, data_registro)
+            SELECT id, ponto_id, {_TEXTO_PARA_EPOCH_DAY.format(coluna="data_registro")}
+            FROM pontos_reforcos
+            WHERE julianday(data_registro) IS NOT NULL
+            """
+        )
+        conn.execute("DROP TABLE pontos_reforcos")
+        conn.execute("ALTER TABLE pontos_reforcos_nova RENAME TO pontos_reforcos")
+        conn.execute("CREATE INDEX idx_pontos_reforcos_ponto ON pontos_reforcos (ponto_id, data_registro)")
+    if "pontos_versao" in tabelas:
+        # os caches em memória guardam a data antiga: força a recarga completa
+        conn.execute("UPDATE pontos_versao SET versao = versao + 1, mutacoes = mutacoes + 1 WHERE id = 1")
+    conn.execute("ANALYZE pontos")
+
+
+def _setores(conn: sqlite3.Connection) -> None:
+    # polígonos dos setores (setores.py) e o setor de cada ponto, atribuído na inserção
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS setores (
+            id        INTEGER PRIMARY KEY,
+            nome      TEXT NOT NULL,
+            geometria TEXT NOT NULL
+        )
+        """
+    )
+    if "setor" not in _colunas(conn, "pontos"):
+        conn.execute("ALTER TABLE pontos ADD COLUMN setor INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pontos_setor ON pontos (setor, pin, data_registro)")
+
+
+def _estatisticas_setor(conn: sqlite3.Connection) -> None:
+    # sem estatísticas de idx_pontos_setor, o planejador troca a busca por id
+    # da consulta incremental por um SCAN de idx_pontos_mapa (check_query_plans)
+    conn.execute("ANALYZE pontos")
+
+
+Migracao = Tuple[int, str, Callable[[sqlite3.Connection], None]]
+
+MIGRACOES: List[Migracao] = [
+    (1, "cria a tabela pontos", _criar_pontos),
+    (2, "coluna data_registro", _coluna_data_registro),
+    (3, "coluna client_id com índice único", _coluna_client_id),
+    (4, "índices (pin, data_registro) e de cobertura do mapa", _indices_mapa),
+    (5, "data_registro em epoch-day (INTEGER), com índice", _data_epoch_day),
+    (6, "tabela setores e coluna pontos.setor", _setores),
+    (7, "estatísticas do planejador com o índice de setores", _estatisticas_setor),
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """Última migração aplicada (0 se nenhuma)."""
+    return conn.execute("SELECT COALESCE(MAX(versao), 0) FROM schema_versao").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """Aplica as migrações pendentes, em ordem; devolve os números aplicados."""
+    conn.execute(SCHEMA_VERSAO_SQL)
+    conn.commit()
+
+    aplicadas = []
+    for versao, descricao, aplicar in MIGRACOES:
+        if versao <= schema_version(conn):
+            continue
+        # IMMEDIATE: outro processo iniciando ao mesmo tempo espera aqui,
+        # e a versão é conferida de novo já com o lock de escrita
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if versao > schema_version(conn):
+                aplicar(conn)
+                conn.execute(
+                    "INSERT INTO schema_versao (versao, descricao, aplicada_em) VALUES (?, ?, datetime('now'))",
+                    (versao, descricao),
+                )
+                aplicadas.append(versao)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    return aplicadas
+
+
+def check_query_plans(conn: sqlite3.Connection) -> List[str]:
+    """
+    Confere com EXPLAIN QUERY PLAN as consultas do mapa (db.pontos_query).
+
+    Devolve a lista de problemas: consulta cujo plano não usa o índice
+    esperado. Não basta procurar SCAN: sem idx_pontos_mapa, o filtro por pin
+    vira "SEARCH ... (rowid>?)", que com since_id=0 lê a tabela inteira.
+    """
+    from db import pontos_query
+
+    casos = {
+        "mapa por categoria": (pontos_query([1, 5], 0), "COVERING INDEX idx_pontos_mapa"),
+        "mapa por categoria, incremental": (pontos_query([1, 5], 1000), "COVERING INDEX idx_pontos_mapa"),
+        "incremental (todas as categorias)": (pontos_query(None, 1000), "INTEGER PRIMARY KEY"),
+        "período (todas as categorias)": (pontos_query(None, 0, 19000, 19030), "INDEX idx_pontos_data"),
+        "mapa por categoria e período": (pontos_query([1, 5], 0, 19000, 19030), "INDEX idx_pontos_"),
+    }
+    problemas = []
+    for nome, ((sql, params), esperado) in casos.items():
+        plano = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        if any(passo.startswith("SCAN") for passo in plano) or not any(esperado in passo for passo in plano):
+            problemas.append(f"{nome}: {' / '.join(plano)} (esperado: {esperado})")
+    return problemas
+
+
+def main() -> None:
+    import db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--banco", default=db.DB_PATH, help="arquivo SQLite")
+    args = parser.parse_args()
+
+    db.DB_PATH = args.banco
+    with db.write_connection() as conn:  # a primeira conexão já aplica as migrações
+        print(f"Esquema na versão {schema_version(conn)}.")
+        problemas = check_query_plans(conn)
+
+    if problemas:
+        print("Consultas do mapa sem o índice esperado:", file=sys.stderr)
+        for problema in problemas:
+            print(f"  {problema}", file=sys.stderr)
+        sys.exit(1)
+    print("Planos das consultas do mapa OK (usam índice).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,167 +1,155 @@
-# phone.py
-import base64
-import os
-
-import streamlit as st
-import folium
-from folium.features import CustomIcon
-from streamlit_folium import st_folium
-
-from db import fetch_pontos
-from message import show_intro_message  # reaproveita o banner
-# se quiser usar exatamente o mesmo dicionário do app.py, pode extrair para um módulo comum.
-CATEGORY_LABELS = {
-    1: "Acúmulo de Pneu",
-    2: "Descarte de Eletroeletrônicos",
-    3: "Descartes de Móveis e Colchões",
-    4: "Descarte de Resíduos Hospitalares",
-    5: "Pontos Viciados de Resíduos Comum",
-    6: "Descarte de Entulhos de Obras",
-}
-
-
-def set_background_mobile(image_path: str):
-    """Fundo para versão mobile (menos padding)."""
-    if not os.path.exists(image_path):
-        return
-
-    with open(image_path, "rb") as f:
-        data = f.read()
-    encoded = base64.b64encode(data).decode()
-
-    css = f"""
-    <style>
-    .stApp {{
-        background-image: url("data:image/png;base64,{encoded}");
-        background-size: cover;
-        background-position: center center;
-        background-attachment: fixed;
-    }}
-    .block-container {{
-        background-color: rgba(255, 255, 255, 0.90);
-        border-radius: 0.75rem;
-        padding: 0.8rem 0.8rem 1rem 0.8rem;
-    }}
-    /* ajuste fino pra telas pequenas */
-    @media (max-width: 768px) {{
-        .block-container {{
-            padding: 0.6rem;
-            border-radius: 0;
-        }}
-    }}
-    </style>
-    """
-    st.markdown(css, unsafe_allow_html=True)
-
-
-@st.cache_data(show_spinner=False)
-def load_pontos_cached(selected_pins_tuple):
-    """Cacheia pontos por combinação de pins (1..6)."""
-    return fetch_pontos(list(selected_pins_tuple))
-
-
-# ------------------------------------------------------------
-# Config geral
-# ------------------------------------------------------------
-st.set_page_config(
-    page_title="SARA - Mapa (Mobile)",
-    layout="wide",  # wide ajuda o mapa mesmo no mobile
-)
-
-set_background_mobile("fundos/fundo_mapa.png")
-
-# Banner de apresentação (fixo, sem overlay)
-show_intro_message()
-
-st.markdown(
-    """
-    <h3 style="margin-bottom: 0.2rem;">
-        SARA – Mapa de Resíduos (Sol Nascente)
-    </h3>
-    <p style="margin-top: 0; font-size: 0.9rem;">
-        Visualize e registre pontos de descarte irregular de resíduos no território.
-    </p>
-    """,
-    unsafe_allow_html=True,
-)
-
-# ------------------------------------------------------------
-# Área de filtros (no topo, estilo mobile)
-# ------------------------------------------------------------
-with st.expander("Filtros de categorias", expanded=True):
-    option_map = {}
-    options = []
-    for pin, label in CATEGORY_LABELS.items():
-        text = f"Pin {pin} - {label}"
-        options.append(text)
-        option_map[text] = pin
-
-    selected_labels = st.multiselect(
-        "Selecione os tipos de resíduos:",
-        options=options,
-        default=options,
-    )
-    selected_pins = [option_map[o] for o in selected_labels] or list(CATEGORY_LABELS.keys())
-
-# ------------------------------------------------------------
-# Carrega dados (cacheado)
-# ------------------------------------------------------------
-df = load_pontos_cached(tuple(sorted(selected_pins)))
-
-if df.empty:
-    st.warning("Nenhum ponto cadastrado para os filtros selecionados.")
-    st.stop()
-
-# ------------------------------------------------------------
-# Mapa
-# ------------------------------------------------------------
-center_lat = df["lat"].mean()
-center_long = df["long"].mean()
-
-# zoom um pouco mais fechado pra mobile enxergar melhor
-m = folium.Map(location=[center_lat, center_long], zoom_start=14, tiles="OpenStreetMap")
-
-for _, row in df.iterrows():
-    pin_num = int(row["pin"])
-    icon_path = f"img/pin_{pin_num}.png"
-
-    categoria = CATEGORY_LABELS.get(pin_num, f"Pin {pin_num}")
-    pnrs_val = row["pnrs"] if row["pnrs"] else "-"
-
-    popup_html = f"""
-    <div style="font-size: 13px; font-family: Arial, sans-serif;">
-      <table style="border-collapse: collapse;">
-        <tr>
-          <td style="font-weight:600; padding-right:6px;">Categoria:</td>
-          <td>{categoria}</td>
-        </tr>
-        <tr>
-          <td style="font-weight:600; padding-right:6px;">Nome do ponto:</td>
-          <td>{row['nome']}</td>
-        </tr>
-        <tr>
-          <td style="font-weight:600; padding-right:6px;">Classificação PNRS:</td>
-          <td>{pnrs_val}</td>
-        </tr>
-        <tr>
-          <td style="font-weight:600; padding-right:6px;">Data registro:</td>
-          <td>{row['data_registro']}</td>
-        </tr>
-      </table>
-    </div>
-    """
-
-    icon = CustomIcon(
-        icon_image=icon_path,
-        icon_size=(42, 42),
-        icon_anchor=(16, 32),
-    )
-
-    folium.Marker(
-        location=[row["lat"], row["long"]],
-        icon=icon,
-        popup=popup_html,
-    ).add_to(m)
-
-# altura menor pra caber melhor no celular
-st_folium(m, width="100%", height=550)
+# phone.py
+import os
+
+import streamlit as st
+from streamlit_folium import st_folium
+
+from assets import asset_url
+from pontos_cache import PontosCache
+from message import show_intro_message  # reaproveita o banner
+from mapa import MAP_RETURNED_OBJECTS, PONTOS_SEM_AGRUPAR, area_carregada, build_map, map_view
+from categorias import CATEGORY_LABELS
+from db import fetch_grade, grade_level
+
+# zoom inicial um pouco mais fechado pra mobile enxergar melhor
+ZOOM_INICIAL = 14
+
+
+def set_background_mobile(image_path: str):
+    """Fundo para versão mobile (menos padding)."""
+    if not os.path.exists(image_path):
+        return
+
+    # URL estática com cache HTTP, em vez de reenviar o PNG em base64 a cada rerun
+    url = asset_url(image_path, variant="mobile")
+
+    css = f"""
+    <style>
+    .stApp {{
+        background-image: url("{url}");
+        background-size: cover;
+        background-position: center center;
+        background-attachment: fixed;
+    }}
+    .block-container {{
+        background-color: rgba(255, 255, 255, 0.90);
+        border-radius: 0.75rem;
+        padding: 0.8rem 0.8rem 1rem 0.8rem;
+    }}
+    /* ajuste fino pra telas pequenas */
+    @media (max-width: 768px) {{
+        .block-container {{
+            padding: 0.6rem;
+            border-radius: 0;
+        }}
+    }}
+    </style>
+    """
+    st.markdown(css, unsafe_allow_html=True)
+
+
+@st.cache_resource(show_spinner=False)
+def get_pontos_cache() -> PontosCache:
+    return PontosCache()
+
+
+def load_pontos_cached(selected_pins_tuple, bbox=None):
+    """Pontos dos pins (1..6) e da área visível, filtrados em memória a partir do cache."""
+    return get_pontos_cache().get(selected_pins_tuple, bbox)
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def get_map(selected_pins_tuple, bbox, data_version, nivel=None, perfil="mobile"):
+    """
+    Mapa montado uma vez por (pins, área, versão dos dados, nível, perfil); None se vazio.
+
+    Como no app.py: em zoom baixo (nivel de db.grade_level), bolhas agregadas
+    da pirâmide em vez dos pontos. Na primeira execução ainda não há área
+    visível, e mandar a tabela inteira como marcadores pesaria no celular.
+    """
+    if nivel is not None:
+        grade = fetch_grade(nivel, list(selected_pins_tuple), bbox)
+        if grade["n"].sum() > PONTOS_SEM_AGRUPAR:
+            return build_map(None, CATEGORY_LABELS, zoom_start=ZOOM_INICIAL, bbox=bbox, grade=grade)
+
+    df = load_pontos_cached(selected_pins_tuple, bbox)
+    if df.empty and bbox is None:
+        return None
+    return build_map(df, CATEGORY_LABELS, zoom_start=ZOOM_INICIAL, bbox=bbox)
+
+
+# ------------------------------------------------------------
+# Config geral
+# ------------------------------------------------------------
+st.set_page_config(
+    page_title="SARA - Mapa (Mobile)",
+    layout="wide",  # wide ajuda o mapa mesmo no mobile
+)
+
+set_background_mobile("fundos/fundo_mapa.png")
+
+# Banner de apresentação (fixo, sem overlay)
+show_intro_message(mobile=True)
+
+st.markdown(
+    """
+    <h3 style="margin-bottom: 0.2rem;">
+        SARA – Mapa de Resíduos (Sol Nascente)
+    </h3>
+    <p style="margin-top: 0; font-size: 0.9rem;">
+        Visualize e registre pontos de descarte irregular de resíduos no território.
+    </p>
+    """,
+    unsafe_allow_html=True,
+)
+
+# ------------------------------------------------------------
+# Área de filtros (no topo, estilo mobile)
+# ------------------------------------------------------------
+with st.expander("Filtros de categorias", expanded=True):
+    option_map = {}
+    options = []
+    for pin, label in CATEGORY_LABELS.items():
+        text = f"Pin {pin} - {label}"
+        options.append(text)
+        option_map[text] = pin
+
+    selected_labels = st.multiselect(
+        "Selecione os tipos de resíduos:",
+        options=options,
+        default=options,
+    )
+    selected_pins = [option_map[o] for o in selected_labels] or list(CATEGORY_LABELS.keys())
+
+# ------------------------------------------------------------
+# Mapa (cacheado; só a área visível)
+# ------------------------------------------------------------
+map_state = st.session_state.get("mapa_mobile") or {}
+# mantida entre reruns enquanto a visão couber nela (ver mapa.area_carregada)
+area = area_carregada(st.session_state.get("area_mapa_mobile"), map_state.get("bounds"), map_state.get("zoom"))
+st.session_state["area_mapa_mobile"] = area
+bbox = area[0] if area is not None else None
+
+m = get_map(
+    tuple(sorted(selected_pins)),
+    bbox,
+    get_pontos_cache().data_version(),
+    grade_level(map_state.get("zoom") or ZOOM_INICIAL),
+)
+
+if m is None:
+    st.warning("Nenhum ponto cadastrado para os filtros selecionados.")
+    st.stop()
+
+center, zoom = map_view(map_state)
+
+# altura menor pra caber melhor no celular
+st_folium(
+    m,
+    width="100%",
+    height=550,
+    key="mapa_mobile",
+    center=center,
+    zoom=zoom,
+    returned_objects=MAP_RETURNED_OBJECTS,
+)
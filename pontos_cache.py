@@ -0,0 +1,114 @@
+"""
+Cache incremental dos pontos, compartilhado por todas as sessões do processo.
+
+A tabela é carregada uma única vez para um DataFrame, junto com um índice
+pin -> posições das linhas. Trocar os filtros da sidebar só junta as
+fatias do índice dos pins escolhidos (e aplica a área visível em memória),
+sem nenhuma consulta ao banco; a memória fica em ~uma cópia da tabela,
+qualquer que seja a combinação de pins.
+
+A cada acesso o contador de versão do banco (db.get_data_version) é
+consultado: se só houve inserções, busca apenas os pontos com id maior e
+acrescenta ao DataFrame e ao índice; se houve UPDATE/DELETE, recarrega tudo.
+"""
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from db import fetch_pontos, get_data_version
+
+# intervalo mínimo entre consultas ao contador de versão (segundos)
+VERSAO_TTL = 2.0
+
+
+def _pin_index(df: pd.DataFrame, offset: int = 0) -> Dict[int, np.ndarray]:
+    """pin -> posições (iloc) das linhas daquele pin."""
+    return {int(pin): pos + offset for pin, pos in df.groupby("pin").indices.items()}
+
+
+def filter_bbox(df: pd.DataFrame, bbox) -> pd.DataFrame:
+    """Linhas dentro de (min_lat, min_long, max_lat, max_long)."""
+    min_lat, min_long, max_lat, max_long = bbox
+    lat = df["lat"].to_numpy()
+    lng = df["long"].to_numpy()
+    mask = (lat >= min_lat) & (lat <= max_lat) & (lng >= min_long) & (lng <= max_long)
+    return df[mask]
+
+
+class PontosCache:
+    def __init__(self, versao_ttl: float = VERSAO_TTL):
+        self.versao_ttl = versao_ttl
+        self._lock = threading.Lock()
+        self._df: Optional[pd.DataFrame] = None
+        self._index: Dict[int, np.ndarray] = {}
+        self._last_id = 0
+        # _versao: última lida do banco (data_version); _carregada: a que está no DataFrame.
+        # São diferentes entre a consulta da versão e o _refresh seguinte.
+        self._versao: Optional[Tuple[int, int]] = None
+        self._versao_t = 0.0
+        self._carregada: Optional[Tuple[int, int]] = None
+
+    def data_version(self) -> Tuple[int, int]:
+        """Versão atual do banco, consultada no máximo a cada `versao_ttl` segundos."""
+        agora = time.monotonic()
+        if self._versao is None or agora - self._versao_t >= self.versao_ttl:
+            self._versao_t = agora
+            self._versao = get_data_version()
+        return self._versao
+
+    def _refresh(self) -> None:
+        versao = self.data_version()
+        if self._df is not None and versao == self._carregada:
+            return
+
+        if self._df is None or versao[1] != self._carregada[1]:
+            df = fetch_pontos()
+            self._df = df
+            self._index = _pin_index(df)
+            self._last_id = int(df["id"].max()) if not df.empty else 0
+        else:
+            novos = fetch_pontos(since_id=self._last_id)
+            if not novos.empty:
+                offset = len(self._df)
+                # concat gera um DataFrame novo: quem já recebeu o antigo não é afetado
+                self._df = pd.concat([self._df, novos], ignore_index=True)
+                index = dict(self._index)
+                for pin, pos in _pin_index(novos, offset).items():
+                    index[pin] = np.concatenate([index[pin], pos]) if pin in index else pos
+                self._index = index
+                self._last_id = int(novos["id"].max())
+
+        self._carregada = versao
+
+    def get(self, pins: Iterable[int], bbox=None) -> pd.DataFrame:
+        """
+        Pontos de `pins` (todos, se vazio) dentro de `bbox` (ou todos, se None).
+
+        O DataFrame devolvido é uma cópia; pode ser alterado por quem chamou.
+        """
+        with self._lock:
+            self._refresh()
+            df, index = self._df, self._index
+
+        pins = list(pins)
+        if pins:
+            fatias = [index[pin] for pin in pins if pin in index]
+            posicoes = np.concatenate(fatias) if fatias else np.empty(0, dtype=np.intp)
+            df = df.take(posicoes)
+        else:
+            df = df.copy()
+
+        if bbox is not None:
+            df = filter_bbox(df, bbox)
+        return df
+
+    def clear(self) -> None:
+        with self._lock:
+            self._df = None
+            self._index = {}
+            self._last_id = 0
+            self._versao = None
+            self._carregada = None
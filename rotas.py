@@ -0,0 +1,277 @@
+"""
+Roteiro de coleta: ordem de visita dos pontos selecionados no mapa.
+
+É um caixeiro-viajante aproximado. A matriz de distâncias (haversine) sai
+de uma vez por broadcasting do NumPy. A rota inicial é a do vizinho mais
+próximo, e o 2-opt a melhora (troca de duas arestas invertendo o trecho
+entre elas), alternado com o Or-opt (muda um trecho curto de lugar), até
+não achar melhora ou estourar o prazo.
+
+A rota é um caminho aberto: começa na base, se houver, e não volta para
+ela. Para o 2-opt e o Or-opt tratarem o caminho como um ciclo, há um nó
+fictício Z fora da rota, ligado às duas pontas. A distância de Z a
+qualquer ponto é 0, então as pontas ficam livres. Com base, só a base fica a 0 de Z; os outros ficam
+a uma distância M muito grande, o que prende a base numa das pontas.
+
+Com capacidade por categoria (máximo de pontos de um pin por viagem), a
+rota completa é cortada em viagens na ordem em que os pontos aparecem, e
+cada viagem é otimizada de novo. A volta à base entre as viagens não
+entra na distância.
+"""
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from setores import SetorIndex
+
+RAIO_TERRA_M = 6_371_008.8
+PRAZO_S = 3.0          # tempo máximo da otimização (todas as viagens)
+MAX_PARADAS = 2_000    # matriz (n+2)² em float64: ~32 MB com 2.000 pontos
+
+ROTA_COLUMNS = ["viagem", "ordem", "id", "pin", "nome", "lat", "long", "trecho_m", "acumulado_m"]
+
+
+def distancias(lat, lng) -> np.ndarray:
+    """Matriz n x n das distâncias haversine em metros."""
+    lat = np.radians(np.asarray(lat, dtype="float64"))
+    lng = np.radians(np.asarray(lng, dtype="float64"))
+    sen_dlat = np.sin((lat[:, None] - lat[None, :]) / 2)
+    sen_dlng = np.sin((lng[:, None] - lng[None, :]) / 2)
+    cos_lat = np.cos(lat)
+    a = sen_dlat * sen_dlat + np.outer(cos_lat, cos_lat) * sen_dlng * sen_dlng
+    return 2 * RAIO_TERRA_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _vizinho_mais_proximo(dist: np.ndarray, nos: np.ndarray, inicio: int) -> np.ndarray:
+    """Ordem de visita de `nos` (índices de `dist`) indo sempre ao mais perto ainda não visitado."""
+    sub = dist[np.ix_(nos, nos)]
+    livre = np.ones(len(nos), dtype=bool)
+    ordem = np.empty(len(nos), dtype="int64")
+    atual = int(np.flatnonzero(nos == inicio)[0])
+    for k in range(len(nos)):
+        ordem[k] = atual
+        livre[atual] = False
+        if k + 1 < len(nos):
+            atual = int(np.argmin(np.where(livre, sub[atual], np.inf)))
+    return nos[ordem]
+
+
+def _dois_opt(dist: np.ndarray, t: np.ndarray, limite: float) -> bool:
+    """
+    Uma passada de 2-opt sobre o ciclo `t` ([Z, ..., Z]), alterado no lugar;
+    devolve se melhorou.
+
+    Para cada aresta (a, b), os ganhos de trocá-la com todas as arestas
+    (c, d) seguintes saem numa operação vetorizada; aplica a melhor.
+    """
+    n = len(t) - 1
+    melhorou = False
+    for i in range(n - 2):
+        a, b = t[i], t[i + 1]
+        c, d = t[i + 2:n], t[i + 3:n + 1]
+        ganho = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+        j = int(np.argmin(ganho))
+        if ganho[j] < -1e-6:
+            t[i + 1:i + 3 + j] = t[i + 1:i + 3 + j][::-1].copy()
+            melhorou = True
+        if i % 128 == 0 and time.perf_counter() > limite:
+            break
+    return melhorou
+
+
+def _or_opt(dist: np.ndarray, t: np.ndarray, limite: float, max_trecho: int = 3) -> bool:
+    """
+    Uma passada de Or-opt: tira trechos de 1 a `max_trecho` paradas e os
+    reinsere (em qualquer sentido) na aresta onde custam menos. Pega
+    melhoras que o 2-opt não vê, como um ponto isolado fora do lugar.
+    """
+    melhorou = False
+    for tamanho in range(1, max_trecho + 1):
+        i = 1
+        while i + tamanho < len(t):
+            n = len(t) - 1
+            p, s0, s1, q = t[i - 1], t[i], t[i + tamanho - 1], t[i + tamanho]
+            retirada = dist[p, s0] + dist[s1, q] - dist[p, q]
+            # arestas (c, e) fora do trecho e das suas duas arestas
+            k = np.concatenate((np.arange(0, i - 1), np.arange(i + tamanho, n)))
+            if not len(k):
+                break
+            c, e = t[k], t[k + 1]
+            direto = dist[c, s0] + dist[s1, e] - dist[c, e]
+            invertido = dist[c, s1] + dist[s0, e] - dist[c, e]
+            j = int(np.argmin(np.minimum(direto, invertido)))
+            if min(direto[j], invertido[j]) < retirada - 1e-6:
+                trecho = t[i:i + tamanho].copy()
+                if invertido[j] < direto[j]:
+                    trecho = trecho[::-1]
+                resto = np.concatenate((t[:i], t[i + tamanho:]))
+                pos = k[j] + 1 if k[j] < i else k[j] + 1 - tamanho
+                t[:] = np.concatenate((resto[:pos], trecho, resto[pos:]))
+                melhorou = True
+            i += 1
+            if i % 128 == 0 and time.perf_counter() > limite:
+                return melhorou
+    return melhorou
+
+
+def _otimizar(dist: np.ndarray, ciclo: np.ndarray, limite: float) -> np.ndarray:
+    """2-opt e Or-opt alternados sobre `ciclo` até nenhum melhorar ou até o `limite` (perf_counter)."""
+    t = ciclo.copy()
+    while time.perf_counter() < limite:
+        if not (_dois_opt(dist, t, limite) | _or_opt(dist, t, limite)):
+            break
+    return t
+
+
+def _percurso(dist: np.ndarray, nos: np.ndarray, z: int, base: Optional[int], limite: float) -> np.ndarray:
+    """Caminho por `nos` (começando pela base, se houver): vizinho mais próximo, depois _otimizar."""
+    if base is not None:
+        inicio = base
+    else:
+        # começa por uma ponta: o ponto mais longe do primeiro
+        inicio = int(nos[np.argmax(dist[nos[0], nos])])
+    ordem = _vizinho_mais_proximo(dist, nos, inicio)
+    ciclo = _otimizar(dist, np.concatenate(([z], ordem, [z])), limite)[1:-1]
+    if base is not None and ciclo[0] != base:
+        ciclo = ciclo[::-1]
+    return ciclo
+
+
+def _viagens(ordem: np.ndarray, pins: np.ndarray, capacidade: Dict[int, int]) -> List[np.ndarray]:
+    """Corta a ordem em viagens sem passar do máximo de pontos por pin em cada uma."""
+    viagens, atual, carga = [], [], {}
+    for no in ordem:
+        pin = int(pins[no])
+        limite = capacidade.get(pin)
+        if limite is not None and carga.get(pin, 0) >= limite:
+            viagens.append(np.array(atual, dtype="int64"))
+            atual, carga = [], {}
+        atual.append(no)
+        carga[pin] = carga.get(pin, 0) + 1
+    if atual:
+        viagens.append(np.array(atual, dtype="int64"))
+    return viagens
+
+
+def planejar_rota(
+    paradas: pd.DataFrame,
+    base: Optional[Tuple[float, float]] = None,
+    capacidade: Optional[Dict[int, int]] = None,
+    prazo_s: float = PRAZO_S,
+) -> pd.DataFrame:
+    """
+    Ordem de visita dos pontos de `paradas` (colunas id, pin, nome, lat, long).
+
+    base: (lat, long) de onde a equipe sai, ou None para começar numa ponta.
+    capacidade: {pin: máximo de pontos desse pin por viagem}; pins fora do
+    dicionário (ou com 0) não limitam.
+
+    Devolve uma linha por ponto, na ordem de visita (ROTA_COLUMNS):
+    trecho_m é a distância desde a parada anterior (ou desde a base, na
+    primeira parada de cada viagem) e acumulado_m a soma dentro da viagem.
+    """
+    if len(paradas) > MAX_PARADAS:
+        raise ValueError(f"{len(paradas)} pontos: o roteiro aceita até {MAX_PARADAS}")
+    if paradas.empty:
+        return pd.DataFrame(columns=ROTA_COLUMNS)
+
+    limite = time.perf_counter() + prazo_s
+    n = len(paradas)
+    lat = paradas["lat"].to_numpy(dtype="float64")
+    lng = paradas["long"].to_numpy(dtype="float64")
+    if base is not None:
+        lat, lng = np.append(lat, base[0]), np.append(lng, base[1])
+
+    # nós: as paradas (0..n-1), a base (n, se houver) e o fictício Z (último)
+    dist = np.zeros((len(lat) + 1, len(lat) + 1))
+    dist[:-1, :-1] = distancias(lat, lng)
+    z = len(lat)
+    no_base = n if base is not None else None
+    if no_base is not None:
+        grande = 4 * dist.max() + 1
+        dist[z, :z] = dist[:z, z] = grande
+        dist[z, no_base] = dist[no_base, z] = 0.0
+
+    pins = paradas["pin"].to_numpy(dtype="int64")
+    capacidade = {int(p): int(c) for p, c in (capacidade or {}).items() if c}
+    todas = np.arange(n) if no_base is None else np.append(np.arange(n), no_base)
+    ordem = _percurso(dist, todas, z, no_base, limite)
+    if no_base is not None:
+        ordem = ordem[1:]
+
+    linhas = []
+    for k, viagem in enumerate(_viagens(ordem, pins, capacidade) if capacidade else [ordem], start=1):
+        if capacidade:
+            nos = viagem if no_base is None else np.append(viagem, no_base)
+            viagem = _percurso(dist, nos, z, no_base, limite)
+            if no_base is not None:
+                viagem = viagem[1:]
+        # sem base, a primeira parada de cada viagem tem trecho 0
+        anterior = np.concatenate(([viagem[0] if no_base is None else no_base], viagem[:-1]))
+        trecho = dist[anterior, viagem]
+        linhas.append(
+            pd.DataFrame(
+                {
+                    "viagem": k,
+                    "ordem": np.arange(1, len(viagem) + 1),
+                    "id": paradas["id"].to_numpy()[viagem],
+                    "pin": pins[viagem],
+                    "nome": paradas["nome"].to_numpy()[viagem],
+                    "lat": lat[viagem],
+                    "long": lng[viagem],
+                    "trecho_m": trecho.round(1),
+                    "acumulado_m": trecho.cumsum().round(1),
+                }
+            )
+        )
+    return pd.concat(linhas, ignore_index=True)
+
+
+def pontos_na_selecao(df: pd.DataFrame, desenhos: list) -> pd.DataFrame:
+    """Pontos de `df` dentro de algum polígono/retângulo desenhado (features GeoJSON do st_folium)."""
+    poligonos = [
+        (i, "", d.get("geometry") or {})
+        for i, d in enumerate(desenhos or [])
+        if (d.get("geometry") or {}).get("type") in ("Polygon", "MultiPolygon")
+    ]
+    if not poligonos or df.empty:
+        return df.iloc[0:0]
+    dentro = SetorIndex(poligonos).localizar(df["lat"].to_numpy(), df["long"].to_numpy()) >= 0
+    return df[dentro]
+
+
+def rota_geojson(rota: pd.DataFrame, base: Optional[Tuple[float, float]] = None) -> dict:
+    """Rota como GeoJSON: uma LineString por viagem (saindo da base, se houver) e um Point por parada."""
+    features = []
+    for viagem, trecho in rota.groupby("viagem", sort=True):
+        coords = trecho[["long", "lat"]].to_numpy().tolist()
+        if base is not None:
+            coords.insert(0, [base[1], base[0]])
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": coords},
+                "properties": {
+                    "viagem": int(viagem),
+                    "paradas": len(trecho),
+                    "distancia_m": float(trecho["trecho_m"].sum()),
+                },
+            }
+        )
+    for linha in rota.itertuples(index=False):
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [linha.long, linha.lat]},
+                "properties": {
+                    "viagem": int(linha.viagem),
+                    "ordem": int(linha.ordem),
+                    "id": int(linha.id),
+                    "pin": int(linha.pin),
+                    "nome": linha.nome,
+                },
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
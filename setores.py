@@ -0,0 +1,253 @@
+"""
+Setores (trechos/quadras) do Sol Nascente e atribuição de cada ponto ao seu setor.
+
+Uso:
+    python setores.py setores.geojson [--banco banco.db] [--propriedade nome]
+    python setores.py --reatribuir
+
+O GeoJSON (Polygon ou MultiPolygon, em lon/lat) é gravado na tabela
+setores e todos os pontos são reatribuídos de uma vez. Daí em diante cada
+ponto novo recebe o setor na inserção (db.insert_registros e importar.py).
+
+O índice (SetorIndex) divide a área dos setores numa grade: cada parte de
+polígono fica nas células que o retângulo dela cobre. Os pontos são
+ordenados por célula uma vez; para cada parte, só os pontos das células
+dela passam pelo teste de ponto-no-polígono (ray casting), vetorizado em
+NumPy sobre os pontos, uma aresta por vez.
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+GRADE_CELULAS = 256       # células da grade no maior lado da área dos setores
+ATRIBUIR_LOTE = 200_000   # pontos lidos e localizados por vez na reatribuição
+PROPRIEDADES_NOME = ("nome", "name", "setor", "trecho", "quadra")
+
+Anel = np.ndarray          # (n, 2): long, lat
+Parte = List[Anel]         # anel externo seguido dos buracos
+
+
+def _partes(geometria: dict) -> List[Parte]:
+    """Polígonos da geometria GeoJSON (Polygon ou MultiPolygon) como arrays."""
+    tipo = geometria.get("type")
+    if tipo == "Polygon":
+        poligonos = [geometria["coordinates"]]
+    elif tipo == "MultiPolygon":
+        poligonos = geometria["coordinates"]
+    else:
+        return []
+    return [
+        [np.asarray(anel, dtype="float64")[:, :2] for anel in poligono if len(anel) >= 3]
+        for poligono in poligonos
+        if poligono
+    ]
+
+
+def _dentro(x: np.ndarray, y: np.ndarray, parte: Parte) -> np.ndarray:
+    """Ray casting (par-ímpar) de todos os pontos contra os anéis; buracos se cancelam."""
+    dentro = np.zeros(len(x), dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for anel in parte:
+            xi, yi = anel[:, 0], anel[:, 1]
+            xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+            for a in range(len(xi)):
+                if yi[a] == yj[a]:
+                    continue  # aresta horizontal não cruza o raio
+                cruza = (yi[a] > y) != (yj[a] > y)
+                cruza &= x < (xj[a] - xi[a]) * (y - yi[a]) / (yj[a] - yi[a]) + xi[a]
+                dentro ^= cruza
+    return dentro
+
+
+class SetorIndex:
+    """Setores prontos para localizar pontos em lote (ver localizar)."""
+
+    def __init__(self, setores: List[Tuple[int, str, dict]], grade_celulas: int = GRADE_CELULAS):
+        self.nomes = {int(setor_id): nome for setor_id, nome, _ in setores}
+        self._partes: List[Tuple[int, Parte, Tuple[float, float, float, float]]] = []
+        for setor_id, _, geometria in setores:
+            for parte in _partes(geometria):
+                externo = parte[0]
+                bbox = (externo[:, 0].min(), externo[:, 1].min(), externo[:, 0].max(), externo[:, 1].max())
+                self._partes.append((int(setor_id), parte, bbox))
+
+        if not self._partes:
+            self.x0 = self.y0 = 0.0
+            self.celula = 1.0
+            self.nx = self.ny = 1
+            return
+
+        bboxes = np.array([bbox for _, _, bbox in self._partes])
+        self.x0, self.y0 = bboxes[:, 0].min(), bboxes[:, 1].min()
+        largura = max(bboxes[:, 2].max() - self.x0, bboxes[:, 3].max() - self.y0, 1e-9)
+        self.celula = largura / grade_celulas
+        self.nx = int((bboxes[:, 2].max() - self.x0) / self.celula) + 1
+        self.ny = int((bboxes[:, 3].max() - self.y0) / self.celula) + 1
+
+    def __len__(self) -> int:
+        return len(self.nomes)
+
+    def _celulas(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Célula (cx * ny + cy) de cada ponto; -1 fora da área dos setores."""
+        cx = np.floor((x - self.x0) / self.celula)
+        cy = np.floor((y - self.y0) / self.celula)
+        fora = (cx < 0) | (cx >= self.nx) | (cy < 0) | (cy >= self.ny) | np.isnan(cx) | np.isnan(cy)
+        celulas = cx * self.ny + cy
+        celulas[fora] = -1
+        return celulas.astype("int64")
+
+    def localizar(self, lat, lng) -> np.ndarray:
+        """Id do setor de cada ponto (-1 se em nenhum). Setores sobrepostos: vale o primeiro."""
+        y = np.asarray(lat, dtype="float64")
+        x = np.asarray(lng, dtype="float64")
+        setor = np.full(len(x), -1, dtype="int64")
+        if not self._partes or not len(x):
+            return setor
+
+        celulas = self._celulas(x, y)
+        ordem = np.argsort(celulas, kind="stable")
+        ordenadas = celulas[ordem]
+
+        for setor_id, parte, (min_x, min_y, max_x, max_y) in self._partes:
+            cx0, cx1 = int((min_x - self.x0) / self.celula), int((max_x - self.x0) / self.celula)
+            cy0, cy1 = int((min_y - self.y0) / self.celula), int((max_y - self.y0) / self.celula)
+            # numa coluna da grade (cx fixo), as células cy0..cy1 são contíguas
+            inicio = np.searchsorted(ordenadas, [cx * self.ny + cy0 for cx in range(cx0, cx1 + 1)])
+            fim = np.searchsorted(ordenadas, [cx * self.ny + cy1 for cx in range(cx0, cx1 + 1)], side="right")
+            faixas = [ordem[i:f] for i, f in zip(inicio, fim)]
+            candidatos = np.concatenate(faixas) if faixas else np.empty(0, dtype="int64")
+            candidatos = candidatos[setor[candidatos] < 0]
+            if not len(candidatos):
+                continue
+            dentro = _dentro(x[candidatos], y[candidatos], parte)
+            setor[candidatos[dentro]] = setor_id
+        return setor
+
+
+# ===== Setores gravados no banco =====
+
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def get_index(conn: sqlite3.Connection) -> Optional[SetorIndex]:
+    """
+    Índice dos setores gravados no banco de `conn`, ou None se não houver.
+
+    Fica em memória por arquivo; é remontado quando a tabela setores muda
+    (o teste é uma consulta numa tabela de poucas linhas).
+    """
+    assinatura = conn.execute("SELECT COUNT(*), MAX(id), TOTAL(length(geometria)) FROM setores").fetchone()
+    if not assinatura[0]:
+        return None
+    chave = conn.execute("PRAGMA database_list").fetchone()[2]
+    with _indices_lock:
+        atual = _indices.get(chave)
+        if atual is None or atual[0] != assinatura:
+            linhas = conn.execute("SELECT id, nome, geometria FROM setores ORDER BY id").fetchall()
+            atual = _indices[chave] = (assinatura, SetorIndex([(i, nome, json.loads(g)) for i, nome, g in linhas]))
+        return atual[1]
+
+
+def ler_geojson(path: str, propriedade: Optional[str] = None) -> List[Tuple[str, dict]]:
+    """(nome, geometria) de cada feature poligonal do arquivo."""
+    with open(path, encoding="utf-8") as f:
+        dados = json.load(f)
+    features = dados.get("features", []) if dados.get("type") == "FeatureCollection" else [dados]
+
+    setores = []
+    for n, feature in enumerate(features, start=1):
+        geometria = feature.get("geometry") or {}
+        if geometria.get("type") not in ("Polygon", "MultiPolygon"):
+            continue
+        props = {str(k).lower(): v for k, v in (feature.get("properties") or {}).items()}
+        nomes = (propriedade.lower(),) if propriedade else PROPRIEDADES_NOME
+        nome = next((str(props[p]) for p in nomes if props.get(p) not in (None, "")), f"Setor {n}")
+        setores.append((nome, geometria))
+    return setores
+
+
+def gravar_setores(conn: sqlite3.Connection, setores: List[Tuple[str, dict]]) -> None:
+    """Substitui os setores do banco (na transação aberta em `conn`)."""
+    conn.execute("DELETE FROM setores")
+    conn.executemany(
+        "INSERT INTO setores (id, nome, geometria) VALUES (?, ?, ?)",
+        [(i, nome, json.dumps(geometria)) for i, (nome, geometria) in enumerate(setores, start=1)],
+    )
+
+
+def atribuir(conn: sqlite3.Connection, desde_id: int = 0, lote: int = ATRIBUIR_LOTE) -> int:
+    """
+    Recalcula pontos.setor para os pontos com id > desde_id (na transação
+    aberta em `conn`); devolve quantos ficaram com setor.
+
+    Os pontos são lidos e localizados em lotes; o resultado vai para um
+    array por id, que um único UPDATE lê por uma função SQL. Na
+    reatribuição completa o índice de setor sai antes do UPDATE e é criado
+    de novo depois, o que sai bem mais barato que atualizá-lo linha a linha.
+    """
+    index = get_index(conn)
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM pontos").fetchone()[0]
+    setor_por_id = np.full(max_id + 1, -1, dtype="int64")
+
+    ultimo = desde_id
+    while index is not None:
+        linhas = conn.execute(
+            "SELECT id, lat, long FROM pontos WHERE id > ? ORDER BY id LIMIT ?", (ultimo, lote)
+        ).fetchall()
+        if not linhas:
+            break
+        ids, lat, lng = (np.asarray(c) for c in zip(*linhas))
+        setor_por_id[ids] = index.localizar(lat, lng)
+        ultimo = int(ids[-1])
+
+    valores = setor_por_id.tolist()
+    conn.create_function("setor_novo", 1, lambda i: valores[i] if valores[i] >= 0 else None, deterministic=True)
+    indice = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'idx_pontos_setor'").fetchone()
+    completa = desde_id == 0 and indice is not None
+    if completa:
+        conn.execute("DROP INDEX idx_pontos_setor")
+    conn.execute("UPDATE pontos SET setor = setor_novo(id) WHERE id > ?", (desde_id,))
+    if completa:
+        conn.execute(indice[0])
+    conn.create_function("setor_novo", 1, None)
+
+    # setor não entra no contador de mutações (ver db.VERSAO_SQL); avisa os caches por versao
+    conn.execute("UPDATE pontos_versao SET versao = versao + 1 WHERE id = 1")
+    return int((setor_por_id >= 0).sum())
+
+
+def main() -> None:
+    import db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("geojson", nargs="?", help="arquivo GeoJSON com os polígonos dos setores")
+    parser.add_argument("--banco", default=db.DB_PATH, help="arquivo SQLite")
+    parser.add_argument("--propriedade", help="propriedade com o nome do setor (padrão: nome/name/setor/trecho/quadra)")
+    parser.add_argument("--reatribuir", action="store_true", help="só recalcula o setor dos pontos")
+    args = parser.parse_args()
+    if not args.geojson and not args.reatribuir:
+        parser.error("informe o GeoJSON dos setores ou --reatribuir")
+
+    db.DB_PATH = args.banco
+    t0 = time.perf_counter()
+    with db.write_connection() as conn:
+        if args.geojson:
+            setores = ler_geojson(args.geojson, args.propriedade)
+            if not setores:
+                raise SystemExit(f"Nenhum polígono em {args.geojson}")
+            gravar_setores(conn, setores)
+            print(f"{len(setores)} setores gravados.", file=sys.stderr)
+        com_setor = atribuir(conn)
+        total = conn.execute("SELECT COUNT(*) FROM pontos").fetchone()[0]
+    print(f"{com_setor:,} de {total:,} pontos dentro de algum setor ({time.perf_counter() - t0:.1f} s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,31 @@
+from datetime import date, timedelta
+
 import streamlit as st
 
-def sidebar_filters(category_labels: dict) -> list:
+# rótulo no rádio -> modo do mapa
+VIEW_MODES = {
+    "Pontos": "pontos",
+    "Densidade (mapa de calor)": "densidade",
+    "Setores (pontos por setor)": "setores",
+}
+
+# opções do filtro de período
+PERIODOS = ["Todo o período", "Últimos N dias", "Intervalo de datas"]
+
+# rótulo no rádio -> de onde vêm as paradas do roteiro de coleta
+SELECOES_ROTA = {
+    "Pontos da área visível": "area",
+    "Área desenhada no mapa": "desenho",
+}
+
+def sidebar_filters(category_labels: dict, contagens: dict = None, tendencia=None) -> list:
+    """
+    Filtro de categorias e legenda; devolve os pins selecionados.
+
+    contagens: pin -> total de pontos (db.fetch_pin_counts), mostrado na legenda.
+    tendencia: DataFrame mes/pin/n (db.fetch_trend); vira um gráfico dos
+    registros por mês das categorias selecionadas.
+    """
     # Logo da Residência no topo da sidebar
     st.sidebar.image("logo/residencia_cts.png", use_container_width=True)
     st.sidebar.markdown("---")
@@ -33,9 +58,130 @@ def sidebar_filters(category_labels: dict) -> list:
         with col_icon:
             st.image(f"img/pin_{pin}.png", use_container_width=True)
         with col_text:
-            st.markdown(f"**Pin {pin}**<br>{label}", unsafe_allow_html=True)
+            total = f" · {contagens.get(pin, 0):,} pontos".replace(",", ".") if contagens is not None else ""
+            st.markdown(f"**Pin {pin}**{total}<br>{label}", unsafe_allow_html=True)
+
+    if tendencia is not None and not tendencia.empty:
+        serie = tendencia[tendencia["pin"].isin(selected_pins)].groupby("mes")["n"].sum()
+        if not serie.empty:
+            st.sidebar.markdown("---")
+            st.sidebar.subheader("Registros por mês")
+            st.sidebar.bar_chart(serie.rename("Pontos"), height=160)
 
     st.sidebar.markdown("---")
     st.sidebar.caption("SARA - Sistema Analítico de Resíduos e Ambiente")
 
     return selected_pins
+
+
+def sidebar_view_mode() -> tuple:
+    """Modo do mapa ("pontos", "densidade" ou "setores") e, na densidade, o raio de suavização em metros."""
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Visualização")
+
+    modo = VIEW_MODES[st.sidebar.radio("Modo do mapa", options=list(VIEW_MODES))]
+
+    banda_m = None
+    if modo == "densidade":
+        banda_m = st.sidebar.slider("Raio de suavização (m)", min_value=50, max_value=1000, value=200, step=50)
+
+    return modo, banda_m
+
+
+def sidebar_hotspots() -> bool:
+    """Se os hotspots (grupos de pontos recorrentes) devem aparecer no mapa e no ranking."""
+    return st.sidebar.checkbox("Mostrar hotspots", value=True)
+
+
+def sidebar_periodo() -> tuple:
+    """
+    Período de data de registro a mostrar: (desde, ate) como date, inclusivos,
+    ou (None, None) para todo o período.
+    """
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Período")
+
+    opcao = st.sidebar.radio("Data de registro", options=PERIODOS, label_visibility="collapsed")
+    hoje = date.today()
+
+    if opcao == "Últimos N dias":
+        dias = st.sidebar.number_input("Dias", min_value=1, max_value=3650, value=90, step=30)
+        return hoje - timedelta(days=int(dias) - 1), hoje
+
+    if opcao == "Intervalo de datas":
+        intervalo = st.sidebar.date_input(
+            "De / até",
+            value=(hoje - timedelta(days=89), hoje),
+            max_value=hoje,
+            format="DD/MM/YYYY",
+        )
+        # enquanto o usuário escolhe, o date_input devolve só a primeira data
+        if len(intervalo) == 2:
+            return intervalo[0], intervalo[1]
+        if len(intervalo) == 1:
+            return intervalo[0], intervalo[0]
+
+    return None, None
+
+
+def sidebar_busca() -> str:
+    """Texto da busca por nome ou classificação PNRS ("" sem busca)."""
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Buscar ponto")
+    return st.sidebar.text_input(
+        "Nome ou classificação PNRS",
+        placeholder="ex.: colchão, pneu...",
+        help="Mostra no mapa só os pontos encontrados (respeitando categorias e período).",
+    ).strip()
+
+
+def _coordenada(texto: str):
+    """(lat, long) a partir de "lat, long"; None se vazio ou inválido."""
+    partes = texto.replace(";", ",").split(",")
+    try:
+        lat, lng = (float(p) for p in partes)
+    except ValueError:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def sidebar_rota(category_labels: dict, selected_pins: list):
+    """
+    Opções do roteiro de coleta, ou None se desligado:
+    {"selecao": "area" ou "desenho", "base": (lat, long) ou None,
+    "capacidade": {pin: máximo por viagem}, "prazo_s": segundos,
+    "calcular": se o botão foi clicado nesta execução}.
+    """
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("Roteiro de coleta")
+    if not st.sidebar.checkbox("Planejar rota", value=False):
+        return None
+
+    selecao = st.sidebar.radio("Paradas", options=list(SELECOES_ROTA))
+    texto_base = st.sidebar.text_input(
+        "Base (lat, long)",
+        placeholder="-15.81, -48.12",
+        help="De onde a equipe sai. Vazio: a rota começa pela ponta que der o menor percurso.",
+    ).strip()
+    base = _coordenada(texto_base) if texto_base else None
+    if texto_base and base is None:
+        st.sidebar.warning("Base inválida: use latitude, longitude (ex.: -15.81, -48.12).")
+
+    with st.sidebar.expander("Capacidade por viagem"):
+        st.caption("Máximo de pontos de cada categoria por viagem (0 = sem limite).")
+        capacidade = {
+            pin: int(st.number_input(category_labels[pin], min_value=0, value=0, step=5, key=f"capacidade_{pin}"))
+            for pin in (selected_pins or category_labels)
+        }
+
+    prazo_s = st.sidebar.slider("Tempo máximo de cálculo (s)", min_value=1, max_value=10, value=3)
+    calcular = st.sidebar.button("Calcular rota", type="primary")
+    return {
+        "selecao": SELECOES_ROTA[selecao],
+        "base": base,
+        "capacidade": {pin: n for pin, n in capacidade.items() if n},
+        "prazo_s": float(prazo_s),
+        "calcular": calcular,
+    }
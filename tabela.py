@@ -1,27 +1,13 @@
 import sqlite3
 
+from migrations import migrate
+
 # 1- Conectar ao banco de dados:
 conexao = sqlite3.connect('banco.db')
 
-# 2- Criando o cursor
-cursor = conexao.cursor()
-
-# 3- Criando a tabela
-cursor.execute(
-    """
-    CREATE TABLE IF NOT EXISTS pontos (
-        id            INTEGER PRIMARY KEY AUTOINCREMENT,
-        pin           INTEGER NOT NULL,
-        nome          TEXT    NOT NULL,
-        pnrs          TEXT,
-        lat           REAL    NOT NULL,
-        long          REAL    NOT NULL,
-        data_registro TEXT    NOT NULL
-    );
-    """
-)
+# 2- Criando a tabela (e aplicando as demais migrações pendentes)
+aplicadas = migrate(conexao)
 
-# 4- Fechar conexão
-conexao.commit()
+# 3- Fechar conexão
 conexao.close()
-print("Tabela foi criada com sucesso")
+print("Tabela foi criada com sucesso" if 1 in aplicadas else "Tabela já existia; esquema atualizado")
@@ -0,0 +1,45 @@
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import db
+import fotos
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # fotos/ (os originais) fica relativo à pasta atual
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "banco.db"))
+    yield
+    db.get_manager().close()
+
+
+def _guardada(conteudo: bytes) -> str:
+    """Grava um original como salvar_foto faria, sem passar pelo Pillow."""
+    foto = hashlib.sha256(conteudo).hexdigest()
+    os.makedirs(os.path.join(fotos.ORIGINAIS_DIR, foto[:2]))
+    with open(os.path.join(fotos.ORIGINAIS_DIR, foto[:2], f"{foto}.jpg"), "wb") as f:
+        f.write(conteudo)
+    return foto
+
+
+def test_so_grava_hashes_de_fotos_guardadas(banco):
+    guardada = _guardada(b"foto")
+    nao_enviada = hashlib.sha256(b"outra").hexdigest()
+    registro = {
+        "client_id": "c1", "pin": 1, "nome": "Ponto", "pnrs": "", "lat": -15.8, "long": -48.1,
+        "data_registro": "2024-01-10",
+        "fotos": [guardada, nao_enviada, 'x" onerror="alert(1)', "../../app.py", None],
+    }
+    with db.write_connection() as conn:
+        assert db.insert_registros(conn, [registro]) == 1
+
+    ponto_id = db.fetch_ponto_ids(["c1"])[0]
+    assert db.fetch_fotos([ponto_id]) == {ponto_id: [guardada]}
+
+    db.add_reforco(ponto_id, "2024-01-11", fotos=[nao_enviada.upper(), "<img>"])
+    assert db.fetch_fotos([ponto_id]) == {ponto_id: [guardada]}
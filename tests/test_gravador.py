@@ -0,0 +1,59 @@
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import db
+from gravador import get_gravador, validar_registros
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "banco.db"))
+    yield
+    db.get_manager().close()
+
+
+def _registro(client_id, **campos):
+    registro = {
+        "client_id": client_id, "pin": 5, "nome": "Ponto", "pnrs": "", "lat": -15.83, "long": -48.13,
+        "data_registro": "2024-01-10", "fotos": [],
+    }
+    registro.update(campos)
+    return registro
+
+
+def test_registros_do_aparelho_sao_conferidos_um_a_um(banco):
+    amanha_e_mais = (date.today() + timedelta(days=5)).isoformat()
+    sem_lat = _registro("sem-lat")
+    del sem_lat["lat"]
+    registros = [
+        _registro("ok"),
+        _registro("pin-7", pin=7),
+        _registro("pin-negativo", pin=-3),
+        _registro("lat", lat=1000, long=999),
+        _registro("nome-vazio", nome="  "),
+        _registro("nome-longo", nome="x" * 100_000),
+        _registro("futuro", data_registro=amanha_e_mais),
+        _registro("data-ruim", data_registro="ontem"),
+        sem_lat,
+        _registro(None),
+        _registro(12345),
+        "não é um registro",
+    ]
+
+    validos, recusados = validar_registros(registros)
+
+    assert [r["client_id"] for r in validos] == ["ok"]
+    assert [client_id for client_id, _ in recusados] == [
+        "pin-7", "pin-negativo", "lat", "nome-vazio", "nome-longo", "futuro", "data-ruim", "sem-lat",
+    ]
+    assert get_gravador().submit(validos).result(timeout=10) == 1
+    assert db.fetch_pontos()["nome"].tolist() == ["Ponto"]
+
+
+def test_fila_que_nao_e_lista():
+    assert validar_registros({"client_id": "x"}) == ([], [])
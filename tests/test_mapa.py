@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mapa import area_carregada
+
+
+def _bounds(lat, lng, alt=0.012, larg=0.025):
+    return {
+        "_southWest": {"lat": lat - alt / 2, "lng": lng - larg / 2},
+        "_northEast": {"lat": lat + alt / 2, "lng": lng + larg / 2},
+    }
+
+
+def test_pan_dentro_da_area_mantem_a_area():
+    area = area_carregada(None, _bounds(-15.83, -48.13), 15)
+    for passo in range(1, 4):
+        assert area_carregada(area, _bounds(-15.83 + passo * 0.001, -48.13 - passo * 0.002), 15) == area
+
+
+def test_sair_da_area_ou_mudar_o_zoom_troca_a_area():
+    area = area_carregada(None, _bounds(-15.83, -48.13), 15)
+    longe = area_carregada(area, _bounds(-15.80, -48.10), 15)
+    assert longe != area and longe[0][0] <= -15.80 - 0.006
+
+    assert area_carregada(area, _bounds(-15.83, -48.13, 0.006, 0.0125), 16)[1] == 16
+
+
+def test_sem_bounds():
+    assert area_carregada(None, None, None) is None
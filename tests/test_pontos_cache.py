@@ -0,0 +1,56 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import db
+import pontos_cache
+from pontos_cache import PontosCache
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "banco.db"))
+    yield
+    db.get_manager().close()
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    """Relógio manual para o TTL da versão: avança só com relogio.avancar()."""
+
+    class Relogio:
+        agora = 0.0
+
+        def avancar(self, segundos: float) -> None:
+            self.agora += segundos
+
+    r = Relogio()
+    monkeypatch.setattr(pontos_cache.time, "monotonic", lambda: r.agora)
+    return r
+
+
+def test_ponto_inserido_aparece_depois_da_consulta_de_versao(banco, relogio):
+    db.insert_ponto(1, "Ponto A", "Resíduo da construção civil", -15.80, -48.12, "2024-01-10")
+    cache = PontosCache(versao_ttl=2.0)
+    assert list(cache.get([])["nome"]) == ["Ponto A"]
+
+    db.insert_ponto(2, "Ponto B", "Resíduo volumoso", -15.81, -48.13, "2024-01-11")
+    relogio.avancar(3.0)
+    cache.data_version()  # o app consulta a versão (chave dos caches) antes de pedir os pontos
+    assert sorted(cache.get([])["nome"]) == ["Ponto A", "Ponto B"]
+    assert list(cache.get([2])["nome"]) == ["Ponto B"]
+
+
+def test_update_recarrega_tudo(banco, relogio):
+    db.insert_ponto(1, "Ponto A", "Resíduo volumoso", -15.80, -48.12, "2024-01-10")
+    cache = PontosCache(versao_ttl=2.0)
+    cache.get([])
+
+    with db.write_connection() as conn:
+        conn.execute("UPDATE pontos SET nome = 'Ponto A2'")
+    relogio.avancar(3.0)
+    cache.data_version()
+    assert list(cache.get([])["nome"]) == ["Ponto A2"]